@@ -3,6 +3,8 @@ Django Admin configuration for NullPass authentication models.
 """
 
 from django.contrib import admin
+from django.db import transaction
+from .counters import record_deleting, update_flag
 from .models import TrustedDevice, AuthenticationChallenge, AuthenticationEvent, UserSession
 
 
@@ -18,7 +20,7 @@ class TrustedDeviceAdmin(admin.ModelAdmin):
             'fields': ('device_id', 'device_name', 'user_identifier')
         }),
         ('Cryptography', {
-            'fields': ('public_key',),
+            'fields': ('public_key', 'signature_format'),
             'classes': ('collapse',)
         }),
         ('Security Status', {
@@ -37,19 +39,34 @@ class TrustedDeviceAdmin(admin.ModelAdmin):
     actions = ['activate_devices', 'deactivate_devices', 'unflag_devices']
     
     def activate_devices(self, request, queryset):
-        count = queryset.update(is_active=True)
+        count = update_flag(queryset, 'is_active', True)
         self.message_user(request, f'{count} device(s) activated.')
     activate_devices.short_description = 'Activate selected devices'
     
     def deactivate_devices(self, request, queryset):
-        count = queryset.update(is_active=False)
+        from .key_cache import public_key_cache
+        from .session_cache import invalidate_device_sessions
+        device_ids = list(queryset.values_list('device_id', flat=True))
+        count = update_flag(queryset, 'is_active', False)
+        for device_id in device_ids:
+            public_key_cache.invalidate(device_id)
+        invalidate_device_sessions(queryset.values_list('pk', flat=True))
         self.message_user(request, f'{count} device(s) deactivated.')
     deactivate_devices.short_description = 'Deactivate selected devices'
     
     def unflag_devices(self, request, queryset):
-        count = queryset.update(is_flagged=False, failed_attempts=0)
+        with transaction.atomic():
+            count = update_flag(queryset, 'is_flagged', False)
+            queryset.update(failed_attempts=0)
         self.message_user(request, f'{count} device(s) unflagged.')
     unflag_devices.short_description = 'Unflag selected devices'
+    
+    def delete_queryset(self, request, queryset):
+        """Bulk deletes skip Model.delete(), so take the rows out of the counters here"""
+        with transaction.atomic():
+            record_deleting(UserSession.objects.filter(device__in=queryset))
+            record_deleting(queryset)
+            super().delete_queryset(request, queryset)
 
 
 @admin.register(AuthenticationChallenge)
@@ -124,7 +141,7 @@ class UserSessionAdmin(admin.ModelAdmin):
     list_display = ['session_id_short', 'device', 'is_active', 'created_at', 'expires_at', 'ip_address']
     list_filter = ['is_active', 'created_at']
     search_fields = ['session_id', 'device__device_name', 'ip_address']
-    readonly_fields = ['session_id', 'session_token', 'device', 'created_at', 'expires_at', 
+    readonly_fields = ['session_id', 'token_digest', 'device', 'created_at', 'expires_at', 
                       'last_activity', 'ip_address', 'user_agent']
     date_hierarchy = 'created_at'
     
@@ -133,7 +150,7 @@ class UserSessionAdmin(admin.ModelAdmin):
             'fields': ('session_id', 'device', 'is_active')
         }),
         ('Token', {
-            'fields': ('session_token',),
+            'fields': ('token_digest',),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -153,13 +170,17 @@ class UserSessionAdmin(admin.ModelAdmin):
     
     def terminate_sessions(self, request, queryset):
         count = 0
-        for session in queryset:
-            if session.is_active:
-                session.terminate()
-                count += 1
+        for session in queryset.filter(is_active=True):
+            count += session.terminate()
         self.message_user(request, f'{count} session(s) terminated.')
     terminate_sessions.short_description = 'Terminate selected sessions'
     
+    def delete_queryset(self, request, queryset):
+        """Bulk deletes skip Model.delete(), so take the rows out of the counters here"""
+        with transaction.atomic():
+            record_deleting(queryset)
+            super().delete_queryset(request, queryset)
+    
     def has_add_permission(self, request):
         """Prevent manual creation of sessions"""
         return False
\ No newline at end of file
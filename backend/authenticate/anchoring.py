@@ -0,0 +1,580 @@
+"""
+Merkle-root anchoring of authentication events for NullPass.
+Rather than one ledger transaction per event, events not yet anchored are
+hashed with generate_event_hash() in batches of up to
+BLOCKCHAIN_ANCHOR_BATCH_SIZE, a Merkle tree is built over each batch and only
+its root is written to the ledger (BLOCKCHAIN_LEDGER). Every event keeps an
+EventInclusionProof (its audit path), so any event, hot or archived by
+roll_event_partitions, can later be rechecked against its anchored root
+offline with verify_inclusion(), without the ledger.
+
+Tree layout follows RFC 6962: leaves are SHA256(0x00 || event hash) and
+nodes SHA256(0x01 || left || right), so a leaf can never pass for a node; an
+unpaired node at the end of a level is promoted unchanged.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from datetime import datetime
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .maintenance import archive_file_sha256, read_archived_events
+from .models import AuthenticationEvent, EventArchivePartition, EventInclusionProof, MerkleAnchor, TrustedDevice
+
+logger = logging.getLogger('authenticate')
+
+
+# ============================================================================
+# MERKLE TREE
+# ============================================================================
+
+def leaf_hash(event_hash):
+    """Tree leaf for an event hash (hex in, hex out)"""
+    return hashlib.sha256(b'\x00' + bytes.fromhex(event_hash)).hexdigest()
+
+
+def node_hash(left, right):
+    """Parent of two tree nodes (hex in, hex out)"""
+    return hashlib.sha256(b'\x01' + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def build_tree(event_hashes):
+    """
+    Build a Merkle tree over event hashes.
+
+    Args:
+        event_hashes (list): SHA256 hex event hashes, in leaf order
+
+    Returns:
+        list: Levels of hex nodes from the leaves up; the last level holds only the root
+
+    Raises:
+        ValueError: If event_hashes is empty
+    """
+    if not event_hashes:
+        raise ValueError('Cannot build a Merkle tree without leaves')
+
+    levels = [[leaf_hash(event_hash) for event_hash in event_hashes]]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+
+def inclusion_path(levels, index):
+    """
+    Audit path of one leaf.
+
+    Args:
+        levels (list): Tree from build_tree
+        index (int): Leaf index
+
+    Returns:
+        list: [side, sibling hex] steps from the leaf to the root, where side says
+              whether the sibling is on the left ('L') or the right ('R')
+    """
+    path = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            path.append(['L' if sibling < index else 'R', level[sibling]])
+        index //= 2
+    return path
+
+
+def verify_inclusion(event_hash, path, root):
+    """
+    Check that an event hash is included under a Merkle root.
+    Needs nothing but the three values, so archived events can be checked offline.
+
+    Args:
+        event_hash (str): SHA256 hex of the event (generate_event_hash())
+        path (list): Audit path from inclusion_path / EventInclusionProof.path
+        root (str): Anchored Merkle root
+
+    Returns:
+        bool: True if the path leads from the event hash to the root
+    """
+    try:
+        current = leaf_hash(event_hash)
+        for side, sibling in path:
+            if side == 'L':
+                current = node_hash(sibling, current)
+            elif side == 'R':
+                current = node_hash(current, sibling)
+            else:
+                return False
+    except (TypeError, ValueError):
+        return False
+    return current == root
+
+
+# ============================================================================
+# LEDGERS
+# ============================================================================
+
+class InMemoryLedger:
+    """
+    Process-local ledger for tests and development; anchored roots are lost on restart.
+    """
+
+    def __init__(self):
+        self._roots = {}
+        self._lock = threading.Lock()
+
+    def anchor(self, root, leaf_count):
+        """
+        Record a Merkle root.
+
+        Args:
+            root (str): Merkle root hex
+            leaf_count (int): Number of events under the root
+
+        Returns:
+            str: Transaction hash
+        """
+        with self._lock:
+            tx_hash = '0x' + hashlib.sha256(f'{len(self._roots)}:{root}:{leaf_count}'.encode()).hexdigest()
+            self._roots[tx_hash] = root
+        return tx_hash
+
+    def lookup(self, tx_hash):
+        """
+        Root recorded by a transaction.
+
+        Args:
+            tx_hash (str): Transaction hash from anchor()
+
+        Returns:
+            str: Merkle root, or None if the transaction is unknown
+        """
+        with self._lock:
+            return self._roots.get(tx_hash)
+
+
+class BlockchainServiceLedger:
+    """
+    Anchors roots through blockchain_audit.blockchain_service.BlockchainService
+    (the optional audit contract client, installed separately from this repo).
+    The service has no read API, so this ledger has no lookup(); check its
+    transactions on a block explorer instead of with check_ledger.
+    """
+
+    def __init__(self):
+        try:
+            from blockchain_audit.blockchain_service import BlockchainService
+        except ImportError as e:
+            raise ImproperlyConfigured(
+                "BLOCKCHAIN_LEDGER 'service' requires the blockchain_audit package"
+            ) from e
+        self.service = BlockchainService()
+
+    def anchor(self, root, leaf_count):
+        """
+        Write a Merkle root to the audit contract in one transaction.
+
+        Args:
+            root (str): Merkle root hex
+            leaf_count (int): Number of events under the root
+
+        Returns:
+            str: Transaction hash
+        """
+        return self.service.log_event(event_hash=root, event_type='MERKLE_ROOT', success=True)
+
+
+LEDGERS = {
+    'memory': InMemoryLedger,
+    'service': BlockchainServiceLedger,
+}
+
+_ledger_instances = {}
+_ledger_lock = threading.Lock()
+
+
+def get_ledger(ledger_name=None):
+    """
+    Get the configured audit ledger.
+
+    Args:
+        ledger_name (str): Ledger alias or dotted path (defaults to BLOCKCHAIN_LEDGER)
+
+    Returns:
+        object: Ledger instance with anchor(root, leaf_count), and lookup(tx_hash)
+                if roots can be read back from it
+    """
+    ledger_name = ledger_name or settings.BLOCKCHAIN_LEDGER
+
+    ledger = _ledger_instances.get(ledger_name)
+    if ledger is None:
+        with _ledger_lock:
+            ledger = _ledger_instances.get(ledger_name)
+            if ledger is None:
+                ledger_class = LEDGERS.get(ledger_name)
+                if ledger_class is None:
+                    try:
+                        ledger_class = import_string(ledger_name)
+                    except ImportError as e:
+                        raise ImproperlyConfigured(f'Unknown BLOCKCHAIN_LEDGER: {ledger_name}') from e
+                ledger = ledger_class()
+                _ledger_instances[ledger_name] = ledger
+
+    return ledger
+
+
+def require_ledger_lookup(ledger_names=None):
+    """
+    Make sure roots can be read back from ledgers before checking them.
+
+    Args:
+        ledger_names (iterable): Ledgers to check (defaults to every ledger that anchored a root)
+
+    Raises:
+        ImproperlyConfigured: If a ledger cannot be loaded or has no lookup()
+    """
+    if ledger_names is None:
+        ledger_names = MerkleAnchor.objects.order_by().values_list('ledger', flat=True).distinct()
+    for ledger_name in ledger_names:
+        if not callable(getattr(get_ledger(ledger_name), 'lookup', None)):
+            raise ImproperlyConfigured(
+                f"BLOCKCHAIN_LEDGER '{ledger_name}' cannot look up anchored roots; verify without the ledger check"
+            )
+
+
+# ============================================================================
+# ANCHORING PIPELINE
+# ============================================================================
+
+def _build_anchor(batch_size, ledger_name):
+    """Hash the next batch of unanchored events into a MerkleAnchor with proofs"""
+    with transaction.atomic():
+        events = list(
+            AuthenticationEvent.objects
+            .filter(Q(blockchain_hash__isnull=True) | Q(blockchain_hash=''))
+            .select_related('device')
+            # Concurrent anchorers on PostgreSQL take disjoint batches (ignored on SQLite)
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return None
+
+        event_hashes = [event.generate_event_hash() for event in events]
+        levels = build_tree(event_hashes)
+        anchor = MerkleAnchor.objects.create(
+            root=levels[-1][0],
+            leaf_count=len(events),
+            first_event_id=events[0].id,
+            last_event_id=events[-1].id,
+            ledger=ledger_name,
+        )
+        EventInclusionProof.objects.bulk_create([
+            EventInclusionProof(
+                event_id=event.id,
+                anchor=anchor,
+                leaf_index=index,
+                event_hash=event_hash,
+                path=inclusion_path(levels, index),
+            )
+            for index, (event, event_hash) in enumerate(zip(events, event_hashes))
+        ])
+
+        # One correlated UPDATE from the proofs (bulk_update's CASE per row costs far more)
+        AuthenticationEvent.objects.filter(id__in=anchor.proofs.values('event_id')).update(
+            blockchain_hash=Subquery(
+                EventInclusionProof.objects.filter(event_id=OuterRef('id')).values('event_hash')[:1]
+            )
+        )
+
+    return anchor
+
+
+def _send_anchor(anchor):
+    """
+    Write an anchor's root to its ledger and stamp the transaction on its events.
+
+    Returns:
+        bool: True if the ledger accepted the root
+    """
+    try:
+        tx_hash = get_ledger(anchor.ledger).anchor(anchor.root, anchor.leaf_count)
+    except Exception as e:
+        # The root stays pending (empty tx_hash) and is retried on the next run
+        logger.error(f"Anchoring Merkle root {anchor.root} failed: {str(e)}")
+        return False
+
+    with transaction.atomic():
+        anchor.tx_hash = tx_hash
+        anchor.anchored_at = timezone.now()
+        anchor.save(update_fields=['tx_hash', 'anchored_at'])
+        AuthenticationEvent.objects.filter(
+            id__in=anchor.proofs.values('event_id')
+        ).update(blockchain_tx_hash=tx_hash)
+
+    logger.info(f"Anchored {anchor.leaf_count} events under Merkle root {anchor.root} ({tx_hash})")
+    return True
+
+
+def anchor_pending_events(batch_size=None, ledger_name=None):
+    """
+    Anchor every event not yet anchored, one Merkle root per batch.
+    Roots left pending by an earlier ledger failure are sent first.
+
+    Args:
+        batch_size (int): Events per Merkle tree (defaults to BLOCKCHAIN_ANCHOR_BATCH_SIZE)
+        ledger_name (str): Ledger for new roots (defaults to BLOCKCHAIN_LEDGER)
+
+    Returns:
+        dict: Number of 'roots' and 'events' anchored, and 'pending' roots still unsent
+    """
+    batch_size = max(int(batch_size or settings.BLOCKCHAIN_ANCHOR_BATCH_SIZE), 1)
+    ledger_name = ledger_name or settings.BLOCKCHAIN_LEDGER
+    stats = {'roots': 0, 'events': 0, 'pending': 0}
+
+    def send(anchor):
+        if _send_anchor(anchor):
+            stats['roots'] += 1
+            stats['events'] += anchor.leaf_count
+            return True
+        stats['pending'] += 1
+        return False
+
+    for anchor in MerkleAnchor.objects.filter(tx_hash='').order_by('id'):
+        if not send(anchor):
+            # The ledger is unreachable; don't pile up more roots behind it
+            return stats
+
+    while True:
+        anchor = _build_anchor(batch_size, ledger_name)
+        if anchor is None or not send(anchor) or anchor.leaf_count < batch_size:
+            return stats
+
+
+class AnchorWorker(threading.Thread):
+    """
+    Daemon thread that runs anchor_pending_events every interval_seconds.
+    """
+
+    def __init__(self, interval_seconds):
+        super().__init__(name='nullpass-anchor-worker', daemon=True)
+        self.interval_seconds = interval_seconds
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                anchor_pending_events()
+            except Exception as e:
+                logger.error(f"Anchor worker error: {str(e)}")
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        """Ask the worker to exit after the current pass"""
+        self._stop_event.set()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_anchor_worker():
+    """
+    Start the in-process anchor worker once per process.
+
+    Returns:
+        AnchorWorker: The running worker
+    """
+    global _worker
+
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = AnchorWorker(settings.BLOCKCHAIN_ANCHOR_INTERVAL_SECONDS)
+            _worker.start()
+            logger.info(f"Anchor worker started (every {settings.BLOCKCHAIN_ANCHOR_INTERVAL_SECONDS}s)")
+
+    return _worker
+
+
+# ============================================================================
+# VERIFICATION
+# ============================================================================
+
+def verify_events(event_ids=None, check_ledger=False, chunk_size=500):
+    """
+    Recheck events against their anchored Merkle roots.
+    Events still in the hot table are rehashed from their rows. Events moved out
+    by roll_event_partitions are read back from their archive files, whose
+    SHA256 must match EventArchivePartition.sha256, and rehashed from there.
+
+    Args:
+        event_ids (list): Events to check (defaults to every event with a proof)
+        check_ledger (bool): Also ask the ledger that the root was recorded by its transaction
+        chunk_size (int): Proofs read per database round trip
+
+    Returns:
+        generator: One dict per event with 'event_id', 'status' ('valid', 'invalid',
+                   'unanchored', or 'missing' if the row is in neither the hot table nor
+                   an archive file), 'reason', 'root', 'tx_hash' and 'archive' (file path
+                   for archived events, else None)
+
+    Raises:
+        ImproperlyConfigured: With check_ledger, if a ledger that anchored roots has no lookup()
+    """
+    if check_ledger:
+        require_ledger_lookup()
+
+    proofs = EventInclusionProof.objects.select_related('anchor').order_by('event_id')
+    if event_ids is not None:
+        event_ids = [int(event_id) for event_id in event_ids]
+        proofs = proofs.filter(event_id__in=event_ids)
+        found = set(proofs.values_list('event_id', flat=True))
+        for event_id in event_ids:
+            if event_id not in found:
+                yield {'event_id': event_id, 'status': 'unanchored', 'reason': 'No inclusion proof',
+                       'root': None, 'tx_hash': None, 'archive': None}
+
+    ledger_roots = {}
+
+    def ledger_reason(anchor):
+        if anchor.id not in ledger_roots:
+            if not anchor.tx_hash:
+                reason = 'Root not yet sent to the ledger'
+            else:
+                try:
+                    recorded = get_ledger(anchor.ledger).lookup(anchor.tx_hash)
+                    reason = None if recorded == anchor.root else 'Root not found on the ledger'
+                except Exception as e:
+                    reason = f'Ledger lookup failed: {str(e)}'
+            ledger_roots[anchor.id] = reason
+        return ledger_roots[anchor.id]
+
+    def check(proof, event_hash, archive=None, reason=None):
+        anchor = proof.anchor
+        if reason is None and event_hash != proof.event_hash:
+            reason = 'Event no longer matches its anchored hash'
+        if reason is None and not verify_inclusion(proof.event_hash, proof.path, anchor.root):
+            reason = 'Inclusion proof does not lead to the anchored root'
+        if reason is None and check_ledger:
+            reason = ledger_reason(anchor)
+        return {
+            'event_id': proof.event_id,
+            'status': 'invalid' if reason else 'valid',
+            'reason': reason,
+            'root': anchor.root,
+            'tx_hash': anchor.tx_hash or None,
+            'archive': archive,
+        }
+
+    # Hot events; ids without a row are looked for in the archives afterwards
+    archived_ids = set()
+    chunk = []
+    for proof in proofs.iterator(chunk_size=chunk_size):
+        chunk.append(proof)
+        if len(chunk) >= chunk_size:
+            yield from _verify_hot_chunk(chunk, check, archived_ids)
+            chunk = []
+    if chunk:
+        yield from _verify_hot_chunk(chunk, check, archived_ids)
+
+    if archived_ids:
+        yield from _verify_archived(archived_ids, check, chunk_size)
+
+
+def _verify_hot_chunk(proofs, check, archived_ids):
+    events = AuthenticationEvent.objects.select_related('device').in_bulk([proof.event_id for proof in proofs])
+    for proof in proofs:
+        event = events.get(proof.event_id)
+        if event is None:
+            archived_ids.add(proof.event_id)
+        else:
+            yield check(proof, event.generate_event_hash())
+
+
+def _archived_event_hash(row, devices):
+    device_identifier = row.get('device_identifier')
+    if device_identifier is None:
+        # Archived before events kept their own copy of the device_id
+        device = devices.get(row['device_id'])
+        device_identifier = device.device_id if device else None
+    return AuthenticationEvent.compute_event_hash(
+        row['event_type'],
+        device_identifier or None,
+        datetime.fromisoformat(row['timestamp']),
+        row['success']
+    )
+
+
+def _verify_archived_chunk(rows, partition, intact, check):
+    proofs = EventInclusionProof.objects.select_related('anchor').in_bulk(
+        [row['id'] for row in rows], field_name='event_id'
+    )
+    devices = TrustedDevice.objects.in_bulk(
+        {row['device_id'] for row in rows if row['device_id'] and 'device_identifier' not in row}
+    )
+    reason = None if intact else f'Archive file does not match its recorded SHA256 ({partition.sha256})'
+    for row in rows:
+        yield check(proofs[row['id']], _archived_event_hash(row, devices), archive=partition.path, reason=reason)
+
+
+def _verify_archived(event_ids, check, chunk_size):
+    """Find anchored events in the archive files and recheck them from their archived rows"""
+    remaining = set(event_ids)
+    for partition in EventArchivePartition.objects.order_by('start', 'id'):
+        if not remaining:
+            break
+        if not os.path.exists(partition.path):
+            logger.warning(f"Archive file {partition.path} is missing; its events cannot be verified")
+            continue
+
+        intact = archive_file_sha256(partition.path) == partition.sha256
+        rows = []
+        for row in read_archived_events(partition):
+            if row['id'] in remaining:
+                remaining.discard(row['id'])
+                rows.append(row)
+                if len(rows) >= chunk_size:
+                    yield from _verify_archived_chunk(rows, partition, intact, check)
+                    rows = []
+        if rows:
+            yield from _verify_archived_chunk(rows, partition, intact, check)
+
+    if remaining:
+        anchors = {
+            proof.event_id: proof.anchor
+            for proof in EventInclusionProof.objects.select_related('anchor').filter(event_id__in=remaining)
+        }
+        for event_id in sorted(remaining):
+            yield {
+                'event_id': event_id,
+                'status': 'missing',
+                'reason': 'Event is in neither the hot table nor an archive file',
+                'root': anchors[event_id].root,
+                'tx_hash': anchors[event_id].tx_hash or None,
+                'archive': None,
+            }
+
+
+def verify_event(event_id, check_ledger=False):
+    """
+    Recheck one event against its anchored Merkle root.
+
+    Args:
+        event_id (int): AuthenticationEvent id
+        check_ledger (bool): Also ask the ledger that the root was recorded
+
+    Returns:
+        dict: Result as yielded by verify_events
+    """
+    return next(verify_events([event_id], check_ledger=check_ledger))
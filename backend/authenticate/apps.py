@@ -3,3 +3,37 @@ from django.apps import AppConfig
 
 class AuthenticateConfig(AppConfig):
     name = 'authenticate'
+
+    def ready(self):
+        from django.conf import settings
+
+        if settings.CHALLENGE_STORE == 'signed':
+            # Refuse a replayable configuration at startup rather than on the first login
+            from .challenge_store import get_challenge_store
+            get_challenge_store()
+
+
+def start_background_workers():
+    """
+    Start the opt-in background threads of a serving process.
+
+    Called from nullpass/wsgi.py and nullpass/asgi.py once the application is
+    loaded, so the threads run under runserver and WSGI/ASGI servers but not in
+    migrate, test, shell or other management commands, nor in the autoreloader's
+    parent process. Without a serving process, run the purge_expired and
+    anchor_events commands from cron instead.
+    """
+    from django.conf import settings
+
+    if settings.PURGE_SWEEPER_ENABLED:
+        from .maintenance import start_purge_sweeper
+        start_purge_sweeper()
+
+    if settings.CHALLENGE_POOL_ENABLED:
+        # Warm the pool before the first login request; otherwise it starts on that request
+        from .challenge_pool import get_challenge_pool
+        get_challenge_pool()
+
+    if settings.BLOCKCHAIN_ENABLED:
+        from .anchoring import start_anchor_worker
+        start_anchor_worker()
@@ -0,0 +1,327 @@
+"""
+Async (ASGI-native) API views for NullPass authentication.
+These mirror the hot endpoints in views.py using Django's async ORM, so under
+uvicorn/daphne a request does not hop to a thread, and long-poll or SSE
+waiters do not hold one. CPU-bound EC verification and QR rendering run on
+executors; transactional writes reuse the sync helpers via sync_to_async.
+Enabled with AUTH_ASYNC_VIEWS (see urls.py).
+"""
+
+import asyncio
+import json
+import logging
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from .challenge_notifier import get_challenge_notifier
+from .challenge_pool import get_challenge_pool
+from .challenge_store import get_challenge_store
+from .models import TrustedDevice
+from .qr import render_qr
+from .session_cache import aget_active_session
+from .utils import (
+    build_auth_url,
+    decode_jwt_token,
+    get_request_metadata,
+    get_verification_executor,
+    verify_ecdsa_signature,
+)
+from .views import (
+    CHALLENGE_EXPIRATION_MINUTES,
+    _challenge_status_data,
+    _latest_device_session,
+    _seconds_until_expiry,
+    build_challenge_status_response,
+    complete_login,
+    get_requested_qr_format,
+    login_success_response,
+    record_invalid_signature,
+    record_replay_attack,
+)
+
+logger = logging.getLogger('authenticate')
+
+
+async def run_in_executor(executor, func, *args, **kwargs):
+    """
+    Run a blocking, CPU-bound callable off the event loop.
+
+    Args:
+        executor (Executor): Pool to run on, or None for the loop's default
+        func (callable): Function to call
+
+    Returns:
+        object: The function's return value
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+
+# ============================================================================
+# LOGIN REQUEST (QR GENERATION)
+# ============================================================================
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def request_login(request):
+    """
+    Async version of views.request_login.
+    """
+    try:
+        qr_format = get_requested_qr_format(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    try:
+        metadata = get_request_metadata(request)
+        challenge_store = get_challenge_store()
+
+        challenge_pool = get_challenge_pool()
+        pooled = challenge_pool.pop(qr_format) if challenge_pool is not None else None
+
+        if pooled is not None:
+            # Persisting at handout makes the expiry count from now
+            challenge = await challenge_store.acreate(
+                ip_address=metadata['ip_address'],
+                expiration_minutes=CHALLENGE_EXPIRATION_MINUTES,
+                challenge_data=pooled.challenge_data
+            )
+            auth_url = pooled.auth_url
+            if pooled.qr_format == qr_format:
+                qr_fields = pooled.qr_fields
+            else:
+                qr_fields = await run_in_executor(None, render_qr, auth_url, qr_format)
+        else:
+            challenge = await challenge_store.acreate(
+                ip_address=metadata['ip_address'],
+                expiration_minutes=CHALLENGE_EXPIRATION_MINUTES
+            )
+            auth_url = build_auth_url(challenge.challenge_id, challenge.nonce)
+
+            # QR encoding and rendering are pure CPU work
+            qr_fields = await run_in_executor(None, render_qr, auth_url, qr_format)
+
+        return JsonResponse({
+            'success': True,
+            'challenge_id': challenge.challenge_id,
+            'nonce': challenge.nonce,          # Required for simulation
+            'auth_url': auth_url,
+            **qr_fields
+        })
+
+    except Exception as e:
+        logger.error(f"Login request error: {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+# ============================================================================
+# SIGNATURE VERIFICATION (AUTHENTICATION)
+# ============================================================================
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def verify_signature(request):
+    """
+    Async version of views.verify_signature.
+    """
+    try:
+        data = json.loads(request.body)
+        challenge_id = data.get('challenge_id')
+        device_id = data.get('device_id')
+        signature_base64 = data.get('signature')
+
+        metadata = get_request_metadata(request)
+
+        # 1. Validate Challenge
+        challenge_store = get_challenge_store()
+        challenge = await challenge_store.aget(challenge_id)
+        if challenge is None:
+            return JsonResponse({'success': False, 'error': 'Invalid challenge ID'}, status=404)
+
+        if challenge.is_used:
+            device = await TrustedDevice.objects.filter(device_id=device_id).afirst()
+            await sync_to_async(record_replay_attack)(device, metadata)
+            return JsonResponse({'success': False, 'error': 'Challenge already used'}, status=403)
+
+        if challenge.is_expired():
+            return JsonResponse({'success': False, 'error': 'Challenge expired'}, status=403)
+
+        # 2. Validate Device
+        try:
+            device = await TrustedDevice.objects.aget(device_id=device_id)
+        except TrustedDevice.DoesNotExist:
+            return JsonResponse({'success': False, 'error': 'Device not registered'}, status=403)
+
+        # 3. Verify Signature on the verification pool
+        message = challenge_id + challenge.nonce
+        is_valid, error = await run_in_executor(
+            get_verification_executor(),
+            verify_ecdsa_signature,
+            device.public_key,
+            message,
+            signature_base64,
+            device_id=device.device_id,
+            signature_format=device.signature_format or None
+        )
+
+        if not is_valid:
+            await sync_to_async(record_invalid_signature)(device, metadata, error)
+            return JsonResponse({'success': False, 'error': 'Invalid signature'}, status=403)
+
+        # 4. Success Logic - the write transaction runs on Django's sync thread
+        session_token = await sync_to_async(complete_login)(challenge_store, challenge_id, device, metadata)
+
+        if session_token is None:
+            await sync_to_async(record_replay_attack)(device, metadata)
+            return JsonResponse({'success': False, 'error': 'Challenge already used'}, status=403)
+
+        return login_success_response(session_token)
+
+    except Exception as e:
+        logger.error(f"Verification error: {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+# ============================================================================
+# CHALLENGE STATUS CHECK (POLLING)
+# ============================================================================
+
+async def _challenge_status_response(challenge):
+    """Async version of views._challenge_status_response"""
+    response_data = _challenge_status_data(challenge)
+    latest_session = None
+
+    if response_data['authenticated']:
+        latest_session = await _latest_device_session(challenge.device_id).afirst()
+
+    return build_challenge_status_response(response_data, latest_session)
+
+
+@require_http_methods(["GET"])
+async def check_challenge_status(request):
+    """
+    Async version of views.check_challenge_status.
+    """
+    challenge_id = request.GET.get('challenge_id')
+
+    if not challenge_id:
+        return JsonResponse({'error': 'Missing challenge_id'}, status=400)
+
+    challenge = await get_challenge_store().aget(challenge_id)
+    if challenge is None:
+        return JsonResponse({'error': 'Challenge not found'}, status=404)
+
+    return await _challenge_status_response(challenge)
+
+
+@require_http_methods(["GET"])
+async def wait_challenge_status(request):
+    """
+    Async version of views.wait_challenge_status.
+    A waiting request costs one coroutine instead of one worker thread.
+    """
+    challenge_id = request.GET.get('challenge_id')
+
+    if not challenge_id:
+        return JsonResponse({'error': 'Missing challenge_id'}, status=400)
+
+    max_timeout = settings.CHALLENGE_LONG_POLL_TIMEOUT_SECONDS
+    try:
+        timeout = min(float(request.GET.get('timeout', max_timeout)), max_timeout)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid timeout'}, status=400)
+
+    challenge_store = get_challenge_store()
+
+    # Subscribe before reading so a completion in between is not missed
+    with get_challenge_notifier().subscribe(challenge_id) as subscription:
+        challenge = await challenge_store.aget(challenge_id)
+        if challenge is None:
+            return JsonResponse({'error': 'Challenge not found'}, status=404)
+
+        if challenge.is_valid() and timeout > 0:
+            if await subscription.async_wait(min(timeout, _seconds_until_expiry(challenge))):
+                challenge = await challenge_store.aget(challenge_id) or challenge
+
+    return await _challenge_status_response(challenge)
+
+
+@require_http_methods(["GET"])
+async def stream_challenge_status(request):
+    """
+    Async version of views.stream_challenge_status.
+    """
+    challenge_id = request.GET.get('challenge_id')
+
+    if not challenge_id:
+        return JsonResponse({'error': 'Missing challenge_id'}, status=400)
+
+    challenge_store = get_challenge_store()
+    if await challenge_store.aget(challenge_id) is None:
+        return JsonResponse({'error': 'Challenge not found'}, status=404)
+
+    async def event_stream():
+        heartbeat = settings.CHALLENGE_SSE_HEARTBEAT_SECONDS
+        last_data = None
+
+        with get_challenge_notifier().subscribe(challenge_id) as subscription:
+            while True:
+                challenge = await challenge_store.aget(challenge_id)
+                if challenge is None:
+                    yield 'event: error\ndata: {"error": "Challenge not found"}\n\n'
+                    return
+
+                data = _challenge_status_data(challenge)
+                if data != last_data:
+                    yield f'event: status\ndata: {json.dumps(data)}\n\n'
+                    last_data = data
+
+                if not challenge.is_valid():
+                    return
+
+                if not await subscription.async_wait(min(heartbeat, _seconds_until_expiry(challenge))):
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n'
+
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable nginx response buffering
+    return response
+
+
+# ============================================================================
+# SESSION VALIDATION (NAVBAR CHECK)
+# ============================================================================
+
+@csrf_exempt
+async def validate_session(request):
+    """
+    Async version of views.validate_session.
+    """
+    token = request.COOKIES.get('session_token')
+    if not token:
+        auth_header = request.headers.get('Authorization', '')
+        if auth_header.startswith('Bearer '):
+            token = auth_header[7:]
+
+    if not token:
+        return JsonResponse({'authenticated': False}, status=200)
+
+    payload, error = decode_jwt_token(token)
+    if error:
+        return JsonResponse({'authenticated': False, 'error': error}, status=200)
+
+    session, error = await aget_active_session(payload['session_id'])
+    if error:
+        return JsonResponse({'authenticated': False}, status=200)
+
+    return JsonResponse({
+        'authenticated': True,
+        'device_name': session['device']['device_name'],
+        'session_id': session['session_id']
+    })
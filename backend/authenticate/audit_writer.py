@@ -0,0 +1,233 @@
+"""
+Batched audit event writer for NullPass.
+record_event writes security-critical events (failures, attacks,
+deactivations) before returning, in the caller's transaction. Event types in
+AUDIT_ASYNC_EVENT_TYPES (high-volume successes) are fire-and-forget when
+AUDIT_WRITER_ENABLED is on: they are queued in process and a daemon thread
+writes them with one bulk_create per batch, when AUDIT_WRITER_BATCH_SIZE
+events are waiting or every AUDIT_WRITER_FLUSH_SECONDS. The queue is flushed
+again at interpreter exit. Queued events take their timestamp when recorded
+and their attack classification before insert, so each row is written once.
+"""
+
+import atexit
+import logging
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+from .models import AuthenticationEvent
+from .rollups import record_events
+
+logger = logging.getLogger('authenticate')
+
+
+def write_events(events):
+    """
+    Insert events with bulk_create and count them in the hourly rollups.
+
+    Args:
+        events (list): Unsaved AuthenticationEvent instances
+    """
+    with transaction.atomic():
+        AuthenticationEvent.objects.bulk_create(events)
+        record_events(events)
+
+
+class AuditWriter:
+    """
+    In-process queue of AuthenticationEvents drained by a daemon thread.
+    """
+
+    def __init__(self, batch_size, flush_seconds):
+        self.batch_size = max(int(batch_size), 1)
+        self.flush_seconds = flush_seconds
+        self._queue = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+
+    def submit(self, event):
+        """
+        Queue an unsaved event for the next batch.
+
+        Args:
+            event (AuthenticationEvent): Event with its fields and timestamp set
+        """
+        with self._lock:
+            self._queue.append(event)
+            full = len(self._queue) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def pending(self):
+        """Number of events waiting to be written"""
+        with self._lock:
+            return len(self._queue)
+
+    def flush(self):
+        """
+        Write every queued event now.
+
+        Returns:
+            int: Number of events written
+        """
+        with self._flush_lock:
+            with self._lock:
+                events, self._queue = self._queue, []
+            if not events:
+                return 0
+
+            try:
+                write_events(events)
+                written = len(events)
+            except Exception as e:
+                # One bad row (e.g. a device deleted meanwhile) must not sink the batch
+                logger.error(f"Audit batch of {len(events)} events failed, writing one by one: {str(e)}")
+                written = 0
+                for event in events:
+                    event.pk = None
+                    try:
+                        write_events([event])
+                        written += 1
+                    except Exception as event_error:
+                        logger.error(f"Dropped {event.event_type} audit event: {str(event_error)}")
+
+            with self._lock:
+                self.written += written
+                self.dropped += len(events) - written
+            return written
+
+    def start(self):
+        """Start the writer thread once"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name='nullpass-audit-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_seconds)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Audit writer error: {str(e)}")
+            finally:
+                close_old_connections()
+        connections.close_all()
+
+    def stop(self, timeout=5):
+        """
+        Stop the writer thread and write whatever is still queued.
+
+        Args:
+            timeout (float): Seconds to wait for an in-flight batch
+
+        Returns:
+            int: Events written while stopping
+        """
+        with self._lock:
+            written_before = self.written
+        self._stopping.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self.flush()
+        with self._lock:
+            return self.written - written_before
+
+    def stats(self):
+        """Return a snapshot of the writer counters"""
+        with self._lock:
+            return {
+                'pending': len(self._queue),
+                'written': self.written,
+                'dropped': self.dropped,
+            }
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_audit_writer():
+    """
+    Get the process-wide audit writer, starting its thread on first use.
+
+    Returns:
+        AuditWriter: The writer, or None if AUDIT_WRITER_ENABLED is off
+    """
+    global _writer
+
+    if not settings.AUDIT_WRITER_ENABLED:
+        return None
+
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                writer = AuditWriter(settings.AUDIT_WRITER_BATCH_SIZE, settings.AUDIT_WRITER_FLUSH_SECONDS)
+                writer.start()
+                _writer = writer
+                logger.info(
+                    f"Audit writer started (batches of {writer.batch_size}, every {writer.flush_seconds}s)"
+                )
+
+    return _writer
+
+
+def shutdown_audit_writer():
+    """
+    Stop the audit writer and flush its queue; runs at interpreter exit.
+
+    Returns:
+        int: Events written while stopping
+    """
+    global _writer
+
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is None:
+        return 0
+
+    written = writer.stop()
+    logger.info(f"Audit writer stopped, flushed {written} queued events")
+    return written
+
+
+atexit.register(shutdown_audit_writer)
+
+
+def record_event(durable=None, **fields):
+    """
+    Record an authentication event.
+
+    Args:
+        durable (bool): Write before returning; defaults to True unless the event
+                        type is in AUDIT_ASYNC_EVENT_TYPES
+        **fields: AuthenticationEvent fields
+
+    Returns:
+        AuthenticationEvent: The event (unsaved until its batch is written if queued)
+    """
+    event = AuthenticationEvent(**fields)
+    event.classify_attack()
+
+    if durable is None:
+        durable = event.event_type not in settings.AUDIT_ASYNC_EVENT_TYPES
+
+    writer = None if durable else get_audit_writer()
+    if writer is None:
+        event.save()
+    else:
+        # Events recorded inside a transaction are only queued if it commits
+        transaction.on_commit(partial(writer.submit, event))
+    return event
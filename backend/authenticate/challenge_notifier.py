@@ -0,0 +1,344 @@
+"""
+Challenge completion notifiers for NullPass.
+Browsers waiting on a login QR code hold a long-poll or Server-Sent Events
+connection instead of polling challenge status. When verify_signature consumes
+a challenge it publishes the challenge_id, and only the connections subscribed
+to that challenge are woken. The notifier is selected with the
+CHALLENGE_NOTIFIER setting:
+
+    local    - in-process events; enough for a single worker process
+    cache    - also writes a marker to the Django cache, which waiters on other
+               processes check between short waits (use with a shared cache)
+    postgres - Postgres LISTEN/NOTIFY; one listener thread per process fans
+               notifications out to its local waiters
+"""
+
+import asyncio
+import logging
+import select
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('authenticate')
+
+
+class ChallengeSubscription:
+    """
+    A waiter's interest in one challenge. Subscribe before reading the
+    challenge state so a completion between the read and the wait is not lost.
+    """
+
+    def __init__(self, notifier, challenge_id, event):
+        self.notifier = notifier
+        self.challenge_id = challenge_id
+        self.event = event
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.notifier.unsubscribe(self)
+
+    def wait(self, timeout):
+        """
+        Block until the challenge is completed or timeout elapses.
+
+        Args:
+            timeout (float): Maximum seconds to wait
+
+        Returns:
+            bool: True if a completion was published for the challenge
+        """
+        return self.notifier.wait(self, timeout)
+
+    async def async_wait(self, timeout):
+        """Async version of wait() that does not block a thread"""
+        return await self.notifier.async_wait(self, timeout)
+
+
+# ============================================================================
+# IN-PROCESS NOTIFIER
+# ============================================================================
+
+class _ChallengeWaiters:
+    """Waiters registered for one challenge in this process"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.count = 0
+        self.async_events = []  # (event loop, asyncio.Event) of async waiters
+
+
+class LocalChallengeNotifier:
+    """
+    Wakes waiters in the current process through one threading.Event per
+    challenge. Async waiters additionally get an asyncio.Event set on their own
+    loop. Entries are reference counted and dropped with their last waiter.
+    """
+    name = 'local'
+
+    def __init__(self):
+        self._waiters = {}  # challenge_id -> _ChallengeWaiters
+        self._lock = threading.Lock()
+
+    def subscribe(self, challenge_id):
+        """
+        Register interest in a challenge.
+
+        Args:
+            challenge_id (str): Challenge identifier
+
+        Returns:
+            ChallengeSubscription: Context manager that unsubscribes on exit
+        """
+        with self._lock:
+            waiters = self._waiters.get(challenge_id)
+            if waiters is None:
+                waiters = self._waiters[challenge_id] = _ChallengeWaiters()
+            waiters.count += 1
+        return ChallengeSubscription(self, challenge_id, waiters.event)
+
+    def unsubscribe(self, subscription):
+        """Release a subscription, dropping the entry with its last waiter"""
+        with self._lock:
+            waiters = self._waiters.get(subscription.challenge_id)
+            if waiters is not None and waiters.event is subscription.event:
+                waiters.count -= 1
+                if waiters.count <= 0:
+                    del self._waiters[subscription.challenge_id]
+
+    def wait(self, subscription, timeout):
+        """Wait on the subscription's event"""
+        return subscription.event.wait(timeout)
+
+    async def async_wait(self, subscription, timeout):
+        """Wait on the subscription without blocking the event loop"""
+        return await self._async_wait_local(subscription, timeout)
+
+    async def _async_wait_local(self, subscription, timeout):
+        if subscription.event.is_set():
+            return True
+
+        async_event = asyncio.Event()
+        registration = (asyncio.get_running_loop(), async_event)
+        with self._lock:
+            waiters = self._waiters.get(subscription.challenge_id)
+            if waiters is not None:
+                waiters.async_events.append(registration)
+
+        try:
+            # Re-check after registering; a wake in between set only the threading.Event
+            if subscription.event.is_set():
+                return True
+            await asyncio.wait_for(async_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return subscription.event.is_set()
+        finally:
+            with self._lock:
+                if waiters is not None and registration in waiters.async_events:
+                    waiters.async_events.remove(registration)
+
+    def notify(self, challenge_id):
+        """
+        Publish that a challenge has been consumed.
+
+        Args:
+            challenge_id (str): Challenge identifier
+        """
+        self._wake(challenge_id)
+
+    def _wake(self, challenge_id):
+        with self._lock:
+            waiters = self._waiters.get(challenge_id)
+            async_events = list(waiters.async_events) if waiters is not None else []
+        if waiters is None:
+            return
+
+        waiters.event.set()
+        for loop, async_event in async_events:
+            loop.call_soon_threadsafe(async_event.set)
+
+    def waiter_count(self):
+        """Number of subscriptions currently held in this process"""
+        with self._lock:
+            return sum(waiters.count for waiters in self._waiters.values())
+
+
+# ============================================================================
+# CACHE NOTIFIER
+# ============================================================================
+
+class CacheChallengeNotifier(LocalChallengeNotifier):
+    """
+    Publishes completions as a short-lived cache marker so waiters served by
+    other processes see them. Same-process waiters are still woken instantly;
+    the others check the marker every CHALLENGE_NOTIFY_POLL_INTERVAL seconds,
+    which costs one cache read instead of one HTTP request and ORM query.
+    """
+    name = 'cache'
+    key_prefix = 'nullpass:challenge-done:'
+
+    @property
+    def cache(self):
+        return caches[settings.CHALLENGE_STORE_CACHE_ALIAS]
+
+    def _key(self, challenge_id):
+        return f'{self.key_prefix}{challenge_id}'
+
+    def wait(self, subscription, timeout):
+        """Wait on the local event, checking the shared marker between slices"""
+        interval = settings.CHALLENGE_NOTIFY_POLL_INTERVAL
+        remaining = timeout
+
+        while remaining > 0:
+            if subscription.event.wait(min(interval, remaining)):
+                return True
+            if self.cache.get(self._key(subscription.challenge_id)):
+                return True
+            remaining -= interval
+
+        return subscription.event.is_set()
+
+    async def async_wait(self, subscription, timeout):
+        """Async version of wait() that does not block the event loop"""
+        interval = settings.CHALLENGE_NOTIFY_POLL_INTERVAL
+        remaining = timeout
+
+        while remaining > 0:
+            if await self._async_wait_local(subscription, min(interval, remaining)):
+                return True
+            if await self.cache.aget(self._key(subscription.challenge_id)):
+                return True
+            remaining -= interval
+
+        return subscription.event.is_set()
+
+    def notify(self, challenge_id):
+        """
+        Publish that a challenge has been consumed.
+
+        Args:
+            challenge_id (str): Challenge identifier
+        """
+        self.cache.set(self._key(challenge_id), True, settings.CHALLENGE_LONG_POLL_TIMEOUT_SECONDS * 2)
+        self._wake(challenge_id)
+
+
+# ============================================================================
+# POSTGRES LISTEN/NOTIFY NOTIFIER
+# ============================================================================
+
+class PostgresChallengeNotifier(LocalChallengeNotifier):
+    """
+    Publishes completions with pg_notify(). Notifications issued inside a
+    transaction are delivered on commit, so waiters never observe a challenge
+    that was rolled back. Each process runs one listener thread on a dedicated
+    connection that wakes its local waiters.
+    """
+    name = 'postgres'
+    channel = 'nullpass_challenges'
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+        self._listener_lock = threading.Lock()
+
+    def subscribe(self, challenge_id):
+        """
+        Register interest in a challenge, starting the listener on first use.
+
+        Args:
+            challenge_id (str): Challenge identifier
+
+        Returns:
+            ChallengeSubscription: Context manager that unsubscribes on exit
+        """
+        self._ensure_listener()
+        return super().subscribe(challenge_id)
+
+    def notify(self, challenge_id):
+        """
+        Publish that a challenge has been consumed.
+
+        Args:
+            challenge_id (str): Challenge identifier
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, challenge_id])
+
+    def _ensure_listener(self):
+        with self._listener_lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(
+                    target=self._listen, name='nullpass-challenge-listener', daemon=True
+                )
+                self._listener.start()
+
+    def _listen(self):
+        listen_connection = connections.create_connection('default')
+        try:
+            listen_connection.ensure_connection()
+            # Django's postgres connections run in autocommit, so LISTEN takes effect at once
+            raw_connection = listen_connection.connection
+            with raw_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {self.channel}')
+
+            while True:
+                if select.select([raw_connection], [], [], 60) == ([], [], []):
+                    continue
+                raw_connection.poll()
+                while raw_connection.notifies:
+                    self._wake(raw_connection.notifies.pop(0).payload)
+        except Exception as e:
+            logger.error(f"Challenge listener stopped: {str(e)}")
+        finally:
+            listen_connection.close()
+
+
+# ============================================================================
+# NOTIFIER SELECTION
+# ============================================================================
+
+CHALLENGE_NOTIFIERS = {
+    'local': LocalChallengeNotifier,
+    'cache': CacheChallengeNotifier,
+    'postgres': PostgresChallengeNotifier,
+}
+
+_notifier_instances = {}
+_notifier_lock = threading.Lock()
+
+
+def get_challenge_notifier(notifier_name=None):
+    """
+    Get the configured challenge notifier.
+
+    Args:
+        notifier_name (str): Notifier alias or dotted path (defaults to CHALLENGE_NOTIFIER)
+
+    Returns:
+        object: Notifier instance with subscribe() and notify()
+    """
+    notifier_name = notifier_name or settings.CHALLENGE_NOTIFIER
+
+    notifier = _notifier_instances.get(notifier_name)
+    if notifier is None:
+        with _notifier_lock:
+            notifier = _notifier_instances.get(notifier_name)
+            if notifier is None:
+                notifier_class = CHALLENGE_NOTIFIERS.get(notifier_name)
+                if notifier_class is None:
+                    try:
+                        notifier_class = import_string(notifier_name)
+                    except ImportError as e:
+                        raise ImproperlyConfigured(f'Unknown CHALLENGE_NOTIFIER: {notifier_name}') from e
+                notifier = notifier_class()
+                _notifier_instances[notifier_name] = notifier
+
+    return notifier
@@ -0,0 +1,196 @@
+"""
+Warm pool of pre-generated login challenges for NullPass.
+A background thread keeps up to CHALLENGE_POOL_SIZE entries ready, each holding
+a challenge ID, nonce, login URL and QR code pre-rendered in
+CHALLENGE_POOL_QR_FORMAT (by default 'matrix', what the frontend asks for).
+request_login pops an entry in O(1) and only persists it, so QR rendering is
+off the request path; a request for another format still takes the pooled
+challenge and only renders its QR code on demand. Entries are stored through the challenge store when they
+are handed out, which makes CHALLENGE_EXPIRATION_MINUTES count from handout
+and leaves nothing behind if the process exits with a full pool.
+Stateless challenge stores derive the challenge_id when the challenge is
+issued, so the pool is bypassed for them.
+"""
+
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+
+from .challenge_store import get_challenge_store
+from .qr import normalize_qr_format, render_qr
+from .utils import build_auth_url, generate_challenge_nonce
+
+logger = logging.getLogger('authenticate')
+
+
+class PooledChallenge:
+    """
+    A pre-generated challenge waiting to be handed out.
+    """
+
+    __slots__ = ('challenge_id', 'nonce', 'auth_url', 'qr_format', 'qr_fields')
+
+    def __init__(self, challenge_id, nonce, auth_url, qr_format, qr_fields):
+        self.challenge_id = challenge_id
+        self.nonce = nonce
+        self.auth_url = auth_url
+        self.qr_format = qr_format
+        self.qr_fields = qr_fields
+
+    @property
+    def challenge_data(self):
+        """challenge_id and nonce in the shape expected by the challenge stores"""
+        return {'challenge_id': self.challenge_id, 'nonce': self.nonce}
+
+
+class ChallengePool:
+    """
+    Bounded deque of PooledChallenge entries refilled by a daemon thread.
+    The filler wakes when the depth drops below refill_at and tops the pool
+    back up to size.
+    """
+
+    def __init__(self, size, refill_at=None, qr_format=None):
+        self.size = size
+        self.refill_at = refill_at if refill_at is not None else size // 2
+        self.qr_format = normalize_qr_format(qr_format)
+        self._entries = deque()
+        self._lock = threading.Lock()
+        self._wanted = threading.Event()
+        self._filler = None
+        self.hits = 0
+        self.qr_renders = 0
+        self.fallbacks = 0
+        self.generated = 0
+
+    def _generate(self):
+        challenge = generate_challenge_nonce()
+        auth_url = build_auth_url(challenge['challenge_id'], challenge['nonce'])
+        return PooledChallenge(
+            challenge['challenge_id'],
+            challenge['nonce'],
+            auth_url,
+            self.qr_format,
+            render_qr(auth_url, self.qr_format)
+        )
+
+    def fill(self):
+        """
+        Generate entries until the pool is full.
+
+        Returns:
+            int: Number of entries added
+        """
+        added = 0
+        while len(self._entries) < self.size:
+            self._entries.append(self._generate())
+            added += 1
+        with self._lock:
+            self.generated += added
+        return added
+
+    def pop(self, qr_format=None):
+        """
+        Take a pre-generated challenge.
+
+        Args:
+            qr_format (str): Normalized QR format the caller will serve; when it is
+                             not entry.qr_format the caller renders the QR code
+                             from entry.auth_url
+
+        Returns:
+            PooledChallenge: The entry, or None if the caller must generate inline
+        """
+        try:
+            entry = self._entries.popleft()
+        except IndexError:
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.fallbacks += 1
+            elif entry.qr_format == qr_format:
+                self.hits += 1
+            else:
+                self.qr_renders += 1
+
+        if len(self._entries) < self.refill_at:
+            self._wanted.set()
+        return entry
+
+    def start(self):
+        """Start the filler thread once"""
+        with self._lock:
+            if self._filler is None or not self._filler.is_alive():
+                self._filler = threading.Thread(
+                    target=self._run, name='nullpass-challenge-pool', daemon=True
+                )
+                self._filler.start()
+        self._wanted.set()
+
+    def _run(self):
+        while True:
+            self._wanted.wait()
+            self._wanted.clear()
+            try:
+                self.fill()
+            except Exception as e:
+                logger.error(f"Challenge pool fill error: {str(e)}")
+
+    def stats(self):
+        """Return a snapshot of the pool counters"""
+        with self._lock:
+            return {
+                'depth': len(self._entries),
+                'size': self.size,
+                'qr_format': self.qr_format,
+                'hits': self.hits,
+                'qr_renders': self.qr_renders,
+                'fallbacks': self.fallbacks,
+                'generated': self.generated,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_challenge_pool():
+    """
+    Get the process-wide challenge pool, starting its filler on first use.
+
+    Returns:
+        ChallengePool: The pool, or None if CHALLENGE_POOL_ENABLED is off or the
+                       challenge store is stateless
+    """
+    global _pool
+
+    if not settings.CHALLENGE_POOL_ENABLED or getattr(get_challenge_store(), 'stateless', False):
+        return None
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                pool = ChallengePool(
+                    settings.CHALLENGE_POOL_SIZE,
+                    refill_at=settings.CHALLENGE_POOL_REFILL_AT,
+                    qr_format=settings.CHALLENGE_POOL_QR_FORMAT
+                )
+                pool.start()
+                _pool = pool
+                logger.info(f"Challenge pool started ({pool.size} entries, {pool.qr_format} QR)")
+
+    return _pool
+
+
+def get_challenge_pool_stats():
+    """
+    Get challenge pool metrics.
+
+    Returns:
+        dict: Depth, hit, QR render and fallback counts, or None if the pool is disabled
+    """
+    pool = get_challenge_pool()
+    return pool.stats() if pool is not None else None
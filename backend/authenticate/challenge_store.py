@@ -0,0 +1,649 @@
+"""
+Challenge storage backends for NullPass.
+Login challenges live for a few minutes, so they can be kept either in the
+relational database (AuthenticationChallenge rows), in a TTL-native
+key-value store through Django's cache framework (locmem in tests, Redis in
+production), or nowhere at all as HMAC-signed self-describing tokens. The
+backend is selected with the CHALLENGE_STORE setting.
+"""
+
+import base64
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.module_loading import import_string
+
+from .utils import generate_challenge_nonce
+
+logger = logging.getLogger('authenticate')
+
+
+class ChallengeRecord:
+    """
+    Backend-independent view of an authentication challenge.
+    """
+
+    def __init__(self, challenge_id, nonce, expires_at, is_used=False, device_id=None, ip_address=None):
+        self.challenge_id = challenge_id
+        self.nonce = nonce
+        self.expires_at = expires_at
+        self.is_used = is_used
+        self.device_id = device_id  # TrustedDevice primary key once consumed
+        self.ip_address = ip_address
+
+    def __repr__(self):
+        return f"<ChallengeRecord {self.challenge_id[:8]}... used={self.is_used}>"
+
+    def is_expired(self, now=None):
+        """Check if the challenge has passed its expiration time"""
+        return (now or timezone.now()) > self.expires_at
+
+    def is_valid(self):
+        """Check if challenge is valid (not used and not expired)"""
+        return not self.is_used and not self.is_expired()
+
+
+# ============================================================================
+# ORM BACKEND
+# ============================================================================
+
+class ModelChallengeStore:
+    """
+    Stores challenges as AuthenticationChallenge rows.
+    """
+    name = 'orm'
+
+    def _to_record(self, challenge):
+        return ChallengeRecord(
+            challenge_id=challenge.challenge_id,
+            nonce=challenge.nonce,
+            expires_at=challenge.expires_at,
+            is_used=challenge.is_used,
+            device_id=challenge.device_id,
+            ip_address=challenge.ip_address
+        )
+
+    def create(self, ip_address=None, expiration_minutes=None, challenge_data=None):
+        """
+        Create and persist a new challenge.
+
+        Args:
+            ip_address (str): Requesting client IP (optional)
+            expiration_minutes (int): Lifetime (defaults to CHALLENGE_EXPIRATION_MINUTES)
+            challenge_data (dict): Pre-generated challenge_id and nonce (optional)
+
+        Returns:
+            ChallengeRecord: The new challenge
+        """
+        from .models import AuthenticationChallenge
+
+        challenge_data = challenge_data or generate_challenge_nonce()
+        expiration_minutes = expiration_minutes or settings.CHALLENGE_EXPIRATION_MINUTES
+
+        challenge = AuthenticationChallenge.objects.create(
+            challenge_id=challenge_data['challenge_id'],
+            nonce=challenge_data['nonce'],
+            ip_address=ip_address,
+            expires_at=timezone.now() + timedelta(minutes=expiration_minutes)
+        )
+        return self._to_record(challenge)
+
+    def get(self, challenge_id):
+        """
+        Fetch a challenge by ID.
+
+        Args:
+            challenge_id (str): Challenge identifier
+
+        Returns:
+            ChallengeRecord: The challenge, or None if it does not exist
+        """
+        from .models import AuthenticationChallenge
+
+        if not challenge_id:
+            return None
+
+        challenge = AuthenticationChallenge.objects.filter(challenge_id=challenge_id).first()
+        return self._to_record(challenge) if challenge else None
+
+    async def acreate(self, ip_address=None, expiration_minutes=None, challenge_data=None):
+        """Async version of create()"""
+        from .models import AuthenticationChallenge
+
+        challenge_data = challenge_data or generate_challenge_nonce()
+        expiration_minutes = expiration_minutes or settings.CHALLENGE_EXPIRATION_MINUTES
+
+        challenge = await AuthenticationChallenge.objects.acreate(
+            challenge_id=challenge_data['challenge_id'],
+            nonce=challenge_data['nonce'],
+            ip_address=ip_address,
+            expires_at=timezone.now() + timedelta(minutes=expiration_minutes)
+        )
+        return self._to_record(challenge)
+
+    async def aget(self, challenge_id):
+        """Async version of get()"""
+        from .models import AuthenticationChallenge
+
+        if not challenge_id:
+            return None
+
+        challenge = await AuthenticationChallenge.objects.filter(challenge_id=challenge_id).afirst()
+        return self._to_record(challenge) if challenge else None
+
+    def get_many(self, challenge_ids):
+        """
+        Fetch several challenges in one query.
+
+        Args:
+            challenge_ids (iterable): Challenge identifiers
+
+        Returns:
+            dict: ChallengeRecord objects keyed by challenge_id
+        """
+        from .models import AuthenticationChallenge
+
+        challenges = AuthenticationChallenge.objects.in_bulk(
+            [cid for cid in challenge_ids if cid], field_name='challenge_id'
+        )
+        return {cid: self._to_record(challenge) for cid, challenge in challenges.items()}
+
+    def consume(self, challenge_id, device):
+        """
+        Atomically mark a challenge as used by a device.
+
+        Args:
+            challenge_id (str): Challenge identifier
+            device (TrustedDevice): Device that signed the challenge
+
+        Returns:
+            bool: True if this call consumed the challenge, False if it was already used
+        """
+        from .models import AuthenticationChallenge
+
+        # Conditional UPDATE ... WHERE is_used = FALSE; only one caller can win
+        return bool(AuthenticationChallenge.objects.filter(
+            challenge_id=challenge_id,
+            is_used=False
+        ).update(is_used=True, device=device))
+
+    def consume_many(self, devices_by_challenge_id):
+        """
+        Atomically consume several challenges.
+
+        Args:
+            devices_by_challenge_id (dict): TrustedDevice keyed by challenge_id
+
+        Returns:
+            set: challenge_ids consumed by this call
+        """
+        from .models import AuthenticationChallenge
+
+        if not devices_by_challenge_id:
+            return set()
+
+        with transaction.atomic():
+            # Rows consumed concurrently are skipped
+            challenges = list(
+                AuthenticationChallenge.objects.select_for_update()
+                .filter(challenge_id__in=list(devices_by_challenge_id), is_used=False)
+                .only('pk', 'challenge_id')
+            )
+            for challenge in challenges:
+                challenge.is_used = True
+                challenge.device = devices_by_challenge_id[challenge.challenge_id]
+            if challenges:
+                AuthenticationChallenge.objects.bulk_update(challenges, ['is_used', 'device'])
+
+        return {challenge.challenge_id for challenge in challenges}
+
+    def release_many(self, challenge_ids):
+        """Nothing to undo: consumption is part of the caller's transaction and rolls back with it"""
+
+    def delete(self, challenge_id):
+        """Remove a challenge"""
+        from .models import AuthenticationChallenge
+        AuthenticationChallenge.objects.filter(challenge_id=challenge_id).delete()
+
+
+# ============================================================================
+# CACHE BACKEND
+# ============================================================================
+
+class CacheChallengeStore:
+    """
+    Stores challenges in a Django cache with a native TTL.
+    Consumption is a cache.add() of a marker key, which is atomic on the
+    locmem, Redis and Memcached backends. The marker is not part of the
+    database transaction, so callers consume inside consume_transaction(),
+    which deletes the markers again if the login writes roll back.
+    """
+    name = 'cache'
+    key_prefix = 'nullpass:challenge:'
+
+    @property
+    def cache(self):
+        return caches[settings.CHALLENGE_STORE_CACHE_ALIAS]
+
+    def _key(self, challenge_id):
+        return f'{self.key_prefix}{challenge_id}'
+
+    def _used_key(self, challenge_id):
+        return f'{self.key_prefix}{challenge_id}:used'
+
+    def _timeout(self, expires_at):
+        # Keep the record past expiry so status polls can still report it as expired
+        remaining = (expires_at - timezone.now()).total_seconds()
+        return max(int(remaining), 0) + settings.CHALLENGE_STORE_GRACE_SECONDS
+
+    def _to_record(self, challenge_id, data, used_by):
+        return ChallengeRecord(
+            challenge_id=challenge_id,
+            nonce=data['nonce'],
+            expires_at=data['expires_at'],
+            is_used=used_by is not None,
+            device_id=used_by,
+            ip_address=data.get('ip_address')
+        )
+
+    def _new_challenge(self, ip_address, expiration_minutes, challenge_data):
+        challenge_data = challenge_data or generate_challenge_nonce()
+        expiration_minutes = expiration_minutes or settings.CHALLENGE_EXPIRATION_MINUTES
+        expires_at = timezone.now() + timedelta(minutes=expiration_minutes)
+
+        data = {
+            'nonce': challenge_data['nonce'],
+            'expires_at': expires_at,
+            'ip_address': ip_address,
+        }
+        return challenge_data['challenge_id'], data
+
+    def create(self, ip_address=None, expiration_minutes=None, challenge_data=None):
+        """
+        Create a new challenge with a TTL.
+
+        Args:
+            ip_address (str): Requesting client IP (optional)
+            expiration_minutes (int): Lifetime (defaults to CHALLENGE_EXPIRATION_MINUTES)
+            challenge_data (dict): Pre-generated challenge_id and nonce (optional)
+
+        Returns:
+            ChallengeRecord: The new challenge
+        """
+        challenge_id, data = self._new_challenge(ip_address, expiration_minutes, challenge_data)
+        self.cache.set(self._key(challenge_id), data, self._timeout(data['expires_at']))
+        return self._to_record(challenge_id, data, None)
+
+    async def acreate(self, ip_address=None, expiration_minutes=None, challenge_data=None):
+        """Async version of create()"""
+        challenge_id, data = self._new_challenge(ip_address, expiration_minutes, challenge_data)
+        await self.cache.aset(self._key(challenge_id), data, self._timeout(data['expires_at']))
+        return self._to_record(challenge_id, data, None)
+
+    def get(self, challenge_id):
+        """
+        Fetch a challenge by ID.
+
+        Args:
+            challenge_id (str): Challenge identifier
+
+        Returns:
+            ChallengeRecord: The challenge, or None if it does not exist or was evicted
+        """
+        if not challenge_id:
+            return None
+
+        values = self.cache.get_many([self._key(challenge_id), self._used_key(challenge_id)])
+        data = values.get(self._key(challenge_id))
+        if data is None:
+            return None
+        return self._to_record(challenge_id, data, values.get(self._used_key(challenge_id)))
+
+    async def aget(self, challenge_id):
+        """Async version of get()"""
+        if not challenge_id:
+            return None
+
+        values = await self.cache.aget_many([self._key(challenge_id), self._used_key(challenge_id)])
+        data = values.get(self._key(challenge_id))
+        if data is None:
+            return None
+        return self._to_record(challenge_id, data, values.get(self._used_key(challenge_id)))
+
+    def get_many(self, challenge_ids):
+        """
+        Fetch several challenges in one round trip.
+
+        Args:
+            challenge_ids (iterable): Challenge identifiers
+
+        Returns:
+            dict: ChallengeRecord objects keyed by challenge_id
+        """
+        challenge_ids = [cid for cid in set(challenge_ids) if cid]
+        keys = [self._key(cid) for cid in challenge_ids] + [self._used_key(cid) for cid in challenge_ids]
+        values = self.cache.get_many(keys)
+
+        records = {}
+        for cid in challenge_ids:
+            data = values.get(self._key(cid))
+            if data is not None:
+                records[cid] = self._to_record(cid, data, values.get(self._used_key(cid)))
+        return records
+
+    def consume(self, challenge_id, device):
+        """
+        Atomically mark a challenge as used by a device.
+
+        Args:
+            challenge_id (str): Challenge identifier
+            device (TrustedDevice): Device that signed the challenge
+
+        Returns:
+            bool: True if this call consumed the challenge, False if it was already used
+        """
+        data = self.cache.get(self._key(challenge_id))
+        if data is None:
+            return False
+        return self.cache.add(self._used_key(challenge_id), device.pk, self._timeout(data['expires_at']))
+
+    def consume_many(self, devices_by_challenge_id):
+        """
+        Atomically consume several challenges.
+
+        Args:
+            devices_by_challenge_id (dict): TrustedDevice keyed by challenge_id
+
+        Returns:
+            set: challenge_ids consumed by this call
+        """
+        return {
+            challenge_id for challenge_id, device in devices_by_challenge_id.items()
+            if self.consume(challenge_id, device)
+        }
+
+    def release_many(self, challenge_ids):
+        """
+        Undo consume() for challenges whose login was rolled back, so they can be retried.
+
+        Args:
+            challenge_ids (iterable): Challenges consumed by this caller
+        """
+        keys = [self._used_key(challenge_id) for challenge_id in challenge_ids]
+        if keys:
+            self.cache.delete_many(keys)
+
+    def delete(self, challenge_id):
+        """Remove a challenge"""
+        self.cache.delete_many([self._key(challenge_id), self._used_key(challenge_id)])
+
+
+# ============================================================================
+# SIGNED (STATELESS) BACKEND
+# ============================================================================
+
+class SignedChallengeStore(CacheChallengeStore):
+    """
+    Stateless challenges: the challenge_id is the token
+    "<nonce>.<expiry>.<ip>.<signature>", HMAC-signed with SECRET_KEY, so
+    issuing a challenge writes nothing. Reads check the signature; consumption
+    adds a small used-marker keyed by the signature to the cache, which expires
+    with the challenge and provides replay protection. That marker is the only
+    replay protection, so CHALLENGE_STORE_CACHE_ALIAS must be shared by every
+    process (Redis, Memcached, database cache): with a per-process locmem cache
+    a token could be redeemed once in each worker. get_challenge_store refuses
+    that pairing unless CHALLENGE_STORE_SINGLE_PROCESS is set.
+    Challenges cannot be pre-generated, so the challenge pool is not used.
+    """
+    name = 'signed'
+    stateless = True
+    key_salt = 'nullpass.challenge_store.SignedChallengeStore'
+
+    def _signature(self, value, secret=None):
+        digest = salted_hmac(self.key_salt, value, secret=secret, algorithm='sha256').digest()
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+    def _sign(self, nonce, expires_at, ip_address):
+        ip = base64.urlsafe_b64encode(ip_address.encode()).rstrip(b'=').decode() if ip_address else ''
+        value = f'{nonce}.{int(expires_at.timestamp())}.{ip}'
+        return f'{value}.{self._signature(value)}'
+
+    def _unsign(self, challenge_id):
+        """Return (signature, data) for a genuine token, else None"""
+        try:
+            value, signature = challenge_id.rsplit('.', 1)
+            nonce, expires, ip = value.split('.')
+        except (AttributeError, ValueError):
+            return None
+
+        # Tokens issued before a SECRET_KEY rotation stay valid until they expire
+        keys = [settings.SECRET_KEY, *settings.SECRET_KEY_FALLBACKS]
+        if not any(constant_time_compare(signature, self._signature(value, secret)) for secret in keys):
+            return None
+
+        return signature, {
+            'nonce': nonce,
+            'expires_at': datetime.fromtimestamp(int(expires), tz=dt_timezone.utc),
+            'ip_address': base64.urlsafe_b64decode(ip + '=' * (-len(ip) % 4)).decode() if ip else None,
+        }
+
+    def _used_key(self, signature):
+        return f'{self.key_prefix}{signature}:used'
+
+    def create(self, ip_address=None, expiration_minutes=None, challenge_data=None):
+        """
+        Issue a new signed challenge without storing anything.
+
+        Args:
+            ip_address (str): Requesting client IP (optional)
+            expiration_minutes (int): Lifetime (defaults to CHALLENGE_EXPIRATION_MINUTES)
+            challenge_data (dict): Pre-generated nonce (optional); the challenge_id is always derived
+
+        Returns:
+            ChallengeRecord: The new challenge
+        """
+        _, data = self._new_challenge(ip_address, expiration_minutes, challenge_data)
+        # Seconds precision, matching the expiry that is read back from the token
+        data['expires_at'] = data['expires_at'].replace(microsecond=0)
+        challenge_id = self._sign(data['nonce'], data['expires_at'], ip_address)
+        return self._to_record(challenge_id, data, None)
+
+    async def acreate(self, ip_address=None, expiration_minutes=None, challenge_data=None):
+        """Async version of create(); there is no I/O to await"""
+        return self.create(ip_address, expiration_minutes, challenge_data)
+
+    def get(self, challenge_id):
+        """
+        Decode a challenge and look up its used-marker.
+
+        Args:
+            challenge_id (str): Signed challenge token
+
+        Returns:
+            ChallengeRecord: The challenge, or None if the token is malformed or forged
+        """
+        unsigned = self._unsign(challenge_id)
+        if unsigned is None:
+            return None
+        signature, data = unsigned
+        return self._to_record(challenge_id, data, self.cache.get(self._used_key(signature)))
+
+    async def aget(self, challenge_id):
+        """Async version of get()"""
+        unsigned = self._unsign(challenge_id)
+        if unsigned is None:
+            return None
+        signature, data = unsigned
+        return self._to_record(challenge_id, data, await self.cache.aget(self._used_key(signature)))
+
+    def get_many(self, challenge_ids):
+        """
+        Decode several challenges, fetching their used-markers in one round trip.
+
+        Args:
+            challenge_ids (iterable): Signed challenge tokens
+
+        Returns:
+            dict: ChallengeRecord objects keyed by challenge_id
+        """
+        unsigned = {}
+        for cid in set(challenge_ids):
+            decoded = self._unsign(cid)
+            if decoded is not None:
+                unsigned[cid] = decoded
+
+        markers = self.cache.get_many([self._used_key(signature) for signature, _ in unsigned.values()])
+        return {
+            cid: self._to_record(cid, data, markers.get(self._used_key(signature)))
+            for cid, (signature, data) in unsigned.items()
+        }
+
+    def consume(self, challenge_id, device):
+        """
+        Atomically mark a challenge as used by a device.
+
+        Args:
+            challenge_id (str): Signed challenge token
+            device (TrustedDevice): Device that signed the challenge
+
+        Returns:
+            bool: True if this call consumed the challenge, False if it was already used
+        """
+        unsigned = self._unsign(challenge_id)
+        if unsigned is None:
+            return False
+        signature, data = unsigned
+        return self.cache.add(self._used_key(signature), device.pk, self._timeout(data['expires_at']))
+
+    def release_many(self, challenge_ids):
+        """
+        Undo consume() for tokens whose login was rolled back, so they can be retried.
+
+        Args:
+            challenge_ids (iterable): Signed challenge tokens consumed by this caller
+        """
+        keys = []
+        for challenge_id in challenge_ids:
+            unsigned = self._unsign(challenge_id)
+            if unsigned is not None:
+                keys.append(self._used_key(unsigned[0]))
+        if keys:
+            self.cache.delete_many(keys)
+
+    def delete(self, challenge_id):
+        """Nothing is stored for a signed challenge; an existing used-marker is kept to block replays"""
+
+
+# ============================================================================
+# STORE SELECTION
+# ============================================================================
+
+CHALLENGE_STORES = {
+    'orm': ModelChallengeStore,
+    'cache': CacheChallengeStore,
+    'signed': SignedChallengeStore,
+}
+
+_store_instances = {}
+_store_lock = threading.Lock()
+
+
+def check_replay_cache(store):
+    """
+    Make sure a stateless store's used-markers are visible to every process.
+
+    Args:
+        store (object): Challenge store instance
+
+    Raises:
+        ImproperlyConfigured: If the store relies on a dummy cache, or on a
+                              per-process locmem cache without CHALLENGE_STORE_SINGLE_PROCESS
+    """
+    if not getattr(store, 'stateless', False):
+        return
+
+    alias = settings.CHALLENGE_STORE_CACHE_ALIAS
+    cache = caches[alias]
+    if isinstance(cache, DummyCache):
+        raise ImproperlyConfigured(
+            f"CHALLENGE_STORE '{store.name}' cannot use the dummy cache '{alias}': "
+            "used-markers would not be kept and every challenge could be replayed"
+        )
+    if isinstance(cache, LocMemCache) and not settings.CHALLENGE_STORE_SINGLE_PROCESS:
+        raise ImproperlyConfigured(
+            f"CHALLENGE_STORE '{store.name}' needs a cache shared by all processes, but '{alias}' "
+            "is a per-process LocMemCache, so a challenge could be replayed once per worker. "
+            "Point CHALLENGE_STORE_CACHE_ALIAS at Redis/Memcached, or set "
+            "CHALLENGE_STORE_SINGLE_PROCESS=True if one process serves every request"
+        )
+
+
+@contextmanager
+def consume_transaction(challenge_store):
+    """
+    Database transaction for consuming challenges and writing the logins they open.
+    Cache-backed stores mark a challenge used outside the transaction, so if the
+    block raises, the challenges it consumed are released again; otherwise the
+    device's retry would find its challenge burnt and be logged as a replay.
+
+    Args:
+        challenge_store (object): Store returned by get_challenge_store
+
+    Yields:
+        list: Add the challenge_ids consumed inside the block to this list
+    """
+    consumed = []
+    try:
+        with transaction.atomic():
+            yield consumed
+    except Exception:
+        release_many = getattr(challenge_store, 'release_many', None)
+        if consumed and release_many is not None:
+            try:
+                release_many(consumed)
+            except Exception as e:
+                logger.error(f"Could not release {len(consumed)} consumed challenges: {str(e)}")
+        raise
+
+
+def get_challenge_store(store_name=None):
+    """
+    Get the configured challenge store.
+
+    Args:
+        store_name (str): Store alias or dotted path (defaults to CHALLENGE_STORE)
+
+    Returns:
+        object: Store instance with create(), get(), consume(), release_many() and
+                delete(), plus async acreate() and aget()
+    """
+    store_name = store_name or settings.CHALLENGE_STORE
+
+    store = _store_instances.get(store_name)
+    if store is None:
+        with _store_lock:
+            store = _store_instances.get(store_name)
+            if store is None:
+                store_class = CHALLENGE_STORES.get(store_name)
+                if store_class is None:
+                    try:
+                        store_class = import_string(store_name)
+                    except ImportError as e:
+                        raise ImproperlyConfigured(f'Unknown CHALLENGE_STORE: {store_name}') from e
+                store = store_class()
+                _store_instances[store_name] = store
+
+    # Checked on every call since the cache settings can differ from when the store was built
+    check_replay_cache(store)
+    return store
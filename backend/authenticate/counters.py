@@ -0,0 +1,222 @@
+"""
+Materialized device and session counters for NullPass.
+SystemCounter holds one row per total (devices, active devices, flagged
+devices, sessions, active sessions). TrustedDevice and UserSession adjust them
+from save() and delete(), and the bulk write paths adjust them explicitly.
+Adjustments are applied once the change commits, each as its own short
+UPDATE, so concurrent logins never hold the few counter rows locked for the
+length of their transactions, and rolled-back changes are never counted.
+Dashboards read every total in one query instead of counting both tables.
+reconcile_counters recounts the tables and corrects drift left by writes that
+bypass these paths (raw SQL, cascades, queryset updates in a shell) or by a
+process that exits between a commit and its adjustment.
+"""
+
+import logging
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Value, When
+
+logger = logging.getLogger('authenticate')
+
+COUNTERS = ('devices_total', 'devices_active', 'devices_flagged', 'sessions_total', 'sessions_active')
+
+# model label -> (total counter, {boolean field: counter})
+TRACKED_MODELS = {
+    'authenticate.trusteddevice': ('devices_total', {'is_active': 'devices_active', 'is_flagged': 'devices_flagged'}),
+    'authenticate.usersession': ('sessions_total', {'is_active': 'sessions_active'}),
+}
+
+
+def _tracking(model):
+    return TRACKED_MODELS[model._meta.label_lower]
+
+
+def _apply(deltas):
+    from .models import SystemCounter
+
+    SystemCounter.objects.filter(name__in=deltas).update(value=F('value') + Case(
+        *[When(name=name, then=Value(delta)) for name, delta in deltas.items()],
+        default=Value(0),
+        output_field=IntegerField()
+    ))
+
+
+def adjust(**deltas):
+    """
+    Add deltas to counters in a single UPDATE once the current transaction commits.
+
+    Args:
+        **deltas: Counter name -> signed amount; zero amounts are ignored
+    """
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    # Runs at once outside a transaction; dropped if the change rolls back
+    transaction.on_commit(partial(_apply, deltas))
+
+
+def snapshot(instance, fields=None):
+    """
+    Remember the stored values of an instance's counted fields.
+
+    Args:
+        instance (Model): Loaded or just-saved TrustedDevice or UserSession
+        fields (iterable): Fields that now match the database (defaults to all counted fields)
+    """
+    _, counted = _tracking(type(instance))
+    state = getattr(instance, '_counted_state', {})
+    for field in counted:
+        if (fields is None or field in fields) and field in instance.__dict__:
+            state[field] = bool(instance.__dict__[field])
+    instance._counted_state = state
+
+
+def record_save(instance, adding, update_fields=None):
+    """
+    Adjust counters after an instance was saved.
+
+    Args:
+        instance (Model): The saved TrustedDevice or UserSession
+        adding (bool): Whether the save inserted the row
+        update_fields (iterable): The save's update_fields, if any
+    """
+    total, counted = _tracking(type(instance))
+
+    if adding:
+        deltas = {total: 1}
+        deltas.update({counter: int(bool(getattr(instance, field))) for field, counter in counted.items()})
+    else:
+        # Fields never loaded from the database are left to reconcile_counters
+        state = getattr(instance, '_counted_state', {})
+        deltas = {
+            counter: int(bool(getattr(instance, field))) - int(state[field])
+            for field, counter in counted.items()
+            if field in state and (update_fields is None or field in update_fields)
+        }
+
+    adjust(**deltas)
+    snapshot(instance, None if adding else update_fields)
+
+
+def update_flag(queryset, field, value, **fields):
+    """
+    Set a counted boolean on the rows that don't have it yet, with one conditional
+    UPDATE, and adjust its counter by the rows actually changed. Concurrent calls
+    on the same row can't both count it, unlike save() from a stale snapshot.
+
+    Args:
+        queryset (QuerySet): TrustedDevice or UserSession rows
+        field (str): Counted boolean field, e.g. 'is_active'
+        value (bool): New value
+        **fields: Other fields to write on the changed rows
+
+    Returns:
+        int: Number of rows changed
+    """
+    _, counted = _tracking(queryset.model)
+    with transaction.atomic(savepoint=False):
+        changed = queryset.filter(**{field: not value}).update(**{field: value}, **fields)
+        adjust(**{counted[field]: changed if value else -changed})
+    return changed
+
+
+def set_flag(instance, field, value, **fields):
+    """
+    update_flag for one instance, keeping the instance and its snapshot in step.
+
+    Args:
+        instance (Model): Saved TrustedDevice or UserSession
+        field (str): Counted boolean field
+        value (bool): New value
+        **fields: Other fields to write if the row changes
+
+    Returns:
+        bool: True if this call changed the row, False if it already had the value
+    """
+    changed = update_flag(type(instance).objects.filter(pk=instance.pk), field, value, **fields)
+    setattr(instance, field, value)
+    for name, field_value in fields.items():
+        setattr(instance, name, field_value)
+    snapshot(instance, [field])
+    return bool(changed)
+
+
+def record_created(instances):
+    """
+    Adjust counters for rows inserted with bulk_create.
+
+    Args:
+        instances (list): Instances of one tracked model
+    """
+    if not instances:
+        return
+    total, counted = _tracking(type(instances[0]))
+    deltas = {total: len(instances)}
+    for field, counter in counted.items():
+        deltas[counter] = sum(1 for instance in instances if getattr(instance, field))
+    adjust(**deltas)
+
+
+def _count(queryset):
+    """Rows in a queryset of a tracked model, per counter"""
+    total, counted = _tracking(queryset.model)
+    return queryset.aggregate(**{total: Count('pk')}, **{
+        counter: Count('pk', filter=Q(**{field: True})) for field, counter in counted.items()
+    })
+
+
+def record_deleting(queryset):
+    """
+    Adjust counters for rows about to be deleted in bulk.
+
+    Call inside the transaction that deletes them.
+
+    Args:
+        queryset (QuerySet): TrustedDevice or UserSession rows being deleted
+    """
+    adjust(**{counter: -count for counter, count in _count(queryset).items()})
+
+
+def get_counters():
+    """
+    Read every counter in one query.
+
+    Returns:
+        dict: Counter name -> value (0 for counters not yet created)
+    """
+    from .models import SystemCounter
+
+    values = dict.fromkeys(COUNTERS, 0)
+    values.update(SystemCounter.objects.filter(name__in=COUNTERS).values_list('name', 'value'))
+    return values
+
+
+def reconcile_counters():
+    """
+    Recount devices and sessions and overwrite the stored counters.
+
+    Returns:
+        dict: Counter name -> drift corrected (actual minus stored) for counters that were off
+    """
+    from .models import SystemCounter, TrustedDevice, UserSession
+
+    with transaction.atomic():
+        # Lock the rows so adjustments from other writers wait for the new values
+        stored = dict(
+            SystemCounter.objects.select_for_update().filter(name__in=COUNTERS).values_list('name', 'value')
+        )
+        actual = {**_count(TrustedDevice.objects.all()), **_count(UserSession.objects.all())}
+
+        drift = {}
+        for name in COUNTERS:
+            if stored.get(name) == actual[name]:
+                continue
+            drift[name] = actual[name] - stored.get(name, 0)
+            SystemCounter.objects.update_or_create(name=name, defaults={'value': actual[name]})
+
+    if drift:
+        logger.warning(f"Counter drift corrected: {drift}")
+    return drift
@@ -0,0 +1,167 @@
+"""
+Session JWT signing keys for NullPass.
+With JWT_ALGORITHM=HS256 tokens are signed with the shared JWT_SECRET_KEY.
+With ES256 (P-256) or EdDSA (Ed25519) they are signed with the private key in
+JWT_PRIVATE_KEY_FILE and carry a "kid" header, and the public keys are
+published as a JWKS document, so other services can validate sessions offline.
+Keys are parsed once per process and reused for every sign and verify.
+"""
+
+import base64
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+JWT_ALGORITHMS = ('HS256', 'ES256', 'EdDSA')
+ASYMMETRIC_JWT_ALGORITHMS = ('ES256', 'EdDSA')
+
+
+def generate_private_key_pem(algorithm):
+    """
+    Generate a new private key for an asymmetric JWT algorithm.
+
+    Args:
+        algorithm (str): 'ES256' or 'EdDSA'
+
+    Returns:
+        str: Unencrypted PKCS#8 PEM
+    """
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+    if algorithm == 'ES256':
+        private_key = ec.generate_private_key(ec.SECP256R1())
+    elif algorithm == 'EdDSA':
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise ValueError(f'Not an asymmetric JWT algorithm: {algorithm}')
+
+    return private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption()
+    ).decode('ascii')
+
+
+def _public_jwk(public_key, algorithm):
+    """Public JWK for a key, with its RFC 7638 thumbprint as kid"""
+    from jwt.algorithms import ECAlgorithm, OKPAlgorithm
+
+    algorithm_class = ECAlgorithm if algorithm == 'ES256' else OKPAlgorithm
+    jwk = json.loads(algorithm_class.to_jwk(public_key))
+
+    required = ('crv', 'kty', 'x', 'y') if jwk['kty'] == 'EC' else ('crv', 'kty', 'x')
+    canonical = json.dumps({name: jwk[name] for name in required}, separators=(',', ':'), sort_keys=True)
+    thumbprint = hashlib.sha256(canonical.encode('ascii')).digest()
+    jwk['kid'] = base64.urlsafe_b64encode(thumbprint).rstrip(b'=').decode('ascii')
+    jwk['alg'] = algorithm
+    jwk['use'] = 'sig'
+    return jwk
+
+
+def _algorithm_for(public_key):
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+    if isinstance(public_key, ec.EllipticCurvePublicKey) and public_key.curve.name == 'secp256r1':
+        return 'ES256'
+    if isinstance(public_key, ed25519.Ed25519PublicKey):
+        return 'EdDSA'
+    raise ImproperlyConfigured('JWT keys must be P-256 (ES256) or Ed25519 (EdDSA)')
+
+
+class JWTKeySet:
+    """
+    Parsed signing key and verification keys for one JWT configuration.
+    """
+
+    def __init__(self, algorithm, private_key_pem=None, previous_public_key_pems=()):
+        if algorithm not in JWT_ALGORITHMS:
+            raise ImproperlyConfigured(
+                f"Unsupported JWT_ALGORITHM: {algorithm}; use one of {', '.join(JWT_ALGORITHMS)}"
+            )
+
+        self.algorithm = algorithm
+        self.kid = None
+        self.signing_key = settings.JWT_SECRET_KEY
+        self.verification_keys = {}  # kid -> (public key, algorithm)
+        self.jwks = {'keys': []}
+
+        if algorithm not in ASYMMETRIC_JWT_ALGORITHMS:
+            return
+
+        from cryptography.hazmat.primitives.serialization import load_pem_private_key, load_pem_public_key
+
+        if not private_key_pem:
+            raise ImproperlyConfigured(f'JWT_ALGORITHM={algorithm} requires JWT_PRIVATE_KEY_FILE')
+
+        self.signing_key = load_pem_private_key(private_key_pem.encode('ascii'), password=None)
+        if _algorithm_for(self.signing_key.public_key()) != algorithm:
+            raise ImproperlyConfigured(f'JWT_PRIVATE_KEY_FILE does not hold a {algorithm} key')
+
+        public_keys = [self.signing_key.public_key()]
+        public_keys += [load_pem_public_key(pem.encode('ascii')) for pem in previous_public_key_pems]
+
+        # Retired keys stay published and accepted until their tokens have expired
+        for public_key in public_keys:
+            key_algorithm = _algorithm_for(public_key)
+            jwk = _public_jwk(public_key, key_algorithm)
+            self.verification_keys[jwk['kid']] = (public_key, key_algorithm)
+            self.jwks['keys'].append(jwk)
+
+        self.kid = self.jwks['keys'][0]['kid']
+
+    def verification_key(self, kid):
+        """
+        Find the key that verifies a token.
+
+        Args:
+            kid (str): The token's kid header (ignored for HS256)
+
+        Returns:
+            tuple: (key, algorithm), or (None, None) for an unknown kid
+        """
+        if self.algorithm not in ASYMMETRIC_JWT_ALGORITHMS:
+            return self.signing_key, self.algorithm
+        return self.verification_keys.get(kid, (None, None))
+
+
+def _read(path):
+    with open(path) as key_file:
+        return key_file.read()
+
+
+_key_sets = {}
+_key_sets_lock = threading.Lock()
+
+
+def get_jwt_keys():
+    """
+    Get the parsed keys for the current JWT settings.
+
+    Returns:
+        JWTKeySet: Keys for create_jwt_token, decode_jwt_token and the JWKS endpoint
+    """
+    config = (
+        settings.JWT_ALGORITHM,
+        settings.JWT_SECRET_KEY,
+        settings.JWT_PRIVATE_KEY_FILE,
+        tuple(settings.JWT_PREVIOUS_PUBLIC_KEY_FILES),
+    )
+
+    key_set = _key_sets.get(config)
+    if key_set is None:
+        with _key_sets_lock:
+            key_set = _key_sets.get(config)
+            if key_set is None:
+                algorithm, _, private_key_file, previous_files = config
+                key_set = JWTKeySet(
+                    algorithm,
+                    private_key_pem=_read(private_key_file) if private_key_file else None,
+                    previous_public_key_pems=[_read(path) for path in previous_files]
+                )
+                _key_sets[config] = key_set
+
+    return key_set
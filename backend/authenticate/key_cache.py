@@ -0,0 +1,104 @@
+"""
+Process-local cache of parsed public keys for NullPass signature verification.
+Parsing a PEM key rebuilds the curve point objects on every call, which costs
+more than the verification itself, so parsed keys are kept per device.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+def fingerprint_public_key(public_key_pem):
+    """
+    Compute a stable fingerprint for a PEM-encoded public key.
+
+    Args:
+        public_key_pem (str): Public key in PEM format
+
+    Returns:
+        str: Hex-encoded SHA256 digest of the PEM text
+    """
+    return hashlib.sha256(public_key_pem.strip().encode('utf-8')).hexdigest()
+
+
+class PublicKeyCache:
+    """
+    Size-bounded LRU cache of parsed verifying keys.
+    Entries are keyed by (device_id, namespace, key fingerprint) so a rotated
+    key can never be served from a stale entry, and keys parsed by different
+    signature backends never mix.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_load(self, device_id, public_key_pem, loader, namespace=''):
+        """
+        Return the parsed key for a device, parsing it with loader on a miss.
+
+        Args:
+            device_id (str): Unique device identifier
+            public_key_pem (str): Public key in PEM format
+            loader (callable): Function that parses the PEM into a key object
+            namespace (str): Loader name, e.g. the signature backend
+
+        Returns:
+            object: Parsed verifying key
+        """
+        cache_key = (device_id, namespace, fingerprint_public_key(public_key_pem))
+
+        with self._lock:
+            verifying_key = self._entries.get(cache_key)
+            if verifying_key is not None:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return verifying_key
+            self.misses += 1
+
+        # Parse outside the lock so a slow parse does not block other devices
+        verifying_key = loader(public_key_pem)
+
+        with self._lock:
+            self._entries[cache_key] = verifying_key
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return verifying_key
+
+    def invalidate(self, device_id):
+        """Drop every cached key belonging to a device"""
+        with self._lock:
+            for cache_key in [key for key in self._entries if key[0] == device_id]:
+                del self._entries[cache_key]
+
+    def clear(self):
+        """Drop all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Return a snapshot of the cache counters"""
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+public_key_cache = PublicKeyCache(maxsize=settings.PUBLIC_KEY_CACHE_SIZE)
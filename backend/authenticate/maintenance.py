@@ -0,0 +1,457 @@
+"""
+Housekeeping for NullPass authentication tables.
+Removes expired challenges and dead sessions in bounded batches, either from
+the purge_expired management command or from an optional in-process sweeper
+(which also reconciles the device and session counters), backfills session
+token digests for rows that predate token_digest, and rolls cold weeks or
+months of authentication events out of the hot table into compressed archives.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .counters import TRACKED_MODELS, reconcile_counters, record_deleting
+from .models import AuthenticationChallenge, AuthenticationEvent, EventArchivePartition, UserSession
+from .utils import hash_session_token
+
+logger = logging.getLogger('authenticate')
+
+
+# ============================================================================
+# PURGE HELPERS
+# ============================================================================
+
+def _delete_in_batches(queryset, batch_size, archive_file=None):
+    """
+    Delete rows matching a queryset, batch_size primary keys at a time.
+
+    Args:
+        queryset (QuerySet): Rows to remove
+        batch_size (int): Maximum rows deleted per statement
+        archive_file (file): Optional text file receiving each row as NDJSON
+
+    Returns:
+        int: Number of rows removed
+    """
+    model = queryset.model
+    removed = 0
+
+    while True:
+        batch = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            break
+
+        if archive_file is not None:
+            for row in model.objects.filter(pk__in=batch).values():
+                row['model'] = model._meta.label_lower
+                archive_file.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+
+        with transaction.atomic():
+            if model._meta.label_lower in TRACKED_MODELS:
+                record_deleting(model.objects.filter(pk__in=batch))
+            model.objects.filter(pk__in=batch).delete()
+        removed += len(batch)
+
+        if len(batch) < batch_size:
+            break
+
+    return removed
+
+
+def expired_challenges(cutoff):
+    """Challenges that expired before cutoff"""
+    return AuthenticationChallenge.objects.filter(expires_at__lt=cutoff)
+
+
+def dead_sessions(cutoff):
+    """Sessions terminated or expired before cutoff"""
+    return UserSession.objects.filter(
+        Q(is_active=False, last_activity__lt=cutoff) | Q(expires_at__lt=cutoff)
+    )
+
+
+def purge_expired(retention_hours=None, batch_size=None, archive_file=None, dry_run=False):
+    """
+    Remove expired challenges and terminated or expired sessions.
+
+    Args:
+        retention_hours (int): Keep rows that died within this many hours
+                               (defaults to PURGE_RETENTION_HOURS)
+        batch_size (int): Rows deleted per statement (defaults to PURGE_BATCH_SIZE)
+        archive_file (file): Optional text file receiving removed rows as NDJSON
+        dry_run (bool): Count matching rows without deleting them
+
+    Returns:
+        dict: Rows removed per table and elapsed time in milliseconds
+    """
+    if retention_hours is None:
+        retention_hours = settings.PURGE_RETENTION_HOURS
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(hours=retention_hours)
+
+    started = time.monotonic()
+    if dry_run:
+        challenges_removed = expired_challenges(cutoff).count()
+        sessions_removed = dead_sessions(cutoff).count()
+    else:
+        challenges_removed = _delete_in_batches(expired_challenges(cutoff), batch_size, archive_file)
+        sessions_removed = _delete_in_batches(dead_sessions(cutoff), batch_size, archive_file)
+    duration_ms = (time.monotonic() - started) * 1000
+
+    logger.info(
+        f"Purge {'dry run' if dry_run else 'complete'}: {challenges_removed} challenges, "
+        f"{sessions_removed} sessions in {duration_ms:.1f} ms"
+    )
+
+    return {
+        'challenges': challenges_removed,
+        'sessions': sessions_removed,
+        'duration_ms': round(duration_ms, 1),
+    }
+
+
+# ============================================================================
+# SESSION TOKEN DIGEST BACKFILL
+# ============================================================================
+
+def backfill_session_digests(batch_size=None, keep_tokens=False):
+    """
+    Fill token_digest for sessions that still store their raw JWT.
+
+    Args:
+        batch_size (int): Rows updated per statement (defaults to PURGE_BATCH_SIZE)
+        keep_tokens (bool): Leave session_token in place instead of clearing it
+
+    Returns:
+        dict: Rows updated and elapsed time in milliseconds
+    """
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    pending = UserSession.objects.filter(token_digest='').exclude(session_token='')
+
+    started = time.monotonic()
+    updated = 0
+    last_pk = 0
+
+    # Walk by primary key so each batch is an index range scan
+    while True:
+        batch = list(pending.filter(pk__gt=last_pk).order_by('pk').only('pk', 'session_token')[:batch_size])
+        if not batch:
+            break
+
+        for session in batch:
+            session.token_digest = hash_session_token(session.session_token)
+            if not keep_tokens:
+                session.session_token = ''
+        UserSession.objects.bulk_update(
+            batch, ['token_digest'] if keep_tokens else ['token_digest', 'session_token']
+        )
+        updated += len(batch)
+        last_pk = batch[-1].pk
+
+        if len(batch) < batch_size:
+            break
+    duration_ms = (time.monotonic() - started) * 1000
+
+    logger.info(f"Session digest backfill complete: {updated} sessions in {duration_ms:.1f} ms")
+
+    return {
+        'sessions': updated,
+        'duration_ms': round(duration_ms, 1),
+    }
+
+
+# ============================================================================
+# EVENT PARTITIONS (HOT TABLE / COMPRESSED ARCHIVE)
+# ============================================================================
+
+def period_start(timestamp, period):
+    """
+    Start of the UTC week (Monday) or month containing a timestamp.
+
+    Args:
+        timestamp (datetime): Aware timestamp
+        period (str): 'week' or 'month'
+
+    Returns:
+        datetime: Aware UTC datetime
+    """
+    day = timestamp.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    raise ValueError(f'Unknown event partition period: {period}')
+
+
+def next_period_start(start, period):
+    """First instant after the week or month starting at start"""
+    if period == 'week':
+        return start + timedelta(days=7)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def period_label(start, period):
+    """e.g. 2026-08 for a month, 2026-W33 for a week"""
+    if period == 'week':
+        year, week, _ = start.isocalendar()
+        return f'{year}-W{week:02d}'
+    return f'{start:%Y-%m}'
+
+
+def hot_boundary(now=None, hot_days=None, period=None):
+    """
+    Start of the oldest hot partition: the period containing now - hot_days.
+
+    Args:
+        now (datetime): Reference time (defaults to now)
+        hot_days (int): Days that must stay hot (defaults to EVENT_HOT_DAYS)
+        period (str): 'week' or 'month' (defaults to EVENT_PARTITION_PERIOD)
+
+    Returns:
+        datetime: Events before this instant belong to cold partitions
+    """
+    hot_days = settings.EVENT_HOT_DAYS if hot_days is None else hot_days
+    period = period or settings.EVENT_PARTITION_PERIOD
+    return period_start((now or timezone.now()) - timedelta(days=hot_days), period)
+
+
+class ArchiveJSONEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder that keeps full microsecond timestamps, so archived events
+    hash exactly as they did in the hot table (see anchoring.verify_events).
+    """
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def archive_file_sha256(path):
+    """SHA256 hex digest of an archive file, read in 1 MiB blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as archive:
+        for block in iter(lambda: archive.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_archived_events(partition):
+    """
+    Stream the event rows of an archive file.
+
+    Args:
+        partition (EventArchivePartition): Archive to read
+
+    Returns:
+        generator: One dict per event, as AuthenticationEvent.objects.values() returned
+                   it (device_id is the TrustedDevice primary key, timestamp an ISO string)
+    """
+    with gzip.open(partition.path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            yield json.loads(line)
+
+
+def _write_archive(events, path, batch_size):
+    """
+    Stream event rows, oldest first, into a gzip NDJSON file.
+    Returns (rows, highest id, bytes, sha256).
+    """
+    rows = 0
+    last_event_id = 0
+    partial_path = path.with_name(path.name + '.partial')
+
+    with gzip.open(partial_path, 'wt', encoding='utf-8') as archive:
+        # Same order as exports, so archived periods can be streamed ahead of hot rows
+        for row in events.order_by('timestamp', 'id').values().iterator(chunk_size=batch_size):
+            row['model'] = 'authenticate.authenticationevent'
+            archive.write(json.dumps(row, cls=ArchiveJSONEncoder) + '\n')
+            rows += 1
+            last_event_id = max(last_event_id, row['id'])
+
+    sha256 = archive_file_sha256(partial_path)
+    size_bytes = partial_path.stat().st_size
+    os.replace(partial_path, path)
+    return rows, last_event_id, size_bytes, sha256
+
+
+def archive_event_partition(start, period, archive_dir=None, batch_size=None):
+    """
+    Move one week or month of events into a compressed archive file.
+
+    The file is written and recorded before any row is deleted, and rows are
+    deleted only up to the highest archived id, so an interrupted run resumes
+    without losing or duplicating events.
+
+    Args:
+        start (datetime): Period start from period_start
+        period (str): 'week' or 'month'
+        archive_dir (Path): Directory for archive files (defaults to EVENT_ARCHIVE_DIR)
+        batch_size (int): Rows read and deleted per statement (defaults to PURGE_BATCH_SIZE)
+
+    Returns:
+        EventArchivePartition: The new archive, or None if the period had no hot events
+    """
+    archive_dir = Path(archive_dir or settings.EVENT_ARCHIVE_DIR)
+    batch_size = batch_size or settings.PURGE_BATCH_SIZE
+    end = next_period_start(start, period)
+    in_period = AuthenticationEvent.objects.filter(timestamp__gte=start, timestamp__lt=end)
+
+    # Finish deleting rows an interrupted run already archived
+    for archived in EventArchivePartition.objects.filter(start=start, end=end):
+        _delete_in_batches(in_period.filter(id__lte=archived.last_event_id), batch_size)
+
+    if not in_period.exists():
+        return None
+
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    path = archive_dir / f"events-{period_label(start, period)}-{timezone.now():%Y%m%dT%H%M%SZ}.ndjson.gz"
+    rows, last_event_id, size_bytes, sha256 = _write_archive(in_period, path, batch_size)
+
+    partition = EventArchivePartition.objects.create(
+        period=period, start=start, end=end, path=str(path), row_count=rows,
+        size_bytes=size_bytes, sha256=sha256, last_event_id=last_event_id
+    )
+    _delete_in_batches(in_period.filter(id__lte=last_event_id), batch_size)
+    return partition
+
+
+def _has_unanchored_events(start, end):
+    """Whether a period still holds events the anchor worker has not hashed into a root"""
+    return AuthenticationEvent.objects.filter(
+        Q(blockchain_hash__isnull=True) | Q(blockchain_hash=''),
+        timestamp__gte=start, timestamp__lt=end
+    ).exists()
+
+
+def roll_event_partitions(now=None, hot_days=None, period=None, archive_dir=None, batch_size=None, dry_run=False):
+    """
+    Archive every cold week or month still in the hot AuthenticationEvent table.
+    With BLOCKCHAIN_ENABLED, periods holding events that are not anchored yet
+    stay hot until the anchor worker has covered them.
+
+    Args:
+        now (datetime): Reference time (defaults to now)
+        hot_days (int): Keep the periods overlapping the last hot_days days hot
+                        (defaults to EVENT_HOT_DAYS)
+        period (str): 'week' or 'month' (defaults to EVENT_PARTITION_PERIOD)
+        archive_dir (Path): Directory for archive files (defaults to EVENT_ARCHIVE_DIR)
+        batch_size (int): Rows read and deleted per statement (defaults to PURGE_BATCH_SIZE)
+        dry_run (bool): Only report the cold periods and their row counts
+
+    Returns:
+        dict: Hot boundary, per-partition results, periods held back for anchoring
+              and elapsed time in milliseconds
+    """
+    period = period or settings.EVENT_PARTITION_PERIOD
+    boundary = hot_boundary(now, hot_days, period)
+    oldest = (
+        AuthenticationEvent.objects.filter(timestamp__lt=boundary)
+        .order_by('timestamp').values_list('timestamp', flat=True).first()
+    )
+
+    started = time.monotonic()
+    partitions = []
+    held_back = []
+    start = period_start(oldest, period) if oldest else boundary
+    while start < boundary:
+        label = period_label(start, period)
+        if settings.BLOCKCHAIN_ENABLED and _has_unanchored_events(start, next_period_start(start, period)):
+            # Archived rows are never anchored, so wait for the anchor worker
+            held_back.append(label)
+            logger.warning(f"Event partition {label} held back: it still has unanchored events")
+        elif dry_run:
+            rows = AuthenticationEvent.objects.filter(
+                timestamp__gte=start, timestamp__lt=next_period_start(start, period)
+            ).count()
+            if rows:
+                partitions.append({'period': label, 'rows': rows})
+        else:
+            partition = archive_event_partition(start, period, archive_dir, batch_size)
+            if partition is not None:
+                partitions.append({
+                    'period': label,
+                    'rows': partition.row_count,
+                    'bytes': partition.size_bytes,
+                    'path': partition.path,
+                })
+        start = next_period_start(start, period)
+    duration_ms = (time.monotonic() - started) * 1000
+
+    archived = sum(partition['rows'] for partition in partitions)
+    logger.info(
+        f"Event partition roll {'dry run' if dry_run else 'complete'}: {archived} events in "
+        f"{len(partitions)} partitions before {boundary.isoformat()} in {duration_ms:.1f} ms"
+    )
+
+    return {
+        'hot_boundary': boundary,
+        'partitions': partitions,
+        'held_back': held_back,
+        'duration_ms': round(duration_ms, 1),
+    }
+
+
+# ============================================================================
+# PERIODIC SWEEPER
+# ============================================================================
+
+class PurgeSweeper(threading.Thread):
+    """
+    Daemon thread that runs purge_expired and reconcile_counters every interval_seconds.
+    """
+
+    def __init__(self, interval_seconds):
+        super().__init__(name='nullpass-purge-sweeper', daemon=True)
+        self.interval_seconds = interval_seconds
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_seconds):
+            try:
+                purge_expired()
+                reconcile_counters()
+            except Exception as e:
+                logger.error(f"Purge sweeper error: {str(e)}")
+            finally:
+                close_old_connections()
+
+    def stop(self):
+        """Ask the sweeper to exit after the current pass"""
+        self._stop_event.set()
+
+
+_sweeper = None
+_sweeper_lock = threading.Lock()
+
+
+def start_purge_sweeper():
+    """
+    Start the in-process sweeper once per process.
+
+    Returns:
+        PurgeSweeper: The running sweeper
+    """
+    global _sweeper
+
+    with _sweeper_lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = PurgeSweeper(settings.PURGE_INTERVAL_SECONDS)
+            _sweeper.start()
+            logger.info(f"Purge sweeper started (every {settings.PURGE_INTERVAL_SECONDS}s)")
+
+    return _sweeper
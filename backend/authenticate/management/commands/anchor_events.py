@@ -0,0 +1,41 @@
+"""
+Anchor authentication events that are not yet on the audit ledger.
+Pending events are hashed into one Merkle tree per batch and only each root
+is written to the ledger; every event gets an inclusion proof. Run this on a
+schedule (cron) when BLOCKCHAIN_ENABLED is off in the web processes.
+
+Usage:
+    python manage.py anchor_events
+    python manage.py anchor_events --batch-size 1024 --ledger memory
+"""
+
+from django.core.management.base import BaseCommand
+
+from authenticate.anchoring import anchor_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Anchor pending AuthenticationEvent hashes as Merkle roots on the audit ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Events per Merkle root (default: BLOCKCHAIN_ANCHOR_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--ledger',
+            default=None,
+            help='Ledger alias or dotted path (default: BLOCKCHAIN_LEDGER)'
+        )
+
+    def handle(self, *args, **options):
+        stats = anchor_pending_events(batch_size=options['batch_size'], ledger_name=options['ledger'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Anchored {stats['events']} events under {stats['roots']} Merkle root(s)"
+        ))
+        if stats['pending']:
+            self.stdout.write(self.style.WARNING(
+                f"{stats['pending']} root(s) could not be sent to the ledger and will be retried"
+            ))
@@ -0,0 +1,40 @@
+"""
+Fill UserSession.token_digest for sessions created before it existed, and
+clear their stored raw JWTs.
+
+Usage:
+    python manage.py backfill_session_digests
+    python manage.py backfill_session_digests --batch-size 5000
+    python manage.py backfill_session_digests --keep-tokens
+"""
+
+from django.core.management.base import BaseCommand
+
+from authenticate.maintenance import backfill_session_digests
+
+
+class Command(BaseCommand):
+    help = 'Backfill session token digests in bounded batches and drop the raw tokens'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Rows updated per statement (default: PURGE_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--keep-tokens',
+            action='store_true',
+            help='Keep the raw session_token values after computing their digests'
+        )
+
+    def handle(self, *args, **options):
+        result = backfill_session_digests(
+            batch_size=options['batch_size'],
+            keep_tokens=options['keep_tokens']
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {result['sessions']} session digests in {result['duration_ms']} ms"
+        ))
@@ -0,0 +1,156 @@
+"""
+Load benchmark for the authentication endpoints of a running deployment.
+Run it once against the WSGI deployment and once against the ASGI deployment
+with AUTH_ASYNC_VIEWS=True, then compare the tables.
+
+Usage:
+    gunicorn nullpass.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+    AUTH_ASYNC_VIEWS=True uvicorn nullpass.asgi:application --workers 4 --port 8001
+
+    python manage.py bench_auth_load --url http://127.0.0.1:8000
+    python manage.py bench_auth_load --url http://127.0.0.1:8001
+    python manage.py bench_auth_load --scenario wait --concurrency 500 --wait-timeout 2
+"""
+
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+SCENARIOS = ('login', 'status', 'validate', 'wait')
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = 'Measure throughput and latency of the login, status, session and long-poll endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8000',
+            help='Base URL of the running deployment (default: http://127.0.0.1:8000)'
+        )
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=SCENARIOS,
+            help='Scenario to run; repeat for several (default: all)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Requests per scenario (default: 2000; the wait scenario sends one per client)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=50,
+            help='Concurrent clients (default: 50)'
+        )
+        parser.add_argument(
+            '--session-token',
+            default=None,
+            help='Session JWT sent by the validate scenario so it reaches the database'
+        )
+        parser.add_argument(
+            '--wait-timeout',
+            type=float,
+            default=2.0,
+            help='Seconds each long-poll is held in the wait scenario (default: 2)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError as e:
+            raise CommandError('bench_auth_load requires aiohttp') from e
+
+        self.base_url = options['url'].rstrip('/')
+        scenarios = options['scenario'] or list(SCENARIOS)
+
+        self.stdout.write(
+            f"{'scenario':<10} {'requests':>9} {'errors':>7} {'req/s':>9} "
+            f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+        )
+        for scenario in scenarios:
+            result = asyncio.run(self.run_scenario(scenario, options))
+            self.stdout.write(
+                f"{scenario:<10} {result['requests']:>9} {result['errors']:>7} "
+                f"{result['throughput']:>9.1f} {result['p50']:>9.1f} "
+                f"{result['p95']:>9.1f} {result['p99']:>9.1f}"
+            )
+
+    async def run_scenario(self, scenario, options):
+        import aiohttp
+
+        concurrency = options['concurrency']
+        total = concurrency if scenario == 'wait' else options['requests']
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        timeout = aiohttp.ClientTimeout(total=max(60, options['wait_timeout'] * 10))
+
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            challenge_id = None
+            if scenario in ('status', 'wait'):
+                try:
+                    async with session.post(f'{self.base_url}/api/auth/login/request') as response:
+                        if response.status != 200:
+                            raise CommandError(f'Could not create a challenge: HTTP {response.status}')
+                        challenge_id = (await response.json())['challenge_id']
+                except aiohttp.ClientError as e:
+                    raise CommandError(f'Could not reach {self.base_url}: {e}') from e
+
+            cookies = {'session_token': options['session_token']} if options['session_token'] else None
+
+            def send():
+                if scenario == 'login':
+                    return session.post(f'{self.base_url}/api/auth/login/request')
+                if scenario == 'status':
+                    return session.get(
+                        f'{self.base_url}/api/auth/challenge/status',
+                        params={'challenge_id': challenge_id}
+                    )
+                if scenario == 'validate':
+                    return session.post(f'{self.base_url}/api/auth/session/validate', cookies=cookies)
+                return session.get(
+                    f'{self.base_url}/api/auth/challenge/status/wait',
+                    params={'challenge_id': challenge_id, 'timeout': options['wait_timeout']}
+                )
+
+            latencies = []
+            errors = 0
+            pending = iter(range(total))
+
+            async def client():
+                nonlocal errors
+                for _ in pending:
+                    started = time.perf_counter()
+                    try:
+                        async with send() as response:
+                            await response.read()
+                            if response.status >= 400:
+                                errors += 1
+                    except aiohttp.ClientError:
+                        errors += 1
+                    latencies.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(client() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'requests': total,
+            'errors': errors,
+            'throughput': total / elapsed if elapsed else 0.0,
+            'p50': statistics.median(latencies) if latencies else 0.0,
+            'p95': _percentile(latencies, 0.95),
+            'p99': _percentile(latencies, 0.99),
+        }
@@ -0,0 +1,88 @@
+"""
+Microbenchmark of session JWT sign and verify throughput per JWT_ALGORITHM.
+Asymmetric algorithms use a throwaway key. The "pem" rows pass PEM text to
+PyJWT on every call, which is what the cached key objects avoid.
+
+Usage:
+    python manage.py bench_jwt
+    python manage.py bench_jwt --iterations 20000 --algorithm ES256
+"""
+
+import logging
+import os
+import tempfile
+import time
+
+import jwt
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from authenticate.jwt_keys import ASYMMETRIC_JWT_ALGORITHMS, JWT_ALGORITHMS, generate_private_key_pem
+from authenticate.utils import create_jwt_token, decode_jwt_token
+
+
+def _ops_per_second(func, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - started)
+
+
+class Command(BaseCommand):
+    help = 'Measure session token sign and verify throughput for HS256, ES256 and EdDSA'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=5000,
+            help='Tokens signed and verified per algorithm (default: 5000)'
+        )
+        parser.add_argument(
+            '--algorithm',
+            action='append',
+            choices=JWT_ALGORITHMS,
+            help='Algorithm to measure; repeat for several (default: all)'
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        algorithms = options['algorithm'] or list(JWT_ALGORITHMS)
+
+        # Measure the crypto, not the per-token INFO records
+        logging.getLogger('authenticate.hotpath').setLevel(logging.WARNING)
+
+        self.stdout.write(f"{'algorithm':<12} {'sign/s':>10} {'verify/s':>10} {'token bytes':>12}")
+
+        with tempfile.TemporaryDirectory() as key_dir:
+            for algorithm in algorithms:
+                key_file = ''
+                if algorithm in ASYMMETRIC_JWT_ALGORITHMS:
+                    key_file = os.path.join(key_dir, f'{algorithm}.pem')
+                    with open(key_file, 'w') as f:
+                        f.write(generate_private_key_pem(algorithm))
+
+                with override_settings(JWT_ALGORITHM=algorithm, JWT_PRIVATE_KEY_FILE=key_file):
+                    token = create_jwt_token('bench-device', 'bench-session')
+                    sign_rate = _ops_per_second(lambda: create_jwt_token('bench-device', 'bench-session'), iterations)
+                    verify_rate = _ops_per_second(lambda: decode_jwt_token(token), iterations)
+                self.stdout.write(f"{algorithm:<12} {sign_rate:>10.0f} {verify_rate:>10.0f} {len(token):>12}")
+
+                if key_file:
+                    self._bench_pem(algorithm, key_file, iterations)
+
+    def _bench_pem(self, algorithm, key_file, iterations):
+        from cryptography.hazmat.primitives import serialization
+
+        with open(key_file) as f:
+            private_pem = f.read()
+        public_pem = serialization.load_pem_private_key(private_pem.encode(), password=None).public_key().public_bytes(
+            serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+
+        payload = {'device_id': 'bench-device', 'session_id': 'bench-session'}
+        token = jwt.encode(payload, private_pem, algorithm=algorithm)
+        sign_rate = _ops_per_second(lambda: jwt.encode(payload, private_pem, algorithm=algorithm), iterations)
+        verify_rate = _ops_per_second(lambda: jwt.decode(token, public_pem, algorithms=[algorithm]), iterations)
+        label = f'{algorithm} pem'
+        self.stdout.write(f"{label:<12} {sign_rate:>10.0f} {verify_rate:>10.0f} {len(token):>12}")
@@ -0,0 +1,110 @@
+"""
+Microbenchmark of the time a request thread spends in a hot-path log call:
+synchronous file and stream handlers, the same handlers behind a
+QueueHandler/QueueListener, and the queue plus HotPathFilter sampling.
+Handlers write to temporary files, so the project logs are untouched;
+--write-delay-ms models slow or contended log storage.
+
+Usage:
+    python manage.py bench_logging
+    python manage.py bench_logging --records 5000 --write-delay-ms 0.2
+"""
+
+import logging
+import os
+import queue
+import statistics
+import tempfile
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from nullpass.log_queue import HotPathFilter
+
+
+class SlowFileHandler(logging.FileHandler):
+    """FileHandler that stalls each write, standing in for a slow disk"""
+
+    def __init__(self, filename, delay_seconds):
+        super().__init__(filename)
+        self.delay_seconds = delay_seconds
+
+    def emit(self, record):
+        super().emit(record)
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+
+
+class Command(BaseCommand):
+    help = 'Compare per-call logging latency of synchronous, queued and sampled handlers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--records',
+            type=int,
+            default=20000,
+            help='Log calls per setup (default: 20000)'
+        )
+        parser.add_argument(
+            '--write-delay-ms',
+            type=float,
+            default=0.0,
+            help='Extra time each file write takes (default: 0)'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'setup':<16} {'mean us':>9} {'p99 us':>9} {'drain ms':>9} {'written':>9}")
+
+        with tempfile.TemporaryDirectory() as log_dir:
+            for setup in ('sync', 'queue', 'queue+sampling'):
+                self._run(setup, log_dir, options['records'], options['write_delay_ms'] / 1000)
+
+    def _run(self, setup, log_dir, records, write_delay):
+        formatter = logging.Formatter('{levelname} {asctime} {module} {message}', style='{')
+        log_path = os.path.join(log_dir, f'{setup}.log')
+        console = open(os.path.join(log_dir, f'{setup}.console'), 'w')
+        handlers = [SlowFileHandler(log_path, write_delay), logging.StreamHandler(console)]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        logger = logging.getLogger(f'nullpass.bench_logging.{setup}')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+
+        listener = None
+        if setup == 'sync':
+            logger.handlers = handlers
+        else:
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            listener.start()
+            logger.handlers = [QueueHandler(log_queue)]
+        if setup == 'queue+sampling':
+            logger.addFilter(HotPathFilter(
+                settings.LOG_HOT_PATH_SAMPLE_EVERY, settings.LOG_HOT_PATH_MAX_PER_SECOND
+            ))
+
+        timings = []
+        for i in range(records):
+            started = time.perf_counter()
+            logger.info("JWT token decoded successfully for device: %s", f'device-{i % 50}')
+            timings.append((time.perf_counter() - started) * 1e6)
+
+        started = time.perf_counter()
+        if listener is not None:
+            listener.stop()
+        drain_ms = (time.perf_counter() - started) * 1000
+
+        for handler in handlers:
+            handler.close()
+        console.close()
+        with open(log_path) as f:
+            written = sum(1 for _ in f)
+
+        timings.sort()
+        p99 = timings[min(int(len(timings) * 0.99), len(timings) - 1)]
+        self.stdout.write(
+            f"{setup:<16} {statistics.mean(timings):>9.2f} {p99:>9.2f} {drain_ms:>9.1f} {written:>9}"
+        )
@@ -0,0 +1,88 @@
+"""
+In-process benchmark of login-request throughput per challenge store, e.g.
+with a database write per challenge (orm) against none at all (signed).
+Runs the request_login view directly against the configured database and
+cache, and deletes the challenge rows it created afterwards.
+
+Usage:
+    python manage.py bench_login_request
+    python manage.py bench_login_request --requests 5000 --store orm --store signed
+"""
+
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from authenticate import views
+from authenticate.challenge_store import CHALLENGE_STORES
+from authenticate.models import AuthenticationChallenge
+from authenticate.qr import QR_CODE_FORMATS
+
+
+def _challenge_id(response):
+    return json.loads(response.content)['challenge_id']
+
+
+class Command(BaseCommand):
+    help = 'Measure request_login throughput and queries per request for each CHALLENGE_STORE'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Login requests per store (default: 2000)'
+        )
+        parser.add_argument(
+            '--store',
+            action='append',
+            choices=list(CHALLENGE_STORES),
+            help='Challenge store to measure; repeat for several (default: all)'
+        )
+        parser.add_argument(
+            '--qr-format',
+            choices=QR_CODE_FORMATS,
+            default='none',
+            help='QR format requested, so rendering cost can be kept out (default: none)'
+        )
+
+    def handle(self, *args, **options):
+        stores = options['store'] or list(CHALLENGE_STORES)
+        factory = RequestFactory()
+        path = f"/api/auth/login/request?qr_format={options['qr_format']}"
+
+        self.stdout.write(f"{'store':<8} {'req/s':>9} {'mean ms':>9} {'p95 ms':>9} {'queries/req':>12}")
+
+        # The pool would hide the store's cost
+        for store in stores:
+            with override_settings(CHALLENGE_STORE=store, CHALLENGE_POOL_ENABLED=False):
+                challenge_ids = []
+
+                with CaptureQueriesContext(connection) as queries:
+                    response = views.request_login(factory.post(path))
+                challenge_ids.append(_challenge_id(response))
+
+                timings = []
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    request_started = time.perf_counter()
+                    response = views.request_login(factory.post(path))
+                    timings.append((time.perf_counter() - request_started) * 1000)
+                    challenge_ids.append(_challenge_id(response))
+                elapsed = time.perf_counter() - started
+
+            timings.sort()
+            p95 = timings[min(int(len(timings) * 0.95), len(timings) - 1)]
+            self.stdout.write(
+                f"{store:<8} {len(timings) / elapsed:>9.0f} {statistics.mean(timings):>9.2f} "
+                f"{p95:>9.2f} {len(queries):>12}"
+            )
+
+            if store == 'orm':
+                for i in range(0, len(challenge_ids), 500):
+                    AuthenticationChallenge.objects.filter(challenge_id__in=challenge_ids[i:i + 500]).delete()
@@ -0,0 +1,79 @@
+"""
+Microbenchmark of QR rendering time and payload size per output mode.
+
+Usage:
+    python manage.py bench_qr
+    python manage.py bench_qr --iterations 500 --format svg --format matrix
+    python manage.py bench_qr --mask-pattern 0
+"""
+
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+from authenticate.qr import QR_CODE_FORMATS, render_qr
+from authenticate.utils import generate_challenge_nonce
+
+
+class Command(BaseCommand):
+    help = 'Measure render time and response payload size of each QR_CODE_FORMAT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=200,
+            help='Renders per format (default: 200)'
+        )
+        parser.add_argument(
+            '--format',
+            action='append',
+            choices=QR_CODE_FORMATS,
+            help='Format to measure; repeat for several (default: all)'
+        )
+        parser.add_argument(
+            '--mask-pattern',
+            type=int,
+            choices=range(8),
+            default=None,
+            help='Fixed QR mask pattern to measure instead of QR_CODE_MASK_PATTERN'
+        )
+
+    def handle(self, *args, **options):
+        formats = options['format'] or list(QR_CODE_FORMATS)
+        mask_pattern = options['mask_pattern']
+        if mask_pattern is None:
+            mask_pattern = settings.QR_CODE_MASK_PATTERN
+
+        # Real login URLs, so the QR version matches production
+        payloads = []
+        for _ in range(options['iterations']):
+            challenge = generate_challenge_nonce()
+            payloads.append(
+                f"{settings.FRONTEND_BASE_URL}/authenticate?"
+                f"challenge_id={challenge['challenge_id']}&nonce={challenge['nonce']}"
+            )
+
+        self.stdout.write(f"mask pattern: {'auto' if mask_pattern is None else mask_pattern}")
+        self.stdout.write(f"{'format':<12} {'mean ms':>9} {'p95 ms':>9} {'payload bytes':>14}")
+
+        with override_settings(QR_CODE_MASK_PATTERN=mask_pattern):
+            for qr_format in formats:
+                timings = []
+                sizes = []
+                for payload in payloads:
+                    started = time.perf_counter()
+                    fields = render_qr(payload, qr_format)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    sizes.append(len(json.dumps(fields)))
+
+                timings.sort()
+                p95 = timings[min(int(len(timings) * 0.95), len(timings) - 1)]
+                self.stdout.write(
+                    f"{qr_format:<12} {statistics.mean(timings):>9.2f} {p95:>9.2f} "
+                    f"{round(statistics.mean(sizes)):>14}"
+                )
@@ -0,0 +1,61 @@
+"""
+Remove expired authentication challenges and dead sessions.
+
+Usage:
+    python manage.py purge_expired
+    python manage.py purge_expired --retention-hours 72 --batch-size 500
+    python manage.py purge_expired --archive logs/purged.ndjson
+    python manage.py purge_expired --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from authenticate.maintenance import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired challenges and terminated or expired sessions in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retention-hours',
+            type=int,
+            default=None,
+            help='Keep rows that died within this many hours (default: PURGE_RETENTION_HOURS)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Rows deleted per statement (default: PURGE_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--archive',
+            default=None,
+            help='Append removed rows to this file as NDJSON before deleting them'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only count the rows that would be removed'
+        )
+
+    def handle(self, *args, **options):
+        archive_file = open(options['archive'], 'a') if options['archive'] else None
+
+        try:
+            result = purge_expired(
+                retention_hours=options['retention_hours'],
+                batch_size=options['batch_size'],
+                archive_file=archive_file,
+                dry_run=options['dry_run']
+            )
+        finally:
+            if archive_file is not None:
+                archive_file.close()
+
+        verb = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result['challenges']} expired challenges and "
+            f"{result['sessions']} dead sessions in {result['duration_ms']} ms"
+        ))
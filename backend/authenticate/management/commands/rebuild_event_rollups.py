@@ -0,0 +1,36 @@
+"""
+Recompute the hourly authentication event rollups from raw events.
+Rollups are maintained as events are written; use this after restoring or
+importing events, or to repair drift.
+
+Usage:
+    python manage.py rebuild_event_rollups
+    python manage.py rebuild_event_rollups --since-hours 168
+"""
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from authenticate.rollups import rebuild_event_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild AuthenticationEventRollup rows from AuthenticationEvent'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since-hours',
+            type=int,
+            default=None,
+            help='Only rebuild this many recent hours (default: all history)'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since_hours'] is not None:
+            since = timezone.now() - timedelta(hours=options['since_hours'])
+
+        rows = rebuild_event_rollups(since=since)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {rows} rollup rows"))
@@ -0,0 +1,25 @@
+"""
+Recount devices and sessions and correct the materialized SystemCounter rows.
+Counters are adjusted as rows change; run this on a schedule (cron) when the
+in-process purge sweeper is off, or after raw SQL or restores.
+
+Usage:
+    python manage.py reconcile_counters
+"""
+
+from django.core.management.base import BaseCommand
+
+from authenticate.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Recount TrustedDevice and UserSession rows into SystemCounter'
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters()
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Counters already match'))
+            return
+        for name, delta in drift.items():
+            self.stdout.write(f"{name}: {delta:+d}")
+        self.stdout.write(self.style.SUCCESS(f"Corrected {len(drift)} counter(s)"))
@@ -0,0 +1,78 @@
+"""
+Move cold weeks or months of authentication events out of the hot table.
+Each cold period is streamed into a gzip-compressed NDJSON file in
+EVENT_ARCHIVE_DIR, recorded as an EventArchivePartition with its row count
+and SHA256, and then deleted from AuthenticationEvent in batches. Hourly
+rollups are kept, so dashboard totals still include archived events.
+
+Usage:
+    python manage.py roll_event_partitions
+    python manage.py roll_event_partitions --period week --hot-days 14
+    python manage.py roll_event_partitions --dry-run
+"""
+
+from django.core.management.base import BaseCommand
+
+from authenticate.maintenance import roll_event_partitions
+
+
+class Command(BaseCommand):
+    help = 'Archive AuthenticationEvent periods older than EVENT_HOT_DAYS into compressed files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            choices=['week', 'month'],
+            default=None,
+            help='Partition size (default: EVENT_PARTITION_PERIOD)'
+        )
+        parser.add_argument(
+            '--hot-days',
+            type=int,
+            default=None,
+            help='Keep periods overlapping this many recent days hot (default: EVENT_HOT_DAYS)'
+        )
+        parser.add_argument(
+            '--archive-dir',
+            default=None,
+            help='Directory for archive files (default: EVENT_ARCHIVE_DIR)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Rows read and deleted per statement (default: PURGE_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the cold periods and their row counts'
+        )
+
+    def handle(self, *args, **options):
+        result = roll_event_partitions(
+            hot_days=options['hot_days'],
+            period=options['period'],
+            archive_dir=options['archive_dir'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run']
+        )
+
+        for partition in result['partitions']:
+            if options['dry_run']:
+                self.stdout.write(f"{partition['period']}: {partition['rows']} events")
+            else:
+                self.stdout.write(
+                    f"{partition['period']}: {partition['rows']} events, "
+                    f"{partition['bytes']} bytes -> {partition['path']}"
+                )
+
+        for label in result['held_back']:
+            self.stdout.write(self.style.WARNING(f"{label}: held back until its events are anchored"))
+
+        verb = 'Would archive' if options['dry_run'] else 'Archived'
+        archived = sum(partition['rows'] for partition in result['partitions'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {archived} events in {len(result['partitions'])} partitions before "
+            f"{result['hot_boundary']:%Y-%m-%d} in {result['duration_ms']} ms"
+        ))
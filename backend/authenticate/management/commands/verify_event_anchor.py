@@ -0,0 +1,63 @@
+"""
+Recheck authentication events against their anchored Merkle roots.
+Each event is rehashed, from its row or, once archived by
+roll_event_partitions, from its archive file, and its stored inclusion proof
+is replayed up to the root, without contacting the ledger unless
+--check-ledger is given (only for ledgers that can look roots up).
+
+Usage:
+    python manage.py verify_event_anchor --event-id 42 --event-id 43
+    python manage.py verify_event_anchor --all
+    python manage.py verify_event_anchor --all --check-ledger
+"""
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from authenticate.anchoring import require_ledger_lookup, verify_events
+
+
+class Command(BaseCommand):
+    help = 'Verify AuthenticationEvent rows against their Merkle inclusion proofs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--event-id',
+            type=int,
+            action='append',
+            dest='event_ids',
+            help='Event to verify (repeatable)'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Verify every event that has an inclusion proof'
+        )
+        parser.add_argument(
+            '--check-ledger',
+            action='store_true',
+            help='Also confirm each root was recorded by its ledger transaction'
+        )
+
+    def handle(self, *args, **options):
+        if not options['event_ids'] and not options['all']:
+            raise CommandError('Give --event-id or --all')
+
+        if options['check_ledger']:
+            try:
+                require_ledger_lookup()
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+
+        event_ids = None if options['all'] else options['event_ids']
+        counts = {}
+        for result in verify_events(event_ids, check_ledger=options['check_ledger']):
+            counts[result['status']] = counts.get(result['status'], 0) + 1
+            if result['status'] != 'valid':
+                where = f" in {result['archive']}" if result['archive'] else ''
+                self.stdout.write(f"Event {result['event_id']}{where}: {result['status']} ({result['reason']})")
+
+        summary = ', '.join(f"{count} {status}" for status, count in sorted(counts.items())) or 'no events'
+        if counts.get('invalid') or counts.get('unanchored'):
+            raise CommandError(f"Verification failed: {summary}")
+        self.stdout.write(self.style.SUCCESS(f"Verified: {summary}"))
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.1 on 2026-10-17 03:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trusteddevice',
+            name='signature_format',
+            field=models.CharField(blank=True, choices=[('der', 'DER (ASN.1)'), ('raw', 'Raw (IEEE P1363)')], help_text='Preferred signature encoding declared at enrollment', max_length=8),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0002_trusteddevice_signature_format'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersession',
+            name='token_digest',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='SHA256 hex digest of the issued JWT', max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='usersession',
+            name='session_token',
+            field=models.TextField(blank=True, default='', help_text='Legacy raw JWT; cleared by backfill_session_digests'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.1 on 2026-10-17 10:00
+
+from datetime import timezone
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncHour
+
+
+def backfill_rollups(apps, schema_editor):
+    AuthenticationEvent = apps.get_model('authenticate', 'AuthenticationEvent')
+    AuthenticationEventRollup = apps.get_model('authenticate', 'AuthenticationEventRollup')
+    grouped = (
+        AuthenticationEvent.objects.using(schema_editor.connection.alias)
+        .annotate(hour=TruncHour('timestamp', tzinfo=timezone.utc))
+        .values('hour', 'event_type', 'success', 'attack_type')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    AuthenticationEventRollup.objects.using(schema_editor.connection.alias).bulk_create(
+        [AuthenticationEventRollup(**row) for row in grouped],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0003_usersession_token_digest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthenticationEventRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(help_text='Start of the UTC hour')),
+                ('event_type', models.CharField(choices=[('ENROLLMENT', 'Device Enrollment'), ('LOGIN_SUCCESS', 'Login Success'), ('LOGIN_FAILED', 'Login Failed'), ('REPLAY_ATTACK', 'Replay Attack Detected'), ('INVALID_SIGNATURE', 'Invalid Signature'), ('EXPIRED_CHALLENGE', 'Expired Challenge'), ('UNREGISTERED_DEVICE', 'Unregistered Device'), ('SESSION_TERMINATED', 'Session Terminated'), ('DEVICE_DEACTIVATED', 'Device Deactivated')], max_length=50)),
+                ('success', models.BooleanField()),
+                ('attack_type', models.CharField(blank=True, max_length=50)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Authentication Event Rollup',
+                'verbose_name_plural': 'Authentication Event Rollups',
+                'ordering': ['-hour'],
+                'constraints': [models.UniqueConstraint(fields=('hour', 'event_type', 'success', 'attack_type'), name='unique_event_rollup_bucket')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
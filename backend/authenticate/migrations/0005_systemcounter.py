@@ -0,0 +1,48 @@
+# Generated by Django 6.0.1 on 2026-10-17 11:00
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def seed_counters(apps, schema_editor):
+    TrustedDevice = apps.get_model('authenticate', 'TrustedDevice')
+    UserSession = apps.get_model('authenticate', 'UserSession')
+    SystemCounter = apps.get_model('authenticate', 'SystemCounter')
+    alias = schema_editor.connection.alias
+
+    values = TrustedDevice.objects.using(alias).aggregate(
+        devices_total=Count('pk'),
+        devices_active=Count('pk', filter=Q(is_active=True)),
+        devices_flagged=Count('pk', filter=Q(is_flagged=True))
+    )
+    values.update(UserSession.objects.using(alias).aggregate(
+        sessions_total=Count('pk'),
+        sessions_active=Count('pk', filter=Q(is_active=True))
+    ))
+    SystemCounter.objects.using(alias).bulk_create(
+        [SystemCounter(name=name, value=value) for name, value in values.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0004_authenticationeventrollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'System Counter',
+                'verbose_name_plural': 'System Counters',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
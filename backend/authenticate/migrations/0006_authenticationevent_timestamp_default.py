@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-17 12:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0005_systemcounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='authenticationevent',
+            name='timestamp',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0.1 on 2026-10-17 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0006_authenticationevent_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventArchivePartition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Week'), ('month', 'Month')], max_length=8)),
+                ('start', models.DateTimeField(help_text='First instant of the period (UTC)')),
+                ('end', models.DateTimeField(help_text='First instant after the period (UTC)')),
+                ('path', models.CharField(help_text='Archive file (.ndjson.gz)', max_length=500)),
+                ('row_count', models.BigIntegerField()),
+                ('size_bytes', models.BigIntegerField()),
+                ('sha256', models.CharField(help_text='SHA256 hex digest of the archive file', max_length=64)),
+                ('last_event_id', models.BigIntegerField(help_text='Highest archived event id; later rows in the period stay hot')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Event Archive Partition',
+                'verbose_name_plural': 'Event Archive Partitions',
+                'ordering': ['-start'],
+            },
+        ),
+    ]
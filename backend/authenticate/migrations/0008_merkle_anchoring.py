@@ -0,0 +1,49 @@
+# Generated by Django 6.0.1 on 2026-10-17 14:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0007_eventarchivepartition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MerkleAnchor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('root', models.CharField(help_text='SHA256 hex Merkle root', max_length=64)),
+                ('leaf_count', models.IntegerField()),
+                ('first_event_id', models.BigIntegerField()),
+                ('last_event_id', models.BigIntegerField()),
+                ('ledger', models.CharField(help_text='BLOCKCHAIN_LEDGER that anchored the root', max_length=100)),
+                ('tx_hash', models.CharField(blank=True, help_text='Ledger transaction; empty until anchored', max_length=66)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('anchored_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Merkle Anchor',
+                'verbose_name_plural': 'Merkle Anchors',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='EventInclusionProof',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_id', models.BigIntegerField(unique=True)),
+                ('leaf_index', models.IntegerField()),
+                ('event_hash', models.CharField(help_text='generate_event_hash() at anchoring time', max_length=64)),
+                ('path', models.JSONField(help_text="[[side, sibling hash], ...] from leaf to root; side is 'L' or 'R'")),
+                ('anchor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proofs', to='authenticate.merkleanchor')),
+            ],
+            options={
+                'verbose_name': 'Event Inclusion Proof',
+                'verbose_name_plural': 'Event Inclusion Proofs',
+                'ordering': ['event_id'],
+            },
+        ),
+    ]
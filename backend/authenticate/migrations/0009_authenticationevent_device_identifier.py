@@ -0,0 +1,32 @@
+# Generated by Django 6.0.1 on 2026-10-17 16:00
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_device_identifiers(apps, schema_editor):
+    AuthenticationEvent = apps.get_model('authenticate', 'AuthenticationEvent')
+    TrustedDevice = apps.get_model('authenticate', 'TrustedDevice')
+    alias = schema_editor.connection.alias
+
+    AuthenticationEvent.objects.using(alias).filter(device__isnull=False).update(
+        device_identifier=Subquery(
+            TrustedDevice.objects.using(alias).filter(pk=OuterRef('device_id')).values('device_id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authenticate', '0008_merkle_anchoring'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authenticationevent',
+            name='device_identifier',
+            field=models.CharField(blank=True, help_text='device.device_id when the event was written', max_length=64),
+        ),
+        migrations.RunPython(copy_device_identifiers, migrations.RunPython.noop),
+    ]
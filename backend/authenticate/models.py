@@ -2,7 +2,7 @@ from django.db import models
 
 # Create your models here.
 
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from datetime import timedelta
 import hashlib
@@ -14,9 +14,20 @@ class TrustedDevice(models.Model):
     Model to store trusted devices enrolled in the NullPass system.
     Each device has a unique cryptographic key pair (only public key stored).
     """
+    SIGNATURE_FORMAT_CHOICES = [
+        ('der', 'DER (ASN.1)'),
+        ('raw', 'Raw (IEEE P1363)'),
+    ]
+    
     device_id = models.CharField(max_length=64, unique=True, db_index=True)
     device_name = models.CharField(max_length=100)
     public_key = models.TextField(help_text="ECDSA public key in PEM format")
+    signature_format = models.CharField(
+        max_length=8,
+        choices=SIGNATURE_FORMAT_CHOICES,
+        blank=True,
+        help_text="Preferred signature encoding declared at enrollment"
+    )
     user_identifier = models.CharField(max_length=100, blank=True, help_text="Optional user email or username")
     
     # Timestamps
@@ -36,36 +47,87 @@ class TrustedDevice(models.Model):
     def __str__(self):
         return f"{self.device_name} ({self.device_id[:8]}...)"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored public key and flags so changes can be detected on save"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_public_key = instance.__dict__.get('public_key')
+        from .counters import snapshot
+        snapshot(instance)
+        return instance
+    
+    def save(self, *args, **kwargs):
+        """Override save to keep the device counters current and drop the cached parsed key on rotation"""
+        from .counters import record_save
+        adding = self._state.adding
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            record_save(self, adding, kwargs.get('update_fields'))
+        loaded_public_key = getattr(self, '_loaded_public_key', None)
+        if loaded_public_key is not None and loaded_public_key != self.public_key:
+            self.invalidate_cached_key()
+        self._loaded_public_key = self.public_key
+    
+    def delete(self, *args, **kwargs):
+        """Override delete to take the device and its cascaded sessions out of the counters"""
+        from .counters import record_deleting
+        with transaction.atomic(savepoint=False):
+            record_deleting(UserSession.objects.filter(device=self))
+            record_deleting(TrustedDevice.objects.filter(pk=self.pk))
+            return super().delete(*args, **kwargs)
+    
+    def invalidate_cached_key(self):
+        """Remove this device's parsed public key from the verification cache"""
+        from .key_cache import public_key_cache
+        public_key_cache.invalidate(self.device_id)
+    
     def deactivate(self):
-        """Deactivate the device"""
-        self.is_active = False
-        self.save()
+        """Deactivate the device (counted once however many calls race)"""
+        from .counters import set_flag
+        set_flag(self, 'is_active', False)
+        self.invalidate_cached_key()
+        from .session_cache import invalidate_device_sessions
+        invalidate_device_sessions([self])
     
     def flag_device(self):
-        """Flag device for suspicious activity"""
-        self.is_flagged = True
-        self.save()
+        """Flag device for suspicious activity (counted once however many calls race)"""
+        from .counters import set_flag
+        set_flag(self, 'is_flagged', True)
     
     def reset_failed_attempts(self):
         """Reset failed login attempts counter"""
         self.failed_attempts = 0
-        self.save()
+        self.save(update_fields=['failed_attempts'])
     
     def increment_failed_attempts(self):
         """Increment failed attempts and flag if threshold exceeded"""
         from django.conf import settings
-        self.failed_attempts += 1
-        
-        # Flag device if exceeds threshold
-        if self.failed_attempts >= settings.MAX_FAILED_ATTEMPTS:
-            self.flag_device()
+        from .counters import snapshot, update_flag
         
-        self.save()
+        # Targeted UPDATEs so concurrent failures all count and a flag is never undone
+        with transaction.atomic(savepoint=False):
+            TrustedDevice.objects.filter(pk=self.pk).update(failed_attempts=models.F('failed_attempts') + 1)
+            flagged = update_flag(
+                TrustedDevice.objects.filter(pk=self.pk, failed_attempts__gte=settings.MAX_FAILED_ATTEMPTS),
+                'is_flagged',
+                True
+            )
+        self.failed_attempts += 1
+        if flagged:
+            self.is_flagged = True
+            snapshot(self, ['is_flagged'])
     
     def update_last_used(self):
         """Update last used timestamp"""
         self.last_used_at = timezone.now()
-        self.save()
+        self.save(update_fields=['last_used_at'])
+    
+    def record_successful_login(self):
+        """Reset failed attempts and update last used timestamp in one UPDATE"""
+        now = timezone.now()
+        TrustedDevice.objects.filter(pk=self.pk).update(failed_attempts=0, last_used_at=now)
+        self.failed_attempts = 0
+        self.last_used_at = now
 
 
 class AuthenticationChallenge(models.Model):
@@ -108,9 +170,9 @@ class AuthenticationChallenge(models.Model):
     
     def check_expired(self):
         """Check if challenge has expired and update status"""
-        if timezone.now() > self.expires_at:
+        if not self.is_expired and timezone.now() > self.expires_at:
             self.is_expired = True
-            self.save()
+            self.save(update_fields=['is_expired'])
         return self.is_expired
     
     def is_valid(self):
@@ -121,13 +183,25 @@ class AuthenticationChallenge(models.Model):
         """Mark challenge as used and associate with device"""
         self.is_used = True
         self.device = device
-        self.save()
+        self.save(update_fields=['is_used', 'device'])
+
+
+class AuthenticationEventQuerySet(models.QuerySet):
+    """
+    Events are also written with bulk_create, which skips save()
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for event in objs:
+            event.capture_device_identifier()
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class AuthenticationEvent(models.Model):
     """
     Model to store all authentication events for audit trail.
-    Events are logged immutably and can be stored on blockchain.
+    Events are logged immutably and anchored in Merkle batches (see anchoring).
     """
     EVENT_TYPES = [
         ('ENROLLMENT', 'Device Enrollment'),
@@ -141,9 +215,21 @@ class AuthenticationEvent(models.Model):
         ('DEVICE_DEACTIVATED', 'Device Deactivated'),
     ]
     
+    ATTACK_CLASSIFICATIONS = {
+        'REPLAY_ATTACK': 'Replay Attack',
+        'INVALID_SIGNATURE': 'Signature Forgery Attempt',
+        'UNREGISTERED_DEVICE': 'Unauthorized Device Access',
+        'EXPIRED_CHALLENGE': 'Timing Attack Attempt',
+    }
+    
     event_type = models.CharField(max_length=50, choices=EVENT_TYPES)
     device = models.ForeignKey(TrustedDevice, on_delete=models.SET_NULL, null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Copied when the event is written so its hash survives the device being deleted
+    device_identifier = models.CharField(
+        max_length=64, blank=True, help_text="device.device_id when the event was written"
+    )
+    # Set when the event is recorded, not when a queued batch is inserted
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
     success = models.BooleanField()
     
     # Request metadata
@@ -158,6 +244,8 @@ class AuthenticationEvent(models.Model):
     blockchain_hash = models.CharField(max_length=66, blank=True, null=True, help_text="SHA256 hash of event")
     blockchain_tx_hash = models.CharField(max_length=66, blank=True, null=True, help_text="Blockchain transaction hash")
     
+    objects = AuthenticationEventQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-timestamp']
         verbose_name = 'Authentication Event'
@@ -170,61 +258,170 @@ class AuthenticationEvent(models.Model):
     def __str__(self):
         return f"{self.get_event_type_display()} - {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
     
+    def save(self, *args, **kwargs):
+        """Override save to count new events in their hourly rollup"""
+        from .rollups import record_events
+        
+        adding = self._state.adding
+        if adding:
+            self.capture_device_identifier()
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if adding:
+                record_events([self])
+    
+    @staticmethod
+    def compute_event_hash(event_type, device_id, timestamp, success):
+        """SHA256 of event fields, shared by live rows and rows read back from archives"""
+        data = f"{event_type}{device_id or 'None'}{timestamp.isoformat()}{success}"
+        return hashlib.sha256(data.encode()).hexdigest()
+    
+    def capture_device_identifier(self):
+        """Copy the device's device_id onto the event before it is inserted"""
+        if self.device is not None and not self.device_identifier:
+            self.device_identifier = self.device.device_id
+    
     def generate_event_hash(self):
         """Generate SHA256 hash of event data for blockchain storage"""
-        device_id = self.device.device_id if self.device else 'None'
-        data = f"{self.event_type}{device_id}{self.timestamp.isoformat()}{self.success}"
-        return hashlib.sha256(data.encode()).hexdigest()
+        # The stored copy, not the related row: SET_NULL would change the hash on device deletion
+        return self.compute_event_hash(
+            self.event_type,
+            self.device_identifier or None,
+            self.timestamp,
+            self.success
+        )
     
-    def log_to_blockchain(self):
-        """
-        Log event hash to blockchain for immutable audit trail.
-        This is optional and depends on BLOCKCHAIN_ENABLED setting.
-        """
-        from django.conf import settings
+    def classify_attack(self):
+        """Classify the type of attack based on event type (before insert, no extra write)"""
+        if self.event_type not in self.ATTACK_CLASSIFICATIONS:
+            return
         
-        if not settings.BLOCKCHAIN_ENABLED:
+        if self._state.adding:
+            self.attack_type = self.attack_type or self.ATTACK_CLASSIFICATIONS[self.event_type]
             return
         
-        try:
-            from blockchain_audit.blockchain_service import BlockchainService
-            
-            # Generate event hash
-            event_hash = self.generate_event_hash()
-            
-            # Initialize blockchain service
-            blockchain_service = BlockchainService()
-            
-            # Log to blockchain
-            tx_hash = blockchain_service.log_event(
-                event_hash=event_hash,
-                event_type=self.event_type,
-                success=self.success
-            )
-            
-            # Store hashes in database
-            self.blockchain_hash = event_hash
-            self.blockchain_tx_hash = tx_hash
-            self.save()
-            
-        except Exception as e:
-            # Log error but don't fail the authentication process
-            import logging
-            logger = logging.getLogger('authentication')
-            logger.error(f"Blockchain logging failed: {str(e)}")
-    
-    def classify_attack(self):
-        """Classify the type of attack based on event type"""
-        attack_classifications = {
-            'REPLAY_ATTACK': 'Replay Attack',
-            'INVALID_SIGNATURE': 'Signature Forgery Attempt',
-            'UNREGISTERED_DEVICE': 'Unauthorized Device Access',
-            'EXPIRED_CHALLENGE': 'Timing Attack Attempt',
-        }
+        from .rollups import record_events
         
-        if self.event_type in attack_classifications:
-            self.attack_type = attack_classifications[self.event_type]
-            self.save()
+        # Move the event to the rollup row of its new attack type
+        record_events([self], sign=-1)
+        self.attack_type = self.ATTACK_CLASSIFICATIONS[self.event_type]
+        self.save(update_fields=['attack_type'])
+        record_events([self])
+
+
+class AuthenticationEventRollup(models.Model):
+    """
+    Hourly count of authentication events, maintained as events are written.
+    Dashboard windows sum these rows instead of scanning AuthenticationEvent.
+    """
+    hour = models.DateTimeField(help_text="Start of the UTC hour")
+    event_type = models.CharField(max_length=50, choices=AuthenticationEvent.EVENT_TYPES)
+    success = models.BooleanField()
+    attack_type = models.CharField(max_length=50, blank=True)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-hour']
+        verbose_name = 'Authentication Event Rollup'
+        verbose_name_plural = 'Authentication Event Rollups'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['hour', 'event_type', 'success', 'attack_type'],
+                name='unique_event_rollup_bucket'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.hour:%Y-%m-%d %H}:00 - {self.count}"
+
+
+class MerkleAnchor(models.Model):
+    """
+    Merkle root over a batch of event hashes, anchored on the audit ledger
+    in one transaction instead of one per event.
+    """
+    root = models.CharField(max_length=64, help_text="SHA256 hex Merkle root")
+    leaf_count = models.IntegerField()
+    first_event_id = models.BigIntegerField()
+    last_event_id = models.BigIntegerField()
+    ledger = models.CharField(max_length=100, help_text="BLOCKCHAIN_LEDGER that anchored the root")
+    tx_hash = models.CharField(max_length=66, blank=True, help_text="Ledger transaction; empty until anchored")
+    created_at = models.DateTimeField(auto_now_add=True)
+    anchored_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Merkle Anchor'
+        verbose_name_plural = 'Merkle Anchors'
+
+    def __str__(self):
+        return f"Root {self.root[:12]}... over {self.leaf_count} events"
+
+
+class EventInclusionProof(models.Model):
+    """
+    Merkle audit path proving one event's hash is included under an anchored root.
+    Keyed by event id rather than a foreign key so proofs outlive archived events.
+    """
+    event_id = models.BigIntegerField(unique=True)
+    anchor = models.ForeignKey(MerkleAnchor, on_delete=models.CASCADE, related_name='proofs')
+    leaf_index = models.IntegerField()
+    event_hash = models.CharField(max_length=64, help_text="generate_event_hash() at anchoring time")
+    path = models.JSONField(help_text="[[side, sibling hash], ...] from leaf to root; side is 'L' or 'R'")
+
+    class Meta:
+        ordering = ['event_id']
+        verbose_name = 'Event Inclusion Proof'
+        verbose_name_plural = 'Event Inclusion Proofs'
+
+    def __str__(self):
+        return f"Proof for event {self.event_id}"
+
+
+class EventArchivePartition(models.Model):
+    """
+    A week or month of AuthenticationEvents moved out of the hot table into a
+    gzip-compressed NDJSON file by roll_event_partitions.
+    """
+    PERIOD_CHOICES = [
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ]
+
+    period = models.CharField(max_length=8, choices=PERIOD_CHOICES)
+    start = models.DateTimeField(help_text="First instant of the period (UTC)")
+    end = models.DateTimeField(help_text="First instant after the period (UTC)")
+    path = models.CharField(max_length=500, help_text="Archive file (.ndjson.gz)")
+    row_count = models.BigIntegerField()
+    size_bytes = models.BigIntegerField()
+    sha256 = models.CharField(max_length=64, help_text="SHA256 hex digest of the archive file")
+    last_event_id = models.BigIntegerField(help_text="Highest archived event id; later rows in the period stay hot")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-start']
+        verbose_name = 'Event Archive Partition'
+        verbose_name_plural = 'Event Archive Partitions'
+
+    def __str__(self):
+        return f"{self.period} from {self.start:%Y-%m-%d} - {self.row_count} events"
+
+
+class SystemCounter(models.Model):
+    """
+    Materialized device and session totals, adjusted as those rows change.
+    See authenticate.counters; reconcile_counters corrects any drift.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ['name']
+        verbose_name = 'System Counter'
+        verbose_name_plural = 'System Counters'
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
 
 
 class UserSession(models.Model):
@@ -233,7 +430,10 @@ class UserSession(models.Model):
     Each session is tied to a specific device and has an expiration time.
     """
     session_id = models.CharField(max_length=64, unique=True, default=uuid.uuid4, db_index=True)
-    session_token = models.TextField(help_text="JWT token for API authentication")
+    # Sessions are looked up by the session_id claim; only a digest of the issued token is kept
+    session_token = models.TextField(blank=True, default='', help_text="Legacy raw JWT; cleared by backfill_session_digests")
+    token_digest = models.CharField(max_length=64, blank=True, default='', db_index=True,
+                                    help_text="SHA256 hex digest of the issued JWT")
     device = models.ForeignKey(TrustedDevice, on_delete=models.CASCADE)
     
     # Timestamps
@@ -256,27 +456,59 @@ class UserSession(models.Model):
     def __str__(self):
         return f"Session for {self.device.device_name} - {self.session_id[:8]}..."
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Remember the stored is_active so terminations can be counted on save"""
+        instance = super().from_db(db, field_names, values)
+        from .counters import snapshot
+        snapshot(instance)
+        return instance
+    
     def save(self, *args, **kwargs):
-        """Override save to set expiration time if not provided"""
+        """Override save to set expiration time if not provided and keep the session counters current"""
         if not self.expires_at:
             from django.conf import settings
             self.expires_at = timezone.now() + timedelta(hours=settings.JWT_EXPIRATION_HOURS)
-        super().save(*args, **kwargs)
+        from .counters import record_save
+        adding = self._state.adding
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            record_save(self, adding, kwargs.get('update_fields'))
+    
+    def delete(self, *args, **kwargs):
+        """Override delete to take the session out of the counters"""
+        from .counters import record_deleting
+        with transaction.atomic(savepoint=False):
+            record_deleting(UserSession.objects.filter(pk=self.pk))
+            return super().delete(*args, **kwargs)
     
     def is_expired(self):
         """Check if session has expired"""
         return timezone.now() > self.expires_at
     
     def terminate(self):
-        """Terminate the session and log event"""
-        self.is_active = False
-        self.save()
+        """
+        Terminate the session and log event.
+        
+        Returns:
+            bool: True if this call terminated it, False if it was already inactive
+        """
+        from .audit_writer import record_event
+        from .counters import set_flag
+        from .session_cache import invalidate_sessions
+        
+        # Conditional UPDATE: of two racing terminations (double logout) only one counts and logs
+        terminated = set_flag(self, 'is_active', False, last_activity=timezone.now())
+        invalidate_sessions([self.session_id])
+        if not terminated:
+            return False
         
         # Log session termination event
-        AuthenticationEvent.objects.create(
+        record_event(
             event_type='SESSION_TERMINATED',
             device=self.device,
             success=True,
             ip_address=self.ip_address,
             user_agent=self.user_agent
         )
+        return True
@@ -0,0 +1,176 @@
+"""
+QR code rendering for NullPass login and enrollment links.
+The output mode is selected with the QR_CODE_FORMAT setting or per request:
+
+    png          - Pillow PNG at QR_CODE_BOX_SIZE pixels per module (legacy)
+    compact-png  - 1-bit PNG at one pixel per module; scale it up client-side
+                   with `image-rendering: pixelated`
+    svg          - vector SVG with one path of horizontal module runs
+    matrix       - raw module matrix for clients that draw the code themselves
+    none         - no QR at all (alias `client`); clients encode auth_url
+                   themselves and the login request costs one challenge write
+"""
+
+import base64
+import io
+from urllib.parse import quote
+
+import qrcode
+from django.conf import settings
+
+QR_CODE_FORMATS = ('png', 'compact-png', 'svg', 'matrix', 'none')
+QR_CODE_FORMAT_ALIASES = {'client': 'none'}
+
+
+def normalize_qr_format(qr_format):
+    """
+    Resolve aliases and validate a QR output mode.
+
+    Args:
+        qr_format (str): Requested mode, or None for QR_CODE_FORMAT
+
+    Returns:
+        str: One of QR_CODE_FORMATS
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    qr_format = qr_format or settings.QR_CODE_FORMAT
+    qr_format = QR_CODE_FORMAT_ALIASES.get(qr_format, qr_format)
+    if qr_format not in QR_CODE_FORMATS:
+        raise ValueError(f'Unsupported QR code format: {qr_format}')
+    return qr_format
+
+
+def generate_qr_data_uri(payload):
+    qr = qrcode.QRCode(
+        version=settings.QR_CODE_VERSION,
+        box_size=settings.QR_CODE_BOX_SIZE,
+        border=settings.QR_CODE_BORDER,
+        mask_pattern=settings.QR_CODE_MASK_PATTERN,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return f'data:image/png;base64,{img_base64}'
+
+
+def build_qr_modules(payload):
+    """
+    Encode a payload into its QR module matrix, without the quiet zone.
+
+    Args:
+        payload (str): Data to encode
+
+    Returns:
+        list: Rows of booleans, True for dark modules
+    """
+    qr = qrcode.QRCode(
+        version=settings.QR_CODE_VERSION,
+        border=0,
+        mask_pattern=settings.QR_CODE_MASK_PATTERN,
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.modules
+
+
+def render_compact_png(modules, border):
+    """Render modules as a 1-bit PNG data URI at one pixel per module"""
+    from PIL import Image
+
+    size = len(modules) + 2 * border
+    img = Image.new('1', (size, size), 1)
+    pixels = img.load()
+    for y, row in enumerate(modules):
+        for x, dark in enumerate(row):
+            if dark:
+                pixels[x + border, y + border] = 0
+
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG', optimize=True)
+    img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
+    return f'data:image/png;base64,{img_base64}'
+
+
+def render_svg(modules, border):
+    """Render modules as a URL-encoded SVG data URI"""
+    size = len(modules) + 2 * border
+    path = []
+    for y, row in enumerate(modules):
+        # Each row is a run of 1-unit-wide strokes; the pen moves relatively
+        # between runs, which keeps the path about half the size of filled rects
+        x, pen, width = 0, None, len(row)
+        while x < width:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < width and row[x]:
+                x += 1
+            if pen is None:
+                path.append(f'M{start + border} {y + border}.5h{x - start}')
+            else:
+                path.append(f'm{start - pen} 0h{x - start}')
+            pen = x
+
+    svg = (
+        f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 {size} {size}' shape-rendering='crispEdges'>"
+        f"<rect width='{size}' height='{size}' fill='white'/>"
+        f"<path stroke='black' d='{''.join(path)}'/></svg>"
+    )
+    # Percent-encoding only the few reserved characters is smaller than base64
+    return 'data:image/svg+xml,' + quote(svg, safe=" '/=:.,-")
+
+
+def render_matrix(modules, border):
+    """
+    Serialize modules as one hex string per row.
+    Each row is read as a big-endian bit string, 1 for dark modules, left-padded
+    to a multiple of four bits.
+    """
+    hex_width = (len(modules) + 3) // 4
+    return {
+        'size': len(modules),
+        'border': border,
+        'rows': [
+            format(int(''.join('1' if dark else '0' for dark in row), 2), f'0{hex_width}x')
+            for row in modules
+        ],
+    }
+
+
+def render_qr(payload, qr_format=None):
+    """
+    Render a QR code in the requested output mode.
+
+    Args:
+        payload (str): Data to encode, usually the login or enrollment URL
+        qr_format (str): One of QR_CODE_FORMATS (defaults to QR_CODE_FORMAT)
+
+    Returns:
+        dict: Response fields; 'qr_format' plus 'qr_code' (data URI) or 'qr_matrix',
+              or only 'qr_format' for 'none'
+
+    Raises:
+        ValueError: If the format is not supported
+    """
+    qr_format = normalize_qr_format(qr_format)
+
+    if qr_format == 'none':
+        return {'qr_format': qr_format}
+    if qr_format == 'png':
+        return {'qr_format': qr_format, 'qr_code': generate_qr_data_uri(payload)}
+
+    modules = build_qr_modules(payload)
+    border = settings.QR_CODE_BORDER
+
+    if qr_format == 'matrix':
+        return {'qr_format': qr_format, 'qr_matrix': render_matrix(modules, border)}
+    if qr_format == 'svg':
+        return {'qr_format': qr_format, 'qr_code': render_svg(modules, border)}
+    return {'qr_format': qr_format, 'qr_code': render_compact_png(modules, border)}
@@ -0,0 +1,207 @@
+"""
+Hourly rollups of authentication events for NullPass.
+Each AuthenticationEventRollup row counts the events of one UTC hour with the
+same event_type, success and attack_type. Rows are incremented once the
+transaction writing the events commits, so concurrent logins in the same hour
+never hold that hour's row locked for the length of their transactions.
+Dashboard windows (24h, 7d) sum the whole hours from these small rows and
+count only the partial first hour from raw events, instead of scanning every
+raw event. rebuild_event_rollups recomputes them from the raw table if they
+ever drift. Rollups outlive archived event
+partitions, so all-time totals keep counting archived events.
+"""
+
+from collections import Counter
+from datetime import timedelta
+from datetime import timezone as dt_timezone
+from functools import partial
+
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+ROLLUP_KEY_FIELDS = ('event_type', 'success', 'attack_type')
+
+
+def hour_bucket(timestamp):
+    """
+    Truncate a timestamp to the start of its UTC hour.
+
+    Args:
+        timestamp (datetime): Aware timestamp
+
+    Returns:
+        datetime: Aware UTC datetime at the top of the hour
+    """
+    return timestamp.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _add(key, count):
+    from .models import AuthenticationEventRollup
+
+    connection = connections[router.db_for_write(AuthenticationEventRollup)]
+    if connection.vendor in ('postgresql', 'sqlite'):
+        # One statement whether or not the hour's row exists yet
+        quote = connection.ops.quote_name
+        table = quote(AuthenticationEventRollup._meta.db_table)
+        columns = ('hour', *ROLLUP_KEY_FIELDS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(map(quote, columns))}, {quote('count')}) "
+                f"VALUES (%s, %s, %s, %s, %s) "
+                f"ON CONFLICT ({', '.join(map(quote, columns))}) "
+                f"DO UPDATE SET {quote('count')} = {table}.{quote('count')} + excluded.{quote('count')}",
+                [connection.ops.adapt_datetimefield_value(key['hour']), key['event_type'],
+                 key['success'], key['attack_type'], count]
+            )
+        return
+
+    rollups = AuthenticationEventRollup.objects.filter(**key)
+    if rollups.update(count=F('count') + count):
+        return
+
+    try:
+        with transaction.atomic():
+            AuthenticationEventRollup.objects.create(count=count, **key)
+    except IntegrityError:
+        # Another writer created the row first
+        rollups.update(count=F('count') + count)
+
+
+def _apply(counts):
+    for (hour, event_type, success, attack_type), count in counts.items():
+        _add({'hour': hour, 'event_type': event_type, 'success': success, 'attack_type': attack_type}, count)
+
+
+def record_events(events, sign=1):
+    """
+    Add saved events to their hourly rollups once the current transaction commits.
+
+    Args:
+        events (iterable): AuthenticationEvent instances with timestamps set
+        sign (int): 1 to add the events, -1 to take them back out
+    """
+    counts = Counter()
+    for event in events:
+        counts[(hour_bucket(event.timestamp), event.event_type, event.success, event.attack_type or '')] += sign
+    if not counts:
+        return
+
+    # Keys are taken now, while the events are as written; runs at once outside a transaction
+    transaction.on_commit(partial(_apply, counts))
+
+
+def rebuild_event_rollups(since=None):
+    """
+    Recompute rollups from raw events.
+
+    Hours before the newest archived event partition are kept as they are,
+    since their raw events are no longer in the table.
+
+    Args:
+        since (datetime): Rebuild hours from this point on (defaults to all hot history)
+
+    Returns:
+        int: Rollup rows written
+    """
+    from .models import AuthenticationEvent, AuthenticationEventRollup, EventArchivePartition
+
+    archived_until = EventArchivePartition.objects.aggregate(end=Max('end'))['end']
+    if archived_until is not None and (since is None or since < archived_until):
+        since = archived_until
+
+    events = AuthenticationEvent.objects.all()
+    rollups = AuthenticationEventRollup.objects.all()
+    if since is not None:
+        since = hour_bucket(since)
+        events = events.filter(timestamp__gte=since)
+        rollups = rollups.filter(hour__gte=since)
+
+    grouped = (
+        events.annotate(hour=TruncHour('timestamp', tzinfo=dt_timezone.utc))
+        .values('hour', *ROLLUP_KEY_FIELDS)
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        rollups.delete()
+        created = AuthenticationEventRollup.objects.bulk_create(
+            [AuthenticationEventRollup(**row) for row in grouped],
+            batch_size=1000
+        )
+    return len(created)
+
+
+def window_bounds(hours, now=None):
+    """
+    Bounds of a window covering exactly the last `hours` hours.
+
+    Args:
+        hours (int): Window length
+        now (datetime): Reference time (defaults to now)
+
+    Returns:
+        tuple: (start, first whole hour) - rollups count from the first whole hour,
+               raw events fill in from start up to it
+    """
+    start = (now or timezone.now()) - timedelta(hours=hours)
+    first_hour = hour_bucket(start)
+    if first_hour < start:
+        first_hour += timedelta(hours=1)
+    return start, first_hour
+
+
+def window_counts(windows, now=None):
+    """
+    Count events per rollup key over trailing windows, in two queries.
+
+    Args:
+        windows (dict): Window name -> length in hours, e.g. {'24h': 24, '7d': 168}
+        now (datetime): Reference time (defaults to now)
+
+    Returns:
+        dict: (event_type, success, attack_type) -> {window name: count}
+    """
+    from .models import AuthenticationEvent, AuthenticationEventRollup
+
+    now = now or timezone.now()
+    bounds = {name: window_bounds(hours, now) for name, hours in windows.items()}
+    totals = {}
+
+    def add(rows):
+        for row in rows:
+            key = (row['event_type'], row['success'], row['attack_type'] or '')
+            counts = totals.setdefault(key, dict.fromkeys(windows, 0))
+            for name in windows:
+                counts[name] += row[name]
+
+    add(
+        AuthenticationEventRollup.objects
+        .filter(hour__gte=min(first_hour for _, first_hour in bounds.values()))
+        .values(*ROLLUP_KEY_FIELDS)
+        .annotate(**{
+            name: Sum('count', filter=Q(hour__gte=first_hour), default=0)
+            for name, (_, first_hour) in bounds.items()
+        })
+        .order_by()
+    )
+
+    # The partial hour at the start of each window
+    partial_hours = {
+        name: Q(timestamp__gte=start, timestamp__lt=first_hour)
+        for name, (start, first_hour) in bounds.items()
+    }
+    if any(start < first_hour for start, first_hour in bounds.values()):
+        any_partial = Q()
+        for condition in partial_hours.values():
+            any_partial |= condition
+        add(
+            AuthenticationEvent.objects.filter(any_partial)
+            .values(*ROLLUP_KEY_FIELDS)
+            .annotate(**{name: Count('id', filter=condition) for name, condition in partial_hours.items()})
+            .order_by()
+        )
+
+    return totals
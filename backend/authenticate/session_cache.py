@@ -0,0 +1,147 @@
+"""
+Session validity cache for NullPass.
+require_auth and validate_session run on every dashboard and navbar request.
+Active sessions are cached by session_id, together with the device fields those
+views need, for at most SESSION_CACHE_SECONDS (never past the session's own
+expiry). UserSession.terminate, TrustedDevice.deactivate and logout drop the
+entries immediately, so revocation does not wait for the TTL. Point
+SESSION_CACHE_ALIAS at a shared cache (e.g. Redis) when running several
+processes, otherwise an invalidation only reaches the process that made it.
+"""
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+KEY_PREFIX = 'nullpass:session:'
+
+# Device fields kept in the entry; other TrustedDevice fields load lazily on access
+DEVICE_FIELDS = ('id', 'device_id', 'device_name', 'user_identifier', 'is_active')
+
+
+def _cache():
+    return caches[settings.SESSION_CACHE_ALIAS]
+
+
+def _key(session_id):
+    return f'{KEY_PREFIX}{session_id}'
+
+
+def _entry(session):
+    device = session.device
+    return {
+        'session_id': session.session_id,
+        'expires_at': session.expires_at,
+        'device': {field: getattr(device, field) for field in DEVICE_FIELDS},
+    }
+
+
+def _timeout(entry):
+    # An entry never outlives its session, so expiry is always seen by the database path
+    remaining = (entry['expires_at'] - timezone.now()).total_seconds()
+    return min(settings.SESSION_CACHE_SECONDS, int(remaining))
+
+
+def entry_device(entry):
+    """
+    Build a TrustedDevice from a cache entry without a query.
+
+    Args:
+        entry (dict): Session entry from get_active_session()
+
+    Returns:
+        TrustedDevice: Instance with the cached fields loaded and the rest deferred
+    """
+    from .models import TrustedDevice
+
+    device = entry['device']
+    return TrustedDevice.from_db('default', list(device), list(device.values()))
+
+
+def _load_session(session_id):
+    from .models import UserSession
+
+    session = UserSession.objects.select_related('device').filter(
+        session_id=session_id,
+        is_active=True
+    ).first()
+    if session is None:
+        return None, 'Session not found'
+
+    if session.is_expired():
+        session.terminate()
+        return None, 'Session expired'
+
+    return _entry(session), None
+
+
+def get_active_session(session_id):
+    """
+    Look up an active session, from the cache when possible.
+
+    Args:
+        session_id (str): Session identifier from the JWT payload
+
+    Returns:
+        tuple: (entry, error) - entry dict with session_id, expires_at and device
+               fields on success, else None and 'Session not found' or 'Session expired'
+    """
+    if settings.SESSION_CACHE_SECONDS <= 0:
+        return _load_session(session_id)
+
+    entry = _cache().get(_key(session_id))
+    if entry is not None:
+        return entry, None
+
+    entry, error = _load_session(session_id)
+    if entry is not None and _timeout(entry) > 0:
+        _cache().set(_key(session_id), entry, _timeout(entry))
+    return entry, error
+
+
+async def aget_active_session(session_id):
+    """Async version of get_active_session()"""
+    from asgiref.sync import sync_to_async
+
+    # A miss may terminate an expired session, so it runs on the sync path
+    if settings.SESSION_CACHE_SECONDS <= 0:
+        return await sync_to_async(_load_session)(session_id)
+
+    entry = await _cache().aget(_key(session_id))
+    if entry is not None:
+        return entry, None
+
+    entry, error = await sync_to_async(_load_session)(session_id)
+    if entry is not None and _timeout(entry) > 0:
+        await _cache().aset(_key(session_id), entry, _timeout(entry))
+    return entry, error
+
+
+def invalidate_sessions(session_ids):
+    """
+    Drop cached entries so the next request re-reads the database.
+
+    Args:
+        session_ids (iterable): Session identifiers
+    """
+    keys = [_key(session_id) for session_id in session_ids]
+    if keys:
+        _cache().delete_many(keys)
+        # Again after commit, in case a concurrent request re-cached the row before it changed
+        transaction.on_commit(lambda: _cache().delete_many(keys))
+
+
+def invalidate_device_sessions(devices):
+    """
+    Drop cached entries for every active session of the given devices.
+
+    Args:
+        devices (iterable): TrustedDevice instances or primary keys
+    """
+    from .models import UserSession
+
+    invalidate_sessions(
+        UserSession.objects.filter(device__in=list(devices), is_active=True)
+        .values_list('session_id', flat=True)
+    )
@@ -0,0 +1,298 @@
+"""
+Signature verification backends for NullPass.
+The backend is selected with the SIGNATURE_BACKEND setting. The OpenSSL-backed
+`cryptography` implementation is preferred and the pure-Python `ecdsa`
+implementation is used as a fallback when `cryptography` is not installed.
+"""
+
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('authentication')
+
+# Signature encodings produced by clients:
+#   der - ASN.1 SEQUENCE { INTEGER r, INTEGER s } (frontend crypto.js output)
+#   raw - fixed-width r || s as returned by WebCrypto (IEEE P1363)
+SIGNATURE_FORMATS = ('der', 'raw')
+
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+
+class EcdsaSignatureBackend:
+    """
+    Pure-Python verifier built on the `ecdsa` package.
+    """
+    name = 'ecdsa'
+
+    def load_public_key(self, public_key_pem):
+        """
+        Parse a PEM-encoded public key.
+
+        Args:
+            public_key_pem (str): Public key in PEM format
+
+        Returns:
+            VerifyingKey: Parsed public key
+        """
+        from ecdsa import VerifyingKey
+        return VerifyingKey.from_pem(public_key_pem)
+
+    def coordinate_size(self, public_key):
+        """Byte length of one signature component (r or s) for the key's curve"""
+        return public_key.curve.baselen
+
+    def verify(self, public_key, signature_bytes, message_bytes, signature_format):
+        """
+        Verify a SHA256 ECDSA signature over message_bytes.
+
+        Args:
+            public_key: Key returned by load_public_key
+            signature_bytes (bytes): Encoded signature
+            message_bytes (bytes): Signed message
+            signature_format (str): One of SIGNATURE_FORMATS
+
+        Returns:
+            bool: True if the signature is valid
+        """
+        from ecdsa.util import sigdecode_der, sigdecode_string
+
+        sigdecode = sigdecode_der if signature_format == 'der' else sigdecode_string
+        try:
+            return public_key.verify(
+                signature_bytes,
+                message_bytes,
+                hashfunc=hashlib.sha256,
+                sigdecode=sigdecode
+            )
+        except Exception:
+            return False
+
+
+class CryptographySignatureBackend:
+    """
+    OpenSSL-backed verifier built on the `cryptography` package.
+    """
+    name = 'cryptography'
+
+    def __init__(self):
+        # Fail at construction time so the factory can fall back to ecdsa
+        from cryptography.hazmat.primitives.asymmetric import ec  # noqa: F401
+
+    def load_public_key(self, public_key_pem):
+        """
+        Parse a PEM-encoded public key.
+
+        Args:
+            public_key_pem (str): Public key in PEM format
+
+        Returns:
+            EllipticCurvePublicKey: Parsed public key
+        """
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.hazmat.primitives.serialization import load_pem_public_key
+
+        public_key = load_pem_public_key(public_key_pem.encode('utf-8'))
+        if not isinstance(public_key, ec.EllipticCurvePublicKey):
+            raise ValueError('Public key is not an elliptic curve key')
+        return public_key
+
+    def coordinate_size(self, public_key):
+        """Byte length of one signature component (r or s) for the key's curve"""
+        return (public_key.curve.key_size + 7) // 8
+
+    def verify(self, public_key, signature_bytes, message_bytes, signature_format):
+        """
+        Verify a SHA256 ECDSA signature over message_bytes.
+
+        Args:
+            public_key: Key returned by load_public_key
+            signature_bytes (bytes): Encoded signature
+            message_bytes (bytes): Signed message
+            signature_format (str): One of SIGNATURE_FORMATS
+
+        Returns:
+            bool: True if the signature is valid
+        """
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec
+        from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+
+        if signature_format == 'raw':
+            # OpenSSL only understands DER, so re-encode r || s
+            size = self.coordinate_size(public_key)
+            if len(signature_bytes) != 2 * size:
+                return False
+            r = int.from_bytes(signature_bytes[:size], 'big')
+            s = int.from_bytes(signature_bytes[size:], 'big')
+            signature_bytes = encode_dss_signature(r, s)
+
+        try:
+            public_key.verify(signature_bytes, message_bytes, ec.ECDSA(hashes.SHA256()))
+            return True
+        except (InvalidSignature, ValueError):
+            return False
+
+
+# ============================================================================
+# SIGNATURE FORMAT DETECTION
+# ============================================================================
+
+def _read_der_length(data, offset):
+    """Read a short or one-byte long form DER length, returning (length, next_offset)"""
+    if offset >= len(data):
+        return None, offset
+
+    first = data[offset]
+    if first < 0x80:
+        return first, offset + 1
+
+    # P-521 signatures exceed 127 bytes and use the 0x81 long form
+    if first == 0x81 and offset + 1 < len(data) and data[offset + 1] >= 0x80:
+        return data[offset + 1], offset + 2
+
+    return None, offset
+
+
+def is_der_signature(signature_bytes):
+    """
+    Check whether bytes are structurally an ASN.1 SEQUENCE of two INTEGERs.
+    Only the framing is checked; the backend still validates the values.
+
+    Args:
+        signature_bytes (bytes): Encoded signature
+
+    Returns:
+        bool: True if the bytes are DER framed
+    """
+    if len(signature_bytes) < 8 or signature_bytes[0] != 0x30:
+        return False
+
+    length, offset = _read_der_length(signature_bytes, 1)
+    if length is None or offset + length != len(signature_bytes):
+        return False
+
+    for _ in range(2):
+        if offset >= len(signature_bytes) or signature_bytes[offset] != 0x02:
+            return False
+        length, offset = _read_der_length(signature_bytes, offset + 1)
+        if not length or offset + length > len(signature_bytes):
+            return False
+        offset += length
+
+    return offset == len(signature_bytes)
+
+
+def detect_signature_format(signature_bytes, coordinate_size, preferred_format=None):
+    """
+    Detect the signature encoding from its length and ASN.1 structure.
+
+    Args:
+        signature_bytes (bytes): Encoded signature
+        coordinate_size (int): Byte length of r or s for the key's curve
+        preferred_format (str): Format recorded for the device (optional)
+
+    Returns:
+        str: 'der' or 'raw', or None if the bytes match neither encoding
+    """
+    looks_der = is_der_signature(signature_bytes)
+    looks_raw = len(signature_bytes) == 2 * coordinate_size
+
+    if looks_der and looks_raw:
+        # A raw signature can frame as DER by chance; trust the enrolled format
+        return preferred_format if preferred_format in SIGNATURE_FORMATS else 'der'
+    if looks_der:
+        return 'der'
+    if looks_raw:
+        return 'raw'
+    return None
+
+
+class SignatureFormatCounter:
+    """
+    Process-local count of verifications per signature format.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, signature_format):
+        """Count one verification; None is recorded as 'unknown'"""
+        key = signature_format or 'unknown'
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def clear(self):
+        """Reset all counts"""
+        with self._lock:
+            self._counts.clear()
+
+    def stats(self):
+        """Return a snapshot of the counts"""
+        with self._lock:
+            return dict(self._counts)
+
+
+signature_format_counter = SignatureFormatCounter()
+
+
+# ============================================================================
+# BACKEND SELECTION
+# ============================================================================
+
+SIGNATURE_BACKENDS = {
+    'cryptography': CryptographySignatureBackend,
+    'ecdsa': EcdsaSignatureBackend,
+}
+
+_backend_instances = {}
+_backend_lock = threading.Lock()
+
+
+def _build_backend(backend_name):
+    backend_class = SIGNATURE_BACKENDS.get(backend_name)
+    if backend_class is None:
+        try:
+            backend_class = import_string(backend_name)
+        except ImportError as e:
+            raise ImproperlyConfigured(f'Unknown SIGNATURE_BACKEND: {backend_name}') from e
+
+    if backend_class is CryptographySignatureBackend:
+        try:
+            return backend_class()
+        except ImportError:
+            logger.warning("cryptography is not installed, falling back to ecdsa signature backend")
+            return EcdsaSignatureBackend()
+
+    return backend_class()
+
+
+def get_signature_backend(backend_name=None):
+    """
+    Get the configured signature verification backend.
+
+    Args:
+        backend_name (str): Backend alias or dotted path (defaults to SIGNATURE_BACKEND)
+
+    Returns:
+        object: Backend instance with load_public_key() and verify()
+    """
+    backend_name = backend_name or settings.SIGNATURE_BACKEND
+
+    backend = _backend_instances.get(backend_name)
+    if backend is None:
+        with _backend_lock:
+            backend = _backend_instances.get(backend_name)
+            if backend is None:
+                backend = _build_backend(backend_name)
+                _backend_instances[backend_name] = backend
+
+    return backend
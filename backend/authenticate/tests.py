@@ -1,3 +1,1516 @@
-from django.test import TestCase
+"""
+Tests for the NullPass authentication app.
+"""
+
+import base64
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from logging.handlers import QueueHandler
+from unittest import mock
+
+import jwt
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.admin import site as admin_site
+from django.db import DatabaseError, connection, transaction
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import F, Sum
+from django.test import AsyncRequestFactory, Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from nullpass.log_queue import HotPathFilter
+
+from . import async_views
+from .apps import start_background_workers
+from .anchoring import InMemoryLedger, anchor_pending_events, build_tree, get_ledger, inclusion_path, verify_event, verify_inclusion
+from .audit_writer import get_audit_writer, record_event, shutdown_audit_writer
+from .challenge_notifier import get_challenge_notifier
+from .challenge_pool import ChallengePool, get_challenge_pool
+from .challenge_store import get_challenge_store
+from .counters import get_counters, reconcile_counters
+from .jwt_keys import generate_private_key_pem, get_jwt_keys
+from .key_cache import PublicKeyCache, public_key_cache
+from .maintenance import next_period_start, period_label, period_start, roll_event_partitions
+from .models import (
+    AuthenticationChallenge,
+    AuthenticationEvent,
+    AuthenticationEventRollup,
+    EventArchivePartition,
+    EventInclusionProof,
+    MerkleAnchor,
+    TrustedDevice,
+    UserSession,
+)
+from .qr import build_qr_modules, render_qr
+from .rollups import rebuild_event_rollups, window_counts
+from .signature_backends import (
+    CryptographySignatureBackend,
+    EcdsaSignatureBackend,
+    detect_signature_format,
+    signature_format_counter,
+)
+from .utils import (
+    create_jwt_token,
+    decode_jwt_token,
+    hash_session_token,
+    verify_ecdsa_signature,
+    verify_ecdsa_signatures,
+)
+
+try:
+    import cryptography  # noqa: F401
+    HAS_CRYPTOGRAPHY = True
+except ImportError:
+    HAS_CRYPTOGRAPHY = False
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def _der_integer(value_bytes):
+    if value_bytes[0] & 0x80:
+        value_bytes = b'\x00' + value_bytes
+    return b'\x02' + bytes([len(value_bytes)]) + value_bytes
+
+
+def _der_signature(r_bytes, s_bytes):
+    body = _der_integer(r_bytes) + _der_integer(s_bytes)
+    return b'\x30' + bytes([len(body)]) + body
+
+
+def _enroll_test_device(device_id='device_test_0001'):
+    """Create a P-256 TrustedDevice and return it with its signing key"""
+    from ecdsa import NIST256p, SigningKey
+
+    signing_key = SigningKey.generate(curve=NIST256p)
+    device = TrustedDevice.objects.create(
+        device_id=device_id,
+        device_name='Test Device',
+        public_key=signing_key.get_verifying_key().to_pem().decode('utf-8'),
+        signature_format='der'
+    )
+    return device, signing_key
+
+
+def _create_test_challenge(challenge_id='challenge_test_0001', minutes=5):
+    return AuthenticationChallenge.objects.create(
+        challenge_id=challenge_id,
+        nonce='nonce_' + challenge_id,
+        expires_at=timezone.now() + timedelta(minutes=minutes)
+    )
+
+
+def _sign_challenge(signing_key, challenge):
+    from ecdsa.util import sigencode_der
+
+    message = (challenge.challenge_id + challenge.nonce).encode('utf-8')
+    return _b64(signing_key.sign(message, hashfunc=hashlib.sha256, sigencode=sigencode_der))
+
+
+def _build_signature_corpus(curve):
+    """
+    Build (label, public_key_pem, message, signature_base64) cases for a curve
+    covering valid and malformed DER and raw (P1363) encodings.
+    """
+    from ecdsa import SigningKey
+    from ecdsa.util import sigencode_der, sigencode_string
+
+    signing_key = SigningKey.generate(curve=curve)
+    other_key = SigningKey.generate(curve=curve)
+    public_key_pem = signing_key.get_verifying_key().to_pem().decode('utf-8')
+    message = 'challenge-id' + 'nonce-value'
+    message_bytes = message.encode('utf-8')
+    order = curve.order
+    size = curve.baselen
+
+    der = signing_key.sign(message_bytes, hashfunc=hashlib.sha256, sigencode=sigencode_der)
+    raw = signing_key.sign(message_bytes, hashfunc=hashlib.sha256, sigencode=sigencode_string)
+    s = int.from_bytes(raw[size:], 'big')
+    high_s = (order - s).to_bytes(size, 'big')
+
+    cases = [
+        ('der valid', der),
+        ('raw valid', raw),
+        ('der high-s', _der_signature(raw[:size].lstrip(b'\x00') or b'\x00', high_s.lstrip(b'\x00'))),
+        ('raw high-s', raw[:size] + high_s),
+        ('der other key', other_key.sign(message_bytes, hashfunc=hashlib.sha256, sigencode=sigencode_der)),
+        ('raw other key', other_key.sign(message_bytes, hashfunc=hashlib.sha256, sigencode=sigencode_string)),
+        ('der flipped byte', der[:-1] + bytes([der[-1] ^ 0x01])),
+        ('raw flipped byte', raw[:-1] + bytes([raw[-1] ^ 0x01])),
+        ('der trailing junk', der + b'\x00'),
+        ('der zero padded r', _der_signature(b'\x00\x00' + raw[:size], raw[size:])),
+        ('der truncated', der[:-2]),
+        ('raw truncated', raw[:-1]),
+        ('raw extended', raw + b'\x00'),
+        ('raw zero r', bytes(size) + raw[size:]),
+        ('raw r equals order', order.to_bytes(size, 'big') + raw[size:]),
+        ('der zero s', _der_signature(raw[:size], b'\x00')),
+        ('empty', b''),
+        ('random', bytes(range(2 * size))),
+    ]
+    corpus = [(label, public_key_pem, message, _b64(sig)) for label, sig in cases]
+    corpus.append(('der other message', public_key_pem, message + 'x', _b64(der)))
+    corpus.append(('raw other message', public_key_pem, message + 'x', _b64(raw)))
+    return corpus
+
+
+@unittest.skipUnless(HAS_CRYPTOGRAPHY, 'cryptography is not installed')
+class SignatureBackendParityTests(SimpleTestCase):
+    """
+    Both signature backends must accept and reject exactly the same signatures.
+    """
+
+    def assert_parity(self, curve):
+        ecdsa_backend = EcdsaSignatureBackend()
+        cryptography_backend = CryptographySignatureBackend()
+
+        for label, public_key_pem, message, signature_base64 in _build_signature_corpus(curve):
+            with self.subTest(curve=curve.name, case=label):
+                ecdsa_valid, _ = verify_ecdsa_signature(
+                    public_key_pem, message, signature_base64, backend=ecdsa_backend
+                )
+                cryptography_valid, _ = verify_ecdsa_signature(
+                    public_key_pem, message, signature_base64, backend=cryptography_backend
+                )
+                self.assertEqual(ecdsa_valid, cryptography_valid)
+                self.assertEqual(ecdsa_valid, 'valid' in label or 'high-s' in label)
+
+    def test_p256_parity(self):
+        """P-256 is the curve the frontend crypto.js generates"""
+        from ecdsa import NIST256p
+        self.assert_parity(NIST256p)
+
+    def test_secp256k1_parity(self):
+        from ecdsa import SECP256k1
+        self.assert_parity(SECP256k1)
+
+    def test_webcrypto_key_and_signature(self):
+        """Keys exported as SPKI and DER-converted P1363 signatures, as crypto.js sends them"""
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+
+        private_key = ec.generate_private_key(ec.SECP256R1())
+        public_key_pem = private_key.public_key().public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode('utf-8')
+        signature = private_key.sign(b'challengenonce', ec.ECDSA(hashes.SHA256()))
+
+        for backend in (EcdsaSignatureBackend(), CryptographySignatureBackend()):
+            with self.subTest(backend=backend.name):
+                is_valid, error = verify_ecdsa_signature(
+                    public_key_pem, 'challengenonce', _b64(signature), backend=backend
+                )
+                self.assertTrue(is_valid)
+                self.assertIsNone(error)
+
+    def test_invalid_base64_rejected_by_both(self):
+        from ecdsa import NIST256p
+        _, public_key_pem, message, _ = _build_signature_corpus(NIST256p)[0]
+
+        for backend in (EcdsaSignatureBackend(), CryptographySignatureBackend()):
+            with self.subTest(backend=backend.name):
+                is_valid, _ = verify_ecdsa_signature(public_key_pem, message, 'not*base64', backend=backend)
+                self.assertFalse(is_valid)
+
+
+class PublicKeyCacheTests(TestCase):
+    """
+    The parsed public key cache counts hits, evicts least recently used keys and
+    never verifies with a key a device no longer has.
+    """
+
+    def setUp(self):
+        public_key_cache.clear()
+        self.addCleanup(public_key_cache.clear)
+
+    def test_hits_and_misses(self):
+        cache = PublicKeyCache(maxsize=4)
+        loader = mock.Mock(side_effect=lambda pem: f'parsed {pem}')
+
+        self.assertEqual(cache.get_or_load('device-a', 'pem-a', loader), 'parsed pem-a')
+        self.assertEqual(cache.get_or_load('device-a', 'pem-a', loader), 'parsed pem-a')
+        cache.get_or_load('device-a', 'pem-a', loader, namespace='other-backend')
+
+        self.assertEqual(loader.call_count, 2)
+        self.assertEqual(cache.stats(), {'size': 2, 'maxsize': 4, 'hits': 1, 'misses': 2, 'evictions': 0})
+
+    def test_least_recently_used_key_is_evicted(self):
+        cache = PublicKeyCache(maxsize=2)
+        loader = mock.Mock(side_effect=lambda pem: f'parsed {pem}')
+        cache.get_or_load('device-a', 'pem-a', loader)
+        cache.get_or_load('device-b', 'pem-b', loader)
+        cache.get_or_load('device-a', 'pem-a', loader)
+        cache.get_or_load('device-c', 'pem-c', loader)
+
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['size'], 2)
+        loader.reset_mock()
+        cache.get_or_load('device-a', 'pem-a', loader)
+        loader.assert_not_called()
+        cache.get_or_load('device-b', 'pem-b', loader)
+        loader.assert_called_once_with('pem-b')
+
+    def verify(self, device, signing_key, challenge):
+        is_valid, _ = verify_ecdsa_signature(
+            device.public_key,
+            challenge.challenge_id + challenge.nonce,
+            _sign_challenge(signing_key, challenge),
+            device_id=device.device_id
+        )
+        return is_valid
+
+    def test_key_rotation_drops_the_old_parsed_key(self):
+        from ecdsa import NIST256p, SigningKey
+
+        device, old_key = _enroll_test_device()
+        challenge = _create_test_challenge()
+        self.assertTrue(self.verify(device, old_key, challenge))
+        self.assertEqual(public_key_cache.stats()['size'], 1)
+
+        new_key = SigningKey.generate(curve=NIST256p)
+        device = TrustedDevice.objects.get(pk=device.pk)
+        device.public_key = new_key.get_verifying_key().to_pem().decode('utf-8')
+        device.save()
+        self.assertEqual(public_key_cache.stats()['size'], 0)
+
+        self.assertFalse(self.verify(device, old_key, challenge))
+        self.assertTrue(self.verify(device, new_key, challenge))
+
+    def test_deactivation_drops_the_parsed_key(self):
+        from .admin import TrustedDeviceAdmin
+
+        device, signing_key = _enroll_test_device()
+        other, other_key = _enroll_test_device('device_test_0002')
+        challenge = _create_test_challenge()
+        self.assertTrue(self.verify(device, signing_key, challenge))
+        self.assertTrue(self.verify(other, other_key, challenge))
+
+        device.deactivate()
+        self.assertEqual(public_key_cache.stats()['size'], 1)
+
+        model_admin = TrustedDeviceAdmin(TrustedDevice, admin_site)
+        with mock.patch.object(model_admin, 'message_user'):
+            model_admin.deactivate_devices(None, TrustedDevice.objects.filter(pk=other.pk))
+        self.assertEqual(public_key_cache.stats()['size'], 0)
+
+        # The next verification parses the stored key again
+        misses = public_key_cache.stats()['misses']
+        self.assertTrue(self.verify(other, other_key, challenge))
+        self.assertEqual(public_key_cache.stats()['misses'], misses + 1)
+
+
+class SignatureFormatDetectionTests(SimpleTestCase):
+    """
+    The encoding is detected up front so each verification runs one EC operation.
+    """
+
+    def setUp(self):
+        from ecdsa import NIST256p
+        self.corpus = {label: case for label, *case in _build_signature_corpus(NIST256p)}
+
+    def test_detects_der_and_raw(self):
+        for label, expected in (('der valid', 'der'), ('raw valid', 'raw'), ('der trailing junk', None)):
+            with self.subTest(case=label):
+                _, _, signature_base64 = self.corpus[label]
+                detected = detect_signature_format(base64.b64decode(signature_base64), 32)
+                self.assertEqual(detected, expected)
+
+    def test_single_verification_per_call(self):
+        backend = EcdsaSignatureBackend()
+        calls = []
+        original_verify = backend.verify
+
+        def counting_verify(*args):
+            calls.append(args[-1])
+            return original_verify(*args)
+
+        backend.verify = counting_verify
+        signature_format_counter.clear()
+
+        for label in ('raw valid', 'raw flipped byte', 'der flipped byte', 'der trailing junk'):
+            public_key_pem, message, signature_base64 = self.corpus[label]
+            verify_ecdsa_signature(public_key_pem, message, signature_base64, backend=backend)
+
+        self.assertEqual(calls, ['raw', 'raw', 'der'])
+        self.assertEqual(signature_format_counter.stats(), {'raw': 2, 'der': 1, 'unknown': 1})
+
+
+class VerifySignatureWriteTests(TestCase):
+    """
+    The verify_signature success path runs as one transaction of targeted writes.
+    """
+
+    def setUp(self):
+        self.device, self.signing_key = _enroll_test_device()
+        self.challenge = _create_test_challenge()
+
+    def post_verify(self, signature):
+        return self.client.post('/api/auth/verify', json.dumps({
+            'challenge_id': self.challenge.challenge_id,
+            'device_id': self.device.device_id,
+            'signature': signature,
+        }), content_type='application/json')
+
+    def test_success_path_query_count(self):
+        # SELECT challenge, SELECT device, SAVEPOINT, UPDATE challenge WHERE is_used = FALSE,
+        # UPDATE device, INSERT session, INSERT event, UPSERT event rollup, RELEASE SAVEPOINT,
+        # then UPDATE session counters after commit
+        with self.assertNumQueries(10), self.captureOnCommitCallbacks(execute=True):
+            response = self.post_verify(_sign_challenge(self.signing_key, self.challenge))
+
+        self.assertEqual(response.status_code, 200)
+        self.challenge.refresh_from_db()
+        self.device.refresh_from_db()
+        self.assertTrue(self.challenge.is_used)
+        self.assertEqual(self.challenge.device, self.device)
+        self.assertIsNotNone(self.device.last_used_at)
+        self.assertEqual(UserSession.objects.filter(device=self.device).count(), 1)
+        self.assertTrue(AuthenticationEvent.objects.filter(event_type='LOGIN_SUCCESS').exists())
+
+    def test_claimed_challenge_cannot_be_reused(self):
+        signature = _sign_challenge(self.signing_key, self.challenge)
+        self.assertEqual(self.post_verify(signature).status_code, 200)
+
+        response = self.post_verify(signature)
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(UserSession.objects.count(), 1)
+
+    def test_invalid_signature_counts_failure(self):
+        other_challenge = _create_test_challenge('challenge_test_0002')
+        response = self.post_verify(_sign_challenge(self.signing_key, other_challenge))
+
+        self.assertEqual(response.status_code, 403)
+        self.device.refresh_from_db()
+        self.assertEqual(self.device.failed_attempts, 1)
+        self.assertTrue(AuthenticationEvent.objects.filter(event_type='INVALID_SIGNATURE').exists())
+
+
+class BatchVerifyTests(TestCase):
+    """
+    verify_signature_batch settles every item and writes device state without losing concurrent updates.
+    """
+
+    def setUp(self):
+        reconcile_counters()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.device, self.signing_key = _enroll_test_device()
+
+    def verify(self, *items):
+        # Counter adjustments run once the request commits
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/verify/batch', json.dumps({'items': [
+                {'challenge_id': challenge.challenge_id, 'device_id': device.device_id, 'signature': signature}
+                for challenge, device, signature in items
+            ]}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def signed(self, challenge, device=None, signing_key=None):
+        return challenge, device or self.device, _sign_challenge(signing_key or self.signing_key, challenge)
+
+    def forged(self, challenge, device=None):
+        from ecdsa import NIST256p, SigningKey
+        return self.signed(challenge, device, SigningKey.generate(curve=NIST256p))
+
+    def event_types(self):
+        return sorted(AuthenticationEvent.objects.values_list('event_type', flat=True))
+
+    def test_mixed_valid_and_invalid_items(self):
+        other, _ = _enroll_test_device('device_test_0002')
+        data = self.verify(
+            self.signed(_create_test_challenge('batch-ok')),
+            self.forged(_create_test_challenge('batch-bad'), other),
+        )
+
+        self.assertEqual([result['success'] for result in data['results']], [True, False])
+        self.assertEqual(data['results'][1]['error'], 'Invalid signature')
+        self.assertEqual((data['verified_count'], data['failed_count']), (1, 1))
+        self.assertEqual(self.event_types(), ['INVALID_SIGNATURE', 'LOGIN_SUCCESS'])
+        self.assertEqual(UserSession.objects.get().device, self.device)
+        self.assertEqual(TrustedDevice.objects.get(pk=other.pk).failed_attempts, 1)
+        self.assertIsNotNone(TrustedDevice.objects.get(pk=self.device.pk).last_used_at)
+
+    def test_duplicate_challenge_in_one_batch(self):
+        challenge = _create_test_challenge()
+        data = self.verify(self.signed(challenge), self.signed(challenge))
+
+        self.assertEqual([result['success'] for result in data['results']], [True, False])
+        self.assertEqual(data['results'][1]['error'], 'Challenge already used')
+        self.assertEqual(UserSession.objects.count(), 1)
+        self.assertEqual(self.event_types(), ['LOGIN_SUCCESS', 'REPLAY_ATTACK'])
+
+    def test_replay_of_used_challenge(self):
+        challenge = _create_test_challenge()
+        self.assertTrue(self.verify(self.signed(challenge))['results'][0]['success'])
+
+        data = self.verify(self.signed(challenge))
+        self.assertEqual(data['results'][0]['error'], 'Challenge already used')
+        self.assertEqual(UserSession.objects.count(), 1)
+        self.assertEqual(self.event_types(), ['LOGIN_SUCCESS', 'REPLAY_ATTACK'])
+
+    def test_crossing_the_flag_threshold(self):
+        TrustedDevice.objects.filter(pk=self.device.pk).update(failed_attempts=settings.MAX_FAILED_ATTEMPTS - 2)
+        self.verify(self.forged(_create_test_challenge('bad-1')), self.forged(_create_test_challenge('bad-2')))
+
+        device = TrustedDevice.objects.get(pk=self.device.pk)
+        self.assertEqual(device.failed_attempts, settings.MAX_FAILED_ATTEMPTS)
+        self.assertTrue(device.is_flagged)
+        self.assertEqual(get_counters()['devices_flagged'], 1)
+        self.assertEqual(reconcile_counters(), {})
+
+    def test_concurrent_device_updates_are_kept(self):
+        from . import views
+
+        def verify_while_admin_acts(jobs):
+            # Another request flags the device and counts failures mid-verification
+            TrustedDevice.objects.get(pk=self.device.pk).flag_device()
+            TrustedDevice.objects.filter(pk=self.device.pk).update(failed_attempts=F('failed_attempts') + 2)
+            return verify_ecdsa_signatures(jobs)
+
+        with mock.patch.object(views, 'verify_ecdsa_signatures', side_effect=verify_while_admin_acts):
+            self.verify(self.forged(_create_test_challenge()))
+
+        device = TrustedDevice.objects.get(pk=self.device.pk)
+        self.assertTrue(device.is_flagged)
+        self.assertEqual(device.failed_attempts, 3)
+        self.assertEqual(get_counters()['devices_flagged'], 1)
+        self.assertEqual(reconcile_counters(), {})
+
+
+class ChallengeReplayTests(TestCase):
+    """
+    Submissions of an already consumed challenge are recorded as REPLAY_ATTACK.
+    """
+
+    def test_replayed_challenge_logs_replay_attack(self):
+        device, signing_key = _enroll_test_device()
+        challenge = _create_test_challenge()
+        body = json.dumps({
+            'challenge_id': challenge.challenge_id,
+            'device_id': device.device_id,
+            'signature': _sign_challenge(signing_key, challenge),
+        })
+
+        self.assertEqual(self.client.post('/api/auth/verify', body, content_type='application/json').status_code, 200)
+        self.assertEqual(self.client.post('/api/auth/verify', body, content_type='application/json').status_code, 403)
+
+        replay = AuthenticationEvent.objects.get(event_type='REPLAY_ATTACK')
+        self.assertEqual(replay.device, device)
+        self.assertFalse(replay.success)
+
+
+class ConcurrentChallengeConsumptionTests(TransactionTestCase):
+    """
+    Concurrent submissions of one challenge: exactly one wins, the rest are replays.
+    Runs against the file-backed SQLite test database (DB_TEST_NAME) or PostgreSQL.
+    """
+    THREADS = 8
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('requires a file-backed SQLite or PostgreSQL test database')
+
+    def test_only_one_concurrent_submission_wins(self):
+        device, signing_key = _enroll_test_device()
+        challenge = _create_test_challenge()
+        body = json.dumps({
+            'challenge_id': challenge.challenge_id,
+            'device_id': device.device_id,
+            'signature': _sign_challenge(signing_key, challenge),
+        })
+
+        barrier = threading.Barrier(self.THREADS)
+        status_codes = []
+        status_lock = threading.Lock()
+
+        def submit():
+            try:
+                barrier.wait()
+                response = Client().post('/api/auth/verify', body, content_type='application/json')
+                with status_lock:
+                    status_codes.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(status_codes), [200] + [403] * (self.THREADS - 1))
+        self.assertEqual(UserSession.objects.filter(device=device).count(), 1)
+        self.assertEqual(AuthenticationEvent.objects.filter(event_type='LOGIN_SUCCESS').count(), 1)
+        self.assertEqual(
+            AuthenticationEvent.objects.filter(event_type='REPLAY_ATTACK').count(),
+            self.THREADS - 1
+        )
+
+
+@override_settings(CHALLENGE_STORE_SINGLE_PROCESS=True)
+class ChallengeStoreFlowTests(TestCase):
+    """
+    Login request, status polling and verification work through every challenge store.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.device, self.signing_key = _enroll_test_device()
+
+    def run_login_flow(self):
+        login = self.client.post('/api/auth/login/request').json()
+        challenge_id = login['challenge_id']
+
+        status = self.client.get('/api/auth/challenge/status', {'challenge_id': challenge_id}).json()
+        self.assertEqual(status, {'is_used': False, 'is_expired': False, 'authenticated': False})
+
+        challenge = get_challenge_store().get(challenge_id)
+        response = self.client.post('/api/auth/verify', json.dumps({
+            'challenge_id': challenge_id,
+            'device_id': self.device.device_id,
+            'signature': _sign_challenge(self.signing_key, challenge),
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        status = self.client.get('/api/auth/challenge/status', {'challenge_id': challenge_id})
+        self.assertTrue(status.json()['authenticated'])
+        self.assertIn('session_token', status.cookies)
+        return challenge_id
+
+    def test_orm_store(self):
+        with override_settings(CHALLENGE_STORE='orm'):
+            challenge_id = self.run_login_flow()
+        self.assertTrue(AuthenticationChallenge.objects.get(challenge_id=challenge_id).is_used)
+
+    def test_cache_store(self):
+        with override_settings(CHALLENGE_STORE='cache'):
+            self.run_login_flow()
+        self.assertFalse(AuthenticationChallenge.objects.exists())
+
+    def test_cache_store_consumes_once(self):
+        store = get_challenge_store('cache')
+        challenge = store.create()
+
+        self.assertTrue(store.consume(challenge.challenge_id, self.device))
+        self.assertFalse(store.consume(challenge.challenge_id, self.device))
+        self.assertEqual(store.get(challenge.challenge_id).device_id, self.device.pk)
+
+    def test_failed_login_releases_cached_challenge(self):
+        for store_name in ('cache', 'signed'):
+            with self.subTest(store=store_name), override_settings(CHALLENGE_STORE=store_name):
+                challenge = get_challenge_store().create()
+                body = json.dumps({
+                    'challenge_id': challenge.challenge_id,
+                    'device_id': self.device.device_id,
+                    'signature': _sign_challenge(self.signing_key, challenge),
+                })
+
+                with mock.patch('authenticate.views.UserSession.objects.create', side_effect=DatabaseError):
+                    response = self.client.post('/api/auth/verify', body, content_type='application/json')
+                self.assertEqual(response.status_code, 500)
+                self.assertFalse(get_challenge_store().get(challenge.challenge_id).is_used)
+
+                # The retry logs in instead of being reported as a replay
+                response = self.client.post('/api/auth/verify', body, content_type='application/json')
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(AuthenticationEvent.objects.filter(event_type='REPLAY_ATTACK').exists())
+
+    def test_signed_store(self):
+        with override_settings(CHALLENGE_STORE='signed'):
+            challenge_id = self.run_login_flow()
+        self.assertFalse(AuthenticationChallenge.objects.exists())
+        self.assertFalse(get_challenge_store('signed').consume(challenge_id, self.device))
+
+    def test_signed_store_rejects_tampered_tokens(self):
+        store = get_challenge_store('signed')
+        challenge = store.create(ip_address='203.0.113.7')
+
+        decoded = store.get(challenge.challenge_id)
+        self.assertEqual(decoded.nonce, challenge.nonce)
+        self.assertEqual(decoded.expires_at, challenge.expires_at)
+        self.assertEqual(decoded.ip_address, '203.0.113.7')
+
+        nonce, expires, ip, signature = challenge.challenge_id.split('.')
+        forged = f'{nonce}.{int(expires) + 3600}.{ip}.{signature}'
+        self.assertIsNone(store.get(forged))
+        self.assertFalse(store.consume(forged, self.device))
+        self.assertIsNone(store.get('not-a-token'))
+
+        expired = store.create(expiration_minutes=-1)
+        self.assertTrue(store.get(expired.challenge_id).is_expired())
+
+    def test_signed_store_requires_a_shared_cache(self):
+        with override_settings(CHALLENGE_STORE_SINGLE_PROCESS=False):
+            with self.assertRaises(ImproperlyConfigured):
+                get_challenge_store('signed')
+            # Stores that keep challenges in the cache or database are unaffected
+            get_challenge_store('cache')
+
+        dummy = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=dummy), self.assertRaises(ImproperlyConfigured):
+            get_challenge_store('signed')
+
+
+class ChallengeStatusWaitTests(TestCase):
+    """
+    Long-poll and SSE status endpoints are woken by verification of their challenge only.
+    """
+
+    def setUp(self):
+        self.device, self.signing_key = _enroll_test_device()
+        self.challenge = _create_test_challenge()
+        self.notifier = get_challenge_notifier('local')
+
+    def post_verify(self):
+        return self.client.post('/api/auth/verify', json.dumps({
+            'challenge_id': self.challenge.challenge_id,
+            'device_id': self.device.device_id,
+            'signature': _sign_challenge(self.signing_key, self.challenge),
+        }), content_type='application/json')
+
+    def test_verification_wakes_only_its_waiters(self):
+        with self.notifier.subscribe(self.challenge.challenge_id) as waiter, \
+                self.notifier.subscribe('some_other_challenge') as bystander:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(self.post_verify().status_code, 200)
+
+            self.assertTrue(waiter.wait(0))
+            self.assertFalse(bystander.wait(0))
+        self.assertEqual(self.notifier.waiter_count(), 0)
+
+    def test_long_poll_returns_when_notified(self):
+        timer = threading.Timer(0.2, self.notifier.notify, [self.challenge.challenge_id])
+        timer.start()
+        started = time.monotonic()
+        response = self.client.get('/api/auth/challenge/status/wait', {
+            'challenge_id': self.challenge.challenge_id, 'timeout': 10
+        })
+        timer.join()
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(response.json(), {'is_used': False, 'is_expired': False, 'authenticated': False})
+
+    def test_long_poll_reports_consumed_challenge(self):
+        self.post_verify()
+        response = self.client.get('/api/auth/challenge/status/wait', {
+            'challenge_id': self.challenge.challenge_id
+        })
+        self.assertTrue(response.json()['authenticated'])
+        self.assertIn('session_token', response.cookies)
+
+    def test_stream_closes_after_authentication(self):
+        self.post_verify()
+        response = self.client.get('/api/auth/challenge/status/stream', {
+            'challenge_id': self.challenge.challenge_id
+        })
+        body = b''.join(response).decode()
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(body.count('event: status'), 1)
+        self.assertIn('"authenticated": true', body)
+
+
+class AsyncViewTests(TestCase):
+    """
+    Async view variants serve the same login flow as the sync views.
+    """
+
+    def setUp(self):
+        self.device, self.signing_key = _enroll_test_device()
+        self.factory = AsyncRequestFactory()
+
+    async def test_login_flow(self):
+        response = await async_views.request_login(self.factory.post('/api/auth/login/request?qr_format=png'))
+        login = json.loads(response.content)
+        self.assertTrue(login['qr_code'].startswith('data:image/png;base64,'))
+
+        challenge = await get_challenge_store().aget(login['challenge_id'])
+        response = await async_views.verify_signature(self.factory.post(
+            '/api/auth/verify',
+            json.dumps({
+                'challenge_id': challenge.challenge_id,
+                'device_id': self.device.device_id,
+                'signature': _sign_challenge(self.signing_key, challenge),
+            }),
+            content_type='application/json'
+        ))
+        self.assertEqual(response.status_code, 200)
+        session_token = json.loads(response.content)['session_token']
+
+        response = await async_views.check_challenge_status(self.factory.get(
+            '/api/auth/challenge/status', {'challenge_id': challenge.challenge_id}
+        ))
+        self.assertTrue(json.loads(response.content)['authenticated'])
+        # The PC gets its own token for the same session, with the same expiry
+        phone_claims, _ = decode_jwt_token(session_token)
+        pc_claims, _ = decode_jwt_token(response.cookies['session_token'].value)
+        for claim in ('session_id', 'device_id', 'exp'):
+            self.assertEqual(pc_claims[claim], phone_claims[claim])
+
+        request = self.factory.post('/api/auth/session/validate')
+        request.COOKIES['session_token'] = session_token
+        response = await async_views.validate_session(request)
+        self.assertEqual(json.loads(response.content)['device_name'], self.device.device_name)
+
+    async def test_long_poll_woken_from_another_thread(self):
+        challenge = await get_challenge_store().acreate()
+        timer = threading.Timer(0.2, get_challenge_notifier().notify, [challenge.challenge_id])
+        timer.start()
+        started = time.monotonic()
+        response = await async_views.wait_challenge_status(self.factory.get(
+            '/api/auth/challenge/status/wait', {'challenge_id': challenge.challenge_id, 'timeout': 10}
+        ))
+        timer.join()
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertFalse(json.loads(response.content)['authenticated'])
+
+
+class QRCodeFormatTests(TestCase):
+    """
+    Login and enrollment QR codes are rendered in the requested output mode.
+    """
+
+    def test_formats_from_request(self):
+        for qr_format, prefix in (('png', 'data:image/png;base64,'),
+                                  ('compact-png', 'data:image/png;base64,'),
+                                  ('svg', 'data:image/svg+xml,')):
+            data = self.client.post('/api/auth/login/request', {'qr_format': qr_format},
+                                    content_type='application/json').json()
+            self.assertEqual(data['qr_format'], qr_format)
+            self.assertTrue(data['qr_code'].startswith(prefix))
+
+        data = self.client.post('/api/auth/enroll/qr?qr_format=matrix').json()
+        self.assertNotIn('qr_code', data)
+        self.assertEqual(len(data['qr_matrix']['rows']), data['qr_matrix']['size'])
+
+    def test_setting_default_and_invalid_format(self):
+        with override_settings(QR_CODE_FORMAT='svg'):
+            data = self.client.post('/api/auth/login/request').json()
+        self.assertEqual(data['qr_format'], 'svg')
+
+        response = self.client.post('/api/auth/login/request?qr_format=gif')
+        self.assertEqual(response.status_code, 400)
+
+    def test_client_mode_skips_rendering(self):
+        with mock.patch('authenticate.qr.build_qr_modules') as build, \
+                mock.patch('authenticate.qr.generate_qr_data_uri') as generate:
+            for params in ('', '?qr=none', '?qr_format=client'):
+                data = self.client.post(f'/api/auth/login/request{params}').json()
+                self.assertEqual(data['qr_format'], 'none')
+                self.assertNotIn('qr_code', data)
+                self.assertIn(data['challenge_id'], data['auth_url'])
+
+            data = self.client.post('/api/auth/enroll/qr', {'qr': 'client'},
+                                    content_type='application/json').json()
+            self.assertNotIn('qr_code', data)
+        build.assert_not_called()
+        generate.assert_not_called()
+
+    def test_matrix_round_trips_modules(self):
+        payload = 'http://localhost:5173/authenticate?challenge_id=abc&nonce=def'
+        modules = build_qr_modules(payload)
+        matrix = render_qr(payload, 'matrix')['qr_matrix']
+
+        decoded = [
+            [bit == '1' for bit in format(int(row, 16), f'0{matrix["size"]}b')]
+            for row in matrix['rows']
+        ]
+        self.assertEqual(decoded, modules)
+
+
+class ChallengePoolTests(TestCase):
+    """
+    request_login serves pre-generated challenges and falls back to inline generation.
+    """
+
+    def setUp(self):
+        self.pool = ChallengePool(size=1, qr_format='svg')
+        self.pool.fill()
+        # Install as the process-wide pool so both view modules pick it up
+        patcher = mock.patch('authenticate.challenge_pool._pool', self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        enabled = override_settings(CHALLENGE_POOL_ENABLED=True)
+        enabled.enable()
+        self.addCleanup(enabled.disable)
+
+    def test_pooled_challenge_expires_from_handout(self):
+        pooled_id = self.pool._entries[0].challenge_id
+
+        before = timezone.now()
+        data = self.client.post('/api/auth/login/request?qr_format=svg').json()
+
+        self.assertEqual(data['challenge_id'], pooled_id)
+        self.assertTrue(data['qr_code'].startswith('data:image/svg+xml,'))
+        challenge = AuthenticationChallenge.objects.get(challenge_id=pooled_id)
+        self.assertGreaterEqual(
+            challenge.expires_at,
+            before + timedelta(minutes=settings.CHALLENGE_EXPIRATION_MINUTES)
+        )
+        self.assertEqual(self.pool.stats()['hits'], 1)
+        self.assertEqual(self.pool.stats()['depth'], 0)
+
+    def test_other_format_renders_pooled_challenge(self):
+        pooled_id = self.pool._entries[0].challenge_id
+
+        data = self.client.post('/api/auth/login/request?qr_format=matrix').json()
+
+        self.assertEqual(data['challenge_id'], pooled_id)
+        self.assertEqual(data['qr_format'], 'matrix')
+        self.assertIn('qr_matrix', data)
+        self.assertEqual(self.pool.stats()['hits'], 0)
+        self.assertEqual(self.pool.stats()['qr_renders'], 1)
+
+    def test_fallback_when_empty(self):
+        self.client.post('/api/auth/login/request?qr_format=svg')
+        data = self.client.post('/api/auth/login/request?qr_format=svg').json()
+
+        self.assertEqual(data['qr_format'], 'svg')
+        self.assertEqual(AuthenticationChallenge.objects.count(), 2)
+        self.assertEqual(self.pool.stats()['hits'], 1)
+        self.assertEqual(self.pool.stats()['fallbacks'], 1)
+
+    @override_settings(CHALLENGE_POOL_SIZE=2)
+    def test_default_pool_serves_the_frontend_format(self):
+        with mock.patch('authenticate.challenge_pool._pool', None), \
+                mock.patch.object(ChallengePool, 'start'):
+            pool = get_challenge_pool()
+        pool.fill()
+        entry = pool.pop('matrix')
+        self.assertEqual(entry.qr_format, 'matrix')
+        self.assertEqual(pool.stats()['hits'], 1)
+
+
+class SessionCacheTests(TestCase):
+    """
+    Session checks are served from the cache and revoked immediately.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.device, _ = _enroll_test_device()
+        token = create_jwt_token(self.device.device_id, 'session-cache-test')
+        self.session = UserSession.objects.create(
+            session_id='session-cache-test',
+            token_digest=hash_session_token(token),
+            device=self.device,
+            ip_address='127.0.0.1'
+        )
+        self.client.cookies['session_token'] = token
+
+    def assertAuthenticated(self, expected):
+        self.assertEqual(self.client.get('/api/auth/session/validate').json()['authenticated'], expected)
+        self.assertEqual(self.client.get('/api/dashboard/sessions/').status_code, 200 if expected else 401)
+
+    def test_repeat_checks_skip_session_query(self):
+        self.assertAuthenticated(True)
+        with self.assertNumQueries(0):
+            self.client.get('/api/auth/session/validate')
+        # Only the view's own session listing hits the database
+        with self.assertNumQueries(1):
+            self.client.get('/api/dashboard/sessions/')
+
+    def test_terminate_revokes_cached_session(self):
+        self.assertAuthenticated(True)
+        self.session.terminate()
+        self.assertAuthenticated(False)
+
+    def test_deactivate_drops_cached_session(self):
+        self.assertAuthenticated(True)
+        self.device.deactivate()
+        self.assertIsNone(cache.get('nullpass:session:session-cache-test'))
+
+    def test_logout_revokes_cached_session(self):
+        self.assertAuthenticated(True)
+        token = self.client.cookies['session_token'].value
+        self.client.post('/api/auth/logout')
+        self.client.cookies['session_token'] = token
+        self.assertAuthenticated(False)
+
+
+class PurgeExpiredTests(TestCase):
+    """
+    purge_expired removes dead rows past the retention window and nothing else.
+    """
+
+    def test_purges_expired_challenges_and_dead_sessions(self):
+        device, _ = _enroll_test_device()
+        now = timezone.now()
+
+        _create_test_challenge('challenge_live', minutes=5)
+        old = _create_test_challenge('challenge_old', minutes=5)
+        AuthenticationChallenge.objects.filter(pk=old.pk).update(expires_at=now - timedelta(days=2))
+
+        live_session = UserSession.objects.create(session_id='live', session_token='t', device=device, ip_address='127.0.0.1')
+        dead_session = UserSession.objects.create(session_id='dead', session_token='t', device=device, ip_address='127.0.0.1')
+        UserSession.objects.filter(pk=dead_session.pk).update(is_active=False, last_activity=now - timedelta(days=2))
+
+        out = io.StringIO()
+        call_command('purge_expired', '--retention-hours', '24', '--batch-size', '1', stdout=out)
+
+        self.assertIn('Removed 1 expired challenges and 1 dead sessions', out.getvalue())
+        self.assertEqual(list(AuthenticationChallenge.objects.values_list('challenge_id', flat=True)), ['challenge_live'])
+        self.assertEqual(list(UserSession.objects.values_list('pk', flat=True)), [live_session.pk])
+
+
+@override_settings(PURGE_SWEEPER_ENABLED=True, CHALLENGE_POOL_ENABLED=True, BLOCKCHAIN_ENABLED=True)
+class BackgroundWorkerTests(SimpleTestCase):
+    """
+    Background threads start from the WSGI/ASGI entry points, never from app loading.
+    """
+
+    def patch_starters(self):
+        starters = {
+            'sweeper': mock.patch('authenticate.maintenance.start_purge_sweeper'),
+            'pool': mock.patch('authenticate.challenge_pool.get_challenge_pool'),
+            'anchor': mock.patch('authenticate.anchoring.start_anchor_worker'),
+        }
+        mocks = {name: patcher.start() for name, patcher in starters.items()}
+        for patcher in starters.values():
+            self.addCleanup(patcher.stop)
+        return mocks
+
+    def test_app_loading_starts_nothing(self):
+        mocks = self.patch_starters()
+        django_apps.get_app_config('authenticate').ready()
+        for starter in mocks.values():
+            starter.assert_not_called()
+
+    def test_serving_process_starts_workers(self):
+        mocks = self.patch_starters()
+        start_background_workers()
+        for starter in mocks.values():
+            starter.assert_called_once()
+
+
+class SystemCounterTests(TransactionTestCase):
+    """
+    Device and session counters follow every write path, once it commits, and
+    reconcile corrects drift.
+    """
+
+    def setUp(self):
+        reconcile_counters()
+
+    def assertCounters(self, **expected):
+        counters = get_counters()
+        self.assertEqual({name: counters[name] for name in expected}, expected)
+
+    def test_counters_follow_model_changes(self):
+        device, _ = _enroll_test_device()
+        other = TrustedDevice.objects.get(pk=_enroll_test_device('counter-device-2')[0].pk)
+        session = UserSession.objects.create(session_id='counted', device=device, ip_address='127.0.0.1')
+        UserSession.objects.create(session_id='counted-2', device=other, ip_address='127.0.0.1')
+        self.assertCounters(devices_total=2, devices_active=2, devices_flagged=0, sessions_total=2, sessions_active=2)
+
+        other.flag_device()
+        other.flag_device()
+        UserSession.objects.get(pk=session.pk).terminate()
+        device.deactivate()
+        self.assertCounters(devices_active=1, devices_flagged=1, sessions_active=1)
+
+        # Deleting a device also removes its cascaded sessions
+        other.delete()
+        self.assertCounters(devices_total=1, devices_flagged=0, sessions_total=1, sessions_active=0)
+        self.assertEqual(reconcile_counters(), {})
+
+    def test_racing_state_changes_count_once(self):
+        device, _ = _enroll_test_device()
+        UserSession.objects.create(session_id='raced', device=device, ip_address='127.0.0.1')
+        TrustedDevice.objects.filter(pk=device.pk).update(failed_attempts=settings.MAX_FAILED_ATTEMPTS - 1)
+
+        # Two requests each loaded the rows before either wrote
+        first, second = (UserSession.objects.get(session_id='raced') for _ in range(2))
+        self.assertTrue(first.terminate())
+        self.assertFalse(second.terminate())
+        self.assertEqual(AuthenticationEvent.objects.filter(event_type='SESSION_TERMINATED').count(), 1)
+
+        first, second = (TrustedDevice.objects.get(pk=device.pk) for _ in range(2))
+        first.increment_failed_attempts()
+        second.increment_failed_attempts()
+        self.assertEqual(
+            TrustedDevice.objects.get(pk=device.pk).failed_attempts, settings.MAX_FAILED_ATTEMPTS + 1
+        )
+        first.flag_device()
+        second.deactivate()
+        first.deactivate()
+        # Saving the instance later must not count its changes again
+        first.save()
+
+        self.assertCounters(devices_active=0, devices_flagged=1, sessions_active=0)
+        self.assertEqual(reconcile_counters(), {})
+
+    def test_purge_and_batch_verify_keep_counters_exact(self):
+        device, signing_key = _enroll_test_device()
+        challenge = _create_test_challenge()
+        self.client.post('/api/auth/verify/batch', json.dumps({'items': [{
+            'challenge_id': challenge.challenge_id,
+            'device_id': device.device_id,
+            'signature': _sign_challenge(signing_key, challenge),
+        }]}), content_type='application/json')
+        self.assertCounters(sessions_total=1, sessions_active=1)
+
+        UserSession.objects.update(expires_at=timezone.now() - timedelta(days=2))
+        call_command('purge_expired', '--retention-hours', '24', stdout=io.StringIO())
+        self.assertCounters(sessions_total=0, sessions_active=0)
+        self.assertEqual(reconcile_counters(), {})
+
+    def test_counters_move_after_commit(self):
+        device, _ = _enroll_test_device()
+        with transaction.atomic():
+            UserSession.objects.create(session_id='pending', device=device, ip_address='127.0.0.1')
+            # The counter rows are not touched inside the writer's transaction
+            self.assertCounters(sessions_total=0)
+        self.assertCounters(sessions_total=1, sessions_active=1)
+
+        with self.assertRaises(DatabaseError), transaction.atomic():
+            UserSession.objects.create(session_id='rolled-back', device=device, ip_address='127.0.0.1')
+            raise DatabaseError
+        self.assertCounters(sessions_total=1, sessions_active=1)
+
+    def test_reconcile_corrects_drift(self):
+        device, _ = _enroll_test_device()
+        TrustedDevice.objects.filter(pk=device.pk).update(is_flagged=True)
+        self.assertCounters(devices_flagged=0)
+
+        out = io.StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('devices_flagged: +1', out.getvalue())
+        self.assertCounters(devices_total=1, devices_flagged=1)
+
+
+class EventRollupTests(TestCase):
+    """
+    Rollups are written once events commit, and windows cover exactly their length.
+    """
+
+    NOW = datetime(2026, 10, 17, 12, 30, tzinfo=dt_timezone.utc)
+
+    def create_events(self, *ages):
+        with self.captureOnCommitCallbacks(execute=True):
+            for age in ages:
+                AuthenticationEvent.objects.create(
+                    event_type='LOGIN_FAILED', success=False, ip_address='127.0.0.1', timestamp=self.NOW - age
+                )
+
+    def test_rollups_wait_for_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            AuthenticationEvent.objects.create(event_type='LOGIN_FAILED', success=False, ip_address='127.0.0.1')
+            self.assertFalse(AuthenticationEventRollup.objects.exists())
+        self.assertEqual(len(callbacks), 1)
+
+    def test_windows_stop_at_their_exact_start(self):
+        self.create_events(
+            timedelta(hours=24, minutes=20),     # before the 24h window, in the same hour as its start
+            timedelta(hours=23, minutes=59),     # partial first hour of the 24h window
+            timedelta(hours=23, minutes=20),     # first whole hour
+            timedelta(days=7, minutes=20),       # before the 7d window, in the same hour as its start
+            timedelta(days=7) - timedelta(minutes=15),
+        )
+
+        counts = window_counts({'24h': 24, '7d': 24 * 7}, now=self.NOW)
+        self.assertEqual(counts, {('LOGIN_FAILED', False, ''): {'24h': 2, '7d': 4}})
+
+        # A window starting on the hour needs no raw events
+        with self.assertNumQueries(1):
+            window_counts({'24h': 24}, now=self.NOW.replace(minute=0))
+
+
+class EventPartitionRollTests(TestCase):
+    """
+    roll_event_partitions moves cold periods into verified archive files and keeps rollup totals.
+    """
+
+    NOW = datetime(2026, 10, 17, 12, 0, tzinfo=dt_timezone.utc)
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        for day in ((2026, 7, 10), (2026, 8, 20), (2026, 8, 31), (2026, 10, 15)):
+            event = AuthenticationEvent.objects.create(event_type='LOGIN_SUCCESS', success=True, ip_address='127.0.0.1')
+            AuthenticationEvent.objects.filter(pk=event.pk).update(timestamp=datetime(*day, 9, 0, tzinfo=dt_timezone.utc))
+        rebuild_event_rollups()
+
+    def roll(self, **kwargs):
+        return roll_event_partitions(now=self.NOW, hot_days=35, period='month', archive_dir=self.archive_dir, **kwargs)
+
+    def test_cold_months_are_archived(self):
+        self.assertEqual([p['rows'] for p in self.roll(dry_run=True)['partitions']], [1, 2])
+        self.assertEqual(AuthenticationEvent.objects.count(), 4)
+
+        result = self.roll()
+        self.assertEqual(result['hot_boundary'], datetime(2026, 9, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual([p['period'] for p in result['partitions']], ['2026-07', '2026-08'])
+        self.assertEqual(AuthenticationEvent.objects.count(), 1)
+
+        august = EventArchivePartition.objects.get(start=datetime(2026, 8, 1, tzinfo=dt_timezone.utc))
+        with open(august.path, 'rb') as f:
+            self.assertEqual(hashlib.sha256(f.read()).hexdigest(), august.sha256)
+        with gzip.open(august.path, 'rt') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(len(rows), august.row_count)
+        self.assertTrue(all(row['timestamp'].startswith('2026-08') for row in rows))
+
+        # Rollups keep counting archived events, even after a rebuild
+        rebuild_event_rollups()
+        self.assertEqual(AuthenticationEventRollup.objects.aggregate(total=Sum('count'))['total'], 4)
+        self.assertEqual(self.roll()['partitions'], [])
+
+    @override_settings(BLOCKCHAIN_ENABLED=True, BLOCKCHAIN_LEDGER='memory')
+    def test_unanchored_periods_are_held_back(self):
+        # July's event is anchored, August's are not yet
+        anchor_pending_events()
+        august = AuthenticationEvent.objects.filter(timestamp__month=8)
+        EventInclusionProof.objects.filter(event_id__in=august.values('id')).delete()
+        august.update(blockchain_hash=None, blockchain_tx_hash=None)
+
+        result = self.roll()
+        self.assertEqual([p['period'] for p in result['partitions']], ['2026-07'])
+        self.assertEqual(result['held_back'], ['2026-08'])
+        self.assertEqual(AuthenticationEvent.objects.count(), 3)
+
+        anchor_pending_events()
+        result = self.roll()
+        self.assertEqual([p['period'] for p in result['partitions']], ['2026-08'])
+        self.assertEqual(result['held_back'], [])
+
+    def test_week_periods(self):
+        start = period_start(datetime(2026, 8, 20, 9, 0, tzinfo=dt_timezone.utc), 'week')
+        self.assertEqual(start, datetime(2026, 8, 17, tzinfo=dt_timezone.utc))
+        self.assertEqual(period_label(start, 'week'), '2026-W34')
+        self.assertEqual(next_period_start(datetime(2026, 12, 1, tzinfo=dt_timezone.utc), 'month'),
+                         datetime(2027, 1, 1, tzinfo=dt_timezone.utc))
+
+
+class SessionTokenDigestTests(TestCase):
+    """
+    Sessions keep only a token digest; lookups use the session_id claim.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.device, _ = _enroll_test_device()
+
+    def test_backfill_replaces_raw_tokens(self):
+        legacy = UserSession.objects.create(session_id='legacy', session_token='jwt-a', device=self.device, ip_address='127.0.0.1')
+        current = UserSession.objects.create(session_id='current', token_digest=hash_session_token('jwt-b'), device=self.device, ip_address='127.0.0.1')
+
+        out = io.StringIO()
+        call_command('backfill_session_digests', '--batch-size', '1', stdout=out)
+
+        self.assertIn('Backfilled 1 session digests', out.getvalue())
+        legacy.refresh_from_db()
+        self.assertEqual((legacy.session_token, legacy.token_digest), ('', hash_session_token('jwt-a')))
+        self.assertEqual(UserSession.objects.get(pk=current.pk).token_digest, hash_session_token('jwt-b'))
+
+    def test_logout_accepts_expired_and_undecodable_tokens(self):
+        expired_token = create_jwt_token(self.device.device_id, 'expired', expires_at=timezone.now() - timedelta(minutes=1))
+        expired = UserSession.objects.create(session_id='expired', device=self.device, ip_address='127.0.0.1')
+        legacy = UserSession.objects.create(session_id='legacy', token_digest=hash_session_token('opaque'), device=self.device, ip_address='127.0.0.1')
+
+        for token in (expired_token, 'opaque'):
+            self.client.cookies['session_token'] = token
+            self.client.post('/api/auth/logout')
+
+        self.assertFalse(UserSession.objects.filter(pk__in=[expired.pk, legacy.pk], is_active=True).exists())
+
+
+class AsymmetricJWTTests(SimpleTestCase):
+    """
+    ES256 and EdDSA tokens carry a kid and verify offline against the JWKS.
+    """
+
+    def setUp(self):
+        key_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(key_dir.cleanup)
+        self.key_dir = key_dir.name
+
+    def write_key(self, algorithm, name):
+        path = os.path.join(self.key_dir, name)
+        with open(path, 'w') as key_file:
+            key_file.write(generate_private_key_pem(algorithm))
+        return path
+
+    def test_tokens_verify_offline_against_jwks(self):
+        for algorithm in ('ES256', 'EdDSA'):
+            with self.subTest(algorithm=algorithm), override_settings(
+                JWT_ALGORITHM=algorithm, JWT_PRIVATE_KEY_FILE=self.write_key(algorithm, f'{algorithm}.pem')
+            ):
+                token = create_jwt_token('device-1', 'session-1')
+                payload, error = decode_jwt_token(token)
+                self.assertIsNone(error)
+                self.assertEqual(payload['session_id'], 'session-1')
+
+                keys = self.client.get('/api/auth/.well-known/jwks.json').json()['keys']
+                kid = jwt.get_unverified_header(token)['kid']
+                jwk = jwt.PyJWKSet.from_dict({'keys': keys})[kid]
+                self.assertEqual(jwt.decode(token, jwk.key, algorithms=[algorithm])['device_id'], 'device-1')
+
+    def test_retired_key_is_accepted_and_unknown_key_rejected(self):
+        from cryptography.hazmat.primitives import serialization
+
+        old_key = self.write_key('ES256', 'old.pem')
+        with override_settings(JWT_ALGORITHM='ES256', JWT_PRIVATE_KEY_FILE=old_key):
+            old_token = create_jwt_token('device-1', 'session-1')
+        with override_settings(JWT_ALGORITHM='ES256', JWT_PRIVATE_KEY_FILE=self.write_key('ES256', 'other.pem')):
+            foreign_token = create_jwt_token('device-1', 'session-1')
+
+        with open(old_key) as key_file:
+            old_public = os.path.join(self.key_dir, 'old.pub')
+            public_key = serialization.load_pem_private_key(key_file.read().encode(), password=None).public_key()
+        with open(old_public, 'wb') as key_file:
+            key_file.write(public_key.public_bytes(
+                serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+            ))
+
+        with override_settings(
+            JWT_ALGORITHM='ES256',
+            JWT_PRIVATE_KEY_FILE=self.write_key('ES256', 'new.pem'),
+            JWT_PREVIOUS_PUBLIC_KEY_FILES=[old_public]
+        ):
+            self.assertIsNone(decode_jwt_token(old_token)[1])
+            self.assertEqual(decode_jwt_token(foreign_token), (None, 'Invalid token'))
+            self.assertEqual(len(get_jwt_keys().jwks['keys']), 2)
+
+
+class QueuedLoggingTests(SimpleTestCase):
+    """
+    App loggers enqueue records; hot-path success records are sampled and rate-limited.
+    """
+
+    def make_record(self, level=logging.INFO):
+        return logging.LogRecord('authenticate.hotpath', level, __file__, 1, 'decoded for %s', ('d1',), None)
+
+    def test_app_loggers_write_through_queue(self):
+        self.assertTrue(settings.LOG_QUEUE_ENABLED)
+        handlers = logging.getLogger('authenticate').handlers
+        self.assertEqual([type(handler) for handler in handlers], [QueueHandler])
+
+    def test_hot_path_filter_samples_and_reports_suppressed(self):
+        hot_path = HotPathFilter(sample_every=3, max_per_second=0)
+        kept = [record for record in (self.make_record() for _ in range(7)) if hot_path.filter(record)]
+
+        self.assertEqual(len(kept), 3)
+        self.assertEqual(kept[1].getMessage(), 'decoded for d1 (2 similar suppressed)')
+        self.assertTrue(hot_path.filter(self.make_record(logging.WARNING)))
+
+    def test_hot_path_filter_rate_limits(self):
+        hot_path = HotPathFilter(sample_every=1, max_per_second=2)
+        with mock.patch('nullpass.log_queue.time.monotonic', return_value=100.0):
+            self.assertEqual(sum(hot_path.filter(self.make_record()) for _ in range(10)), 2)
+
+
+@override_settings(AUDIT_WRITER_ENABLED=True, AUDIT_WRITER_BATCH_SIZE=3, AUDIT_WRITER_FLUSH_SECONDS=60)
+class AuditWriterTests(TransactionTestCase):
+    """
+    Durable events are written at once; fire-and-forget events are batched and flushed on shutdown.
+    Runs against the file-backed SQLite test database (DB_TEST_NAME) or PostgreSQL.
+    """
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('requires a file-backed SQLite or PostgreSQL test database')
+        self.addCleanup(shutdown_audit_writer)
+        self.device, _ = _enroll_test_device()
+
+    def record(self, event_type, success, **fields):
+        return record_event(event_type=event_type, device=self.device, success=success,
+                            ip_address='127.0.0.1', **fields)
+
+    def test_flush_on_shutdown(self):
+        recorded = [self.record('LOGIN_SUCCESS', True) for _ in range(2)]
+        self.record('INVALID_SIGNATURE', False)
+
+        # The security event is written and classified before returning; successes wait in the queue
+        self.assertEqual(
+            list(AuthenticationEvent.objects.values_list('event_type', 'attack_type')),
+            [('INVALID_SIGNATURE', 'Signature Forgery Attempt')]
+        )
+        self.assertEqual(get_audit_writer().pending(), 2)
+
+        self.assertEqual(shutdown_audit_writer(), 2)
+        self.assertEqual(
+            sorted(AuthenticationEvent.objects.filter(event_type='LOGIN_SUCCESS').values_list('timestamp', flat=True)),
+            sorted(event.timestamp for event in recorded)
+        )
+        self.assertEqual(
+            AuthenticationEventRollup.objects.filter(event_type='LOGIN_SUCCESS').get().count, 2
+        )
+
+    def test_full_batch_is_written_by_the_writer_thread(self):
+        for _ in range(3):
+            self.record('SESSION_TERMINATED', True)
+
+        deadline = time.monotonic() + 5
+        while AuthenticationEvent.objects.count() < 3 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(AuthenticationEvent.objects.count(), 3)
+        self.assertEqual(get_audit_writer().stats()['written'], 3)
+
+    def test_rolled_back_events_are_not_queued(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.record('LOGIN_SUCCESS', True)
+                raise RuntimeError('rollback')
+
+        self.assertEqual(get_audit_writer().pending(), 0)
+
+    def test_bad_event_does_not_sink_the_batch(self):
+        doomed, _ = _enroll_test_device('doomed-device')
+        self.record('LOGIN_SUCCESS', True)
+        record_event(event_type='LOGIN_SUCCESS', device=doomed, success=True, ip_address='127.0.0.1')
+        TrustedDevice.objects.filter(pk=doomed.pk).delete()
+
+        self.assertEqual(shutdown_audit_writer(), 1)
+        self.assertEqual(list(AuthenticationEvent.objects.values_list('device', flat=True)), [self.device.pk])
+
+
+class WriteOnlyLedger:
+    """Ledger whose roots cannot be read back, like the blockchain service adapter"""
+
+    def anchor(self, root, leaf_count):
+        return '0x' + root
+
+
+@override_settings(BLOCKCHAIN_LEDGER='memory')
+class MerkleAnchoringTests(TestCase):
+    """
+    Pending events are anchored one Merkle root per batch and each can be rechecked offline.
+    """
+
+    def setUp(self):
+        for index in range(5):
+            AuthenticationEvent.objects.create(
+                event_type='LOGIN_SUCCESS' if index % 2 else 'LOGIN_FAILED',
+                success=bool(index % 2),
+                ip_address='127.0.0.1'
+            )
+
+    def test_every_leaf_proves_its_root(self):
+        for size in range(1, 10):
+            hashes = [hashlib.sha256(str(i).encode()).hexdigest() for i in range(size)]
+            levels = build_tree(hashes)
+            root = levels[-1][0]
+            for index, event_hash in enumerate(hashes):
+                path = inclusion_path(levels, index)
+                self.assertTrue(verify_inclusion(event_hash, path, root))
+                if size > 1:
+                    self.assertFalse(verify_inclusion(hashes[index - 1], path, root))
+
+    def test_one_root_per_batch(self):
+        stats = anchor_pending_events(batch_size=2)
+        self.assertEqual(stats, {'roots': 3, 'events': 5, 'pending': 0})
+        self.assertEqual(list(MerkleAnchor.objects.order_by('id').values_list('leaf_count', flat=True)), [2, 2, 1])
+        self.assertFalse(AuthenticationEvent.objects.filter(blockchain_tx_hash__isnull=True).exists())
+
+        ledger = get_ledger('memory')
+        for anchor in MerkleAnchor.objects.all():
+            self.assertEqual(ledger.lookup(anchor.tx_hash), anchor.root)
+
+        for event in AuthenticationEvent.objects.all():
+            result = verify_event(event.id, check_ledger=True)
+            self.assertEqual(result['status'], 'valid', result['reason'])
+            self.assertEqual(result['tx_hash'], event.blockchain_tx_hash)
+
+        self.assertEqual(anchor_pending_events(), {'roots': 0, 'events': 0, 'pending': 0})
+
+    def test_tampered_event_fails_verification(self):
+        anchor_pending_events()
+        event = AuthenticationEvent.objects.filter(success=False).first()
+        AuthenticationEvent.objects.filter(pk=event.pk).update(success=True)
+
+        self.assertEqual(verify_event(event.id)['status'], 'invalid')
+
+        proof = EventInclusionProof.objects.get(event_id=event.id)
+        forged = AuthenticationEvent.objects.get(pk=event.pk).generate_event_hash()
+        self.assertFalse(verify_inclusion(forged, proof.path, proof.anchor.root))
+
+        new_event = AuthenticationEvent.objects.create(event_type='LOGIN_SUCCESS', success=True, ip_address='127.0.0.1')
+        self.assertEqual(verify_event(new_event.id)['status'], 'unanchored')
+
+    def test_events_of_deleted_devices_stay_valid(self):
+        device, _ = _enroll_test_device()
+        saved = AuthenticationEvent.objects.create(
+            event_type='LOGIN_SUCCESS', device=device, success=True, ip_address='127.0.0.1'
+        )
+        bulk = AuthenticationEvent(event_type='REPLAY_ATTACK', device=device, success=False, ip_address='127.0.0.1')
+        AuthenticationEvent.objects.bulk_create([bulk])
+        anchor_pending_events()
+
+        device.delete()
+        for event in (saved, bulk):
+            event.refresh_from_db()
+            self.assertIsNone(event.device)
+            self.assertEqual(event.device_identifier, 'device_test_0001')
+            result = verify_event(event.id)
+            self.assertEqual(result['status'], 'valid', result['reason'])
+
+    def test_failed_root_is_retried(self):
+        with mock.patch.object(InMemoryLedger, 'anchor', side_effect=ConnectionError('ledger down')):
+            self.assertEqual(anchor_pending_events(), {'roots': 0, 'events': 0, 'pending': 1})
+        self.assertEqual(MerkleAnchor.objects.get().tx_hash, '')
+
+        self.assertEqual(anchor_pending_events(), {'roots': 1, 'events': 5, 'pending': 0})
+        self.assertEqual(MerkleAnchor.objects.count(), 1)
+
+    def test_verify_command(self):
+        anchor_pending_events()
+        out = io.StringIO()
+        call_command('verify_event_anchor', '--all', '--check-ledger', stdout=out)
+        self.assertIn('5 valid', out.getvalue())
+
+    def test_archived_events_verify_from_their_archive(self):
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir)
+        cold = list(AuthenticationEvent.objects.order_by('id').values_list('id', flat=True)[:2])
+        # Microseconds must survive the archive for the event to rehash
+        AuthenticationEvent.objects.filter(id__in=cold).update(
+            timestamp=timezone.now().replace(microsecond=123456) - timedelta(days=120)
+        )
+        anchor_pending_events()
+        roll_event_partitions(hot_days=35, period='month', archive_dir=archive_dir)
+        self.assertFalse(AuthenticationEvent.objects.filter(id__in=cold).exists())
+
+        partition = EventArchivePartition.objects.get()
+        for event_id in cold:
+            result = verify_event(event_id, check_ledger=True)
+            self.assertEqual(result['status'], 'valid', result['reason'])
+            self.assertEqual(result['archive'], partition.path)
+
+        # An edited archive no longer matches its recorded SHA256
+        with gzip.open(partition.path, 'rt') as f:
+            rows = [json.loads(line) for line in f]
+        rows[0]['success'] = not rows[0]['success']
+        with gzip.open(partition.path, 'wt') as f:
+            f.writelines(json.dumps(row) + '\n' for row in rows)
+        self.assertEqual(verify_event(cold[1])['status'], 'invalid')
+
+        os.remove(partition.path)
+        self.assertEqual(verify_event(cold[0])['status'], 'missing')
+
+    def test_ledger_check_needs_a_readable_ledger(self):
+        anchor_pending_events(ledger_name='authenticate.tests.WriteOnlyLedger')
+
+        with self.assertRaisesMessage(CommandError, 'cannot look up anchored roots'):
+            call_command('verify_event_anchor', '--all', '--check-ledger', stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command('verify_event_anchor', '--all', stdout=out)
+        self.assertIn('5 valid', out.getvalue())
 
-# Create your tests here.
@@ -1,19 +1,29 @@
 # authenticateurls.py
 
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# Hot endpoints switch to their async versions when served over ASGI
+auth_views = async_views if settings.AUTH_ASYNC_VIEWS else views
 
 urlpatterns = [
-    # Defined in views.py
+    # Defined in views.py (auth_views routes may resolve to async_views.py)
     path('enroll', views.enroll_device, name='api_enroll'),
-    path('login/request', views.request_login, name='api_login_request'),
-    path('verify', views.verify_signature, name='api_verify_signature'),
+    path('login/request', auth_views.request_login, name='api_login_request'),
+    path('verify', auth_views.verify_signature, name='api_verify_signature'),
+    path('verify/batch', views.verify_signature_batch, name='api_verify_signature_batch'),
     path('logout', views.logout, name='api_logout'),
     
     # QR Code helpers
     path('enroll/qr', views.request_enrollment, name='api_enroll_qr'),
     
     # Session management
-    path('session/validate', views.validate_session, name='validate_session'),
-    path('challenge/status', views.check_challenge_status, name='api_challenge_status'),
+    path('session/validate', auth_views.validate_session, name='validate_session'),
+    path('challenge/status', auth_views.check_challenge_status, name='api_challenge_status'),
+    path('challenge/status/wait', auth_views.wait_challenge_status, name='api_challenge_status_wait'),
+    path('challenge/status/stream', auth_views.stream_challenge_status, name='api_challenge_status_stream'),
+    
+    # Public keys for offline session token validation
+    path('.well-known/jwks.json', views.jwks, name='api_jwks'),
 ]
\ No newline at end of file
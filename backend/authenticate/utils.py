@@ -5,15 +5,24 @@ Includes cryptographic helpers, JWT token management, and request utilities.
 
 import secrets
 import base64
+import hashlib
 import jwt
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.utils import timezone
-from ecdsa import VerifyingKey, SECP256k1, BadSignatureError
+from .jwt_keys import get_jwt_keys
+from .key_cache import public_key_cache
+from .signature_backends import detect_signature_format, get_signature_backend, signature_format_counter
 
 logger = logging.getLogger('authentication')
 
+# Per-call success messages; sampled and rate-limited (see LOG_HOT_PATH_* settings).
+# %-style arguments, so nothing is formatted when the record is dropped.
+hot_path_logger = logging.getLogger('authenticate.hotpath')
+
 
 # ============================================================================
 # RANDOM STRING GENERATION
@@ -45,64 +54,104 @@ def generate_challenge_nonce():
     }
 
 
+def build_auth_url(challenge_id, nonce, action=None):
+    """
+    Build the frontend /authenticate URL encoded in login and enrollment QR codes.
+    
+    Args:
+        challenge_id (str): Challenge identifier
+        nonce (str): Challenge nonce
+        action (str): Optional action, e.g. 'enroll'
+    
+    Returns:
+        str: URL pointing at FRONTEND_BASE_URL
+    """
+    action_param = f"action={action}&" if action else ""
+    return f"{settings.FRONTEND_BASE_URL}/authenticate?{action_param}challenge_id={challenge_id}&nonce={nonce}"
+
+
 # ============================================================================
 # JWT TOKEN MANAGEMENT
 # ============================================================================
 
-def create_jwt_token(device_id, session_id):
+def create_jwt_token(device_id, session_id, expires_at=None):
     """
     Create a JWT token for authenticated sessions.
     
     Args:
         device_id (str): Unique device identifier
         session_id (str): Unique session identifier
+        expires_at (datetime): Token expiry (defaults to now + JWT_EXPIRATION_HOURS);
+                               pass the session's expiry when re-issuing its token
     
     Returns:
         str: Encoded JWT token
     """
     now = timezone.now()
-    expiration_hours = settings.JWT_EXPIRATION_HOURS
+    expires_at = expires_at or now + timedelta(hours=settings.JWT_EXPIRATION_HOURS)
     
     payload = {
         'device_id': device_id,
         'session_id': session_id,
         'issued_at': int(now.timestamp()),
-        'expires_at': int((now + timedelta(hours=expiration_hours)).timestamp()),
+        'expires_at': int(expires_at.timestamp()),
         'iss': 'nullpass',  # Issuer
         'iat': int(now.timestamp()),  # Issued at
-        'exp': int((now + timedelta(hours=expiration_hours)).timestamp())  # Expiration
+        'exp': int(expires_at.timestamp())  # Expiration
     }
     
+    keys = get_jwt_keys()
     token = jwt.encode(
         payload,
-        settings.JWT_SECRET_KEY,
-        algorithm=settings.JWT_ALGORITHM
+        keys.signing_key,
+        algorithm=keys.algorithm,
+        headers={'kid': keys.kid} if keys.kid else None
     )
     
-    logger.info(f"JWT token created for device: {device_id}")
+    hot_path_logger.info("JWT token created for device: %s", device_id)
     
     return token
 
 
-def decode_jwt_token(token):
+def hash_session_token(token):
+    """
+    Compute the fixed-width digest stored in UserSession.token_digest.
+    
+    Args:
+        token (str): Session JWT
+    
+    Returns:
+        str: Hex-encoded SHA256 digest of the token
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def decode_jwt_token(token, verify_exp=True):
     """
     Decode and validate a JWT token.
     
     Args:
         token (str): JWT token to decode
+        verify_exp (bool): Reject expired tokens (logout accepts them)
     
     Returns:
         tuple: (payload dict, error message)
                Returns (None, error_message) if token is invalid
     """
     try:
+        # Pick the key by kid; the algorithm comes from our key, never from the token
+        key, algorithm = get_jwt_keys().verification_key(jwt.get_unverified_header(token).get('kid'))
+        if key is None:
+            raise jwt.InvalidTokenError('Unknown signing key')
+        
         payload = jwt.decode(
             token,
-            settings.JWT_SECRET_KEY,
-            algorithms=[settings.JWT_ALGORITHM]
+            key,
+            algorithms=[algorithm],
+            options={'verify_exp': verify_exp}
         )
         
-        logger.info(f"JWT token decoded successfully for device: {payload.get('device_id')}")
+        hot_path_logger.info("JWT token decoded successfully for device: %s", payload.get('device_id'))
         
         return payload, None
     
@@ -137,57 +186,89 @@ def verify_jwt_token(token):
 # ECDSA SIGNATURE VERIFICATION
 # ============================================================================
 
-def verify_ecdsa_signature(public_key_pem, message, signature_base64):
+_verification_executor = None
+_verification_executor_lock = threading.Lock()
+
+
+def load_verifying_key(public_key_pem, device_id=None, backend=None):
+    """
+    Load a verifying key, reusing the parsed key cached for the device.
+    
+    Args:
+        public_key_pem (str): Public key in PEM format
+        device_id (str): Device identifier used as cache key (optional)
+        backend: Signature backend (defaults to SIGNATURE_BACKEND)
+    
+    Returns:
+        object: Public key parsed by the signature backend
+    """
+    backend = backend or get_signature_backend()
+    
+    if device_id is None:
+        return backend.load_public_key(public_key_pem)
+    
+    return public_key_cache.get_or_load(
+        device_id,
+        public_key_pem,
+        backend.load_public_key,
+        namespace=backend.name
+    )
+
+
+def get_public_key_cache_stats():
+    """
+    Get hit/miss counters of the parsed public key cache.
+    
+    Returns:
+        dict: Cache size, capacity, hits, misses and evictions
+    """
+    return public_key_cache.stats()
+
+
+def get_signature_format_stats():
+    """
+    Get the number of verifications performed per signature format.
+    
+    Returns:
+        dict: Counts keyed by 'der', 'raw' and 'unknown'
+    """
+    return signature_format_counter.stats()
+
+
+def verify_ecdsa_signature(public_key_pem, message, signature_base64, device_id=None,
+                           backend=None, signature_format=None):
     """
     Verify ECDSA signature using public key.
+    Accepts DER and raw (P1363) encoded signatures over SHA256. The encoding
+    is detected up front so each call does at most one EC verification.
+    Parsed keys are cached per device when device_id is given.
     """
     try:
-        import hashlib
-        from ecdsa.util import sigdecode_der, sigdecode_string
+        backend = backend or get_signature_backend()
         
         # Load the public key
-        verifying_key = VerifyingKey.from_pem(public_key_pem)
+        verifying_key = load_verifying_key(public_key_pem, device_id, backend)
         
         # Decode the signature
         signature_bytes = base64.b64decode(signature_base64)
         
-        # Encode message to bytes
+        # Encode message to bytes (the backend hashes it with SHA256)
         message_bytes = message.encode('utf-8')
         
-        # REMOVED: message_hash = hashlib.sha256(message_bytes).digest()
-        # REASON: The verify function below will hash the data for us because we passed hashfunc
+        detected_format = detect_signature_format(
+            signature_bytes,
+            backend.coordinate_size(verifying_key),
+            preferred_format=signature_format
+        )
+        signature_format_counter.record(detected_format)
         
-        try:
-            # Try DER format (ASN.1 encoded)
-            verifying_key.verify(
-                signature_bytes, 
-                message_bytes,  # <--- Pass raw bytes here
-                hashfunc=hashlib.sha256,
-                sigdecode=sigdecode_der
-            )
-            logger.info("Signature verification successful (DER format)")
+        if detected_format and backend.verify(verifying_key, signature_bytes, message_bytes, detected_format):
+            hot_path_logger.info("Signature verification successful (%s format, %s)", detected_format, backend.name)
             return True, None
-        except:
-            # Try raw format
-            try:
-                verifying_key.verify(
-                    signature_bytes,
-                    message_bytes, # <--- Pass raw bytes here
-                    hashfunc=hashlib.sha256,
-                    sigdecode=sigdecode_string
-                )
-                logger.info("Signature verification successful (raw format)")
-                return True, None
-            except:
-                pass
         
         logger.warning("Invalid signature detected")
         return False, 'Invalid signature - signature verification failed'
     
-    except BadSignatureError:
-        logger.warning("Invalid signature detected")
-        return False, 'Invalid signature - signature verification failed'
-    
     except base64.binascii.Error:
         logger.warning("Invalid base64 signature format")
         return False, 'Invalid signature format - not valid base64'
@@ -197,6 +278,43 @@ def verify_ecdsa_signature(public_key_pem, message, signature_base64):
         return False, f'Signature verification error: {str(e)}'
 
 
+def get_verification_executor():
+    """
+    Get the shared worker pool used for batch signature verification.
+    
+    Returns:
+        ThreadPoolExecutor: Lazily created executor sized by SIGNATURE_VERIFY_WORKERS
+    """
+    global _verification_executor
+    
+    if _verification_executor is None:
+        with _verification_executor_lock:
+            if _verification_executor is None:
+                _verification_executor = ThreadPoolExecutor(
+                    max_workers=settings.SIGNATURE_VERIFY_WORKERS,
+                    thread_name_prefix='nullpass-verify'
+                )
+    
+    return _verification_executor
+
+
+def verify_ecdsa_signatures(jobs):
+    """
+    Verify many signatures concurrently on the verification worker pool.
+    
+    Args:
+        jobs (list): Keyword argument dicts for verify_ecdsa_signature
+    
+    Returns:
+        list: (is_valid bool, error_message str) tuples in job order
+    """
+    if len(jobs) <= 1:
+        return [verify_ecdsa_signature(**job) for job in jobs]
+    
+    executor = get_verification_executor()
+    return list(executor.map(lambda job: verify_ecdsa_signature(**job), jobs))
+
+
 def validate_public_key_format(public_key_pem):
     """
     Validate if the public key is in correct PEM format.
@@ -209,7 +327,7 @@ def validate_public_key_format(public_key_pem):
     """
     try:
         # Try to load the key - if it fails, format is invalid
-        VerifyingKey.from_pem(public_key_pem)
+        get_signature_backend().load_public_key(public_key_pem)
         return True, None
     
     except Exception as e:
@@ -3,24 +3,37 @@ API Views for NullPass authentication system.
 Handles device enrollment, login requests, signature verification, and session management.
 """
 
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
+from functools import partial
 import json
-import qrcode
-import io
-import base64
 import logging
 
-from .models import TrustedDevice, AuthenticationChallenge, AuthenticationEvent, UserSession
+from .models import TrustedDevice, AuthenticationEvent, UserSession
+from .audit_writer import record_event
+from .challenge_notifier import get_challenge_notifier
+from .challenge_pool import get_challenge_pool
+from .challenge_store import consume_transaction, get_challenge_store
+from .counters import adjust as adjust_counters
+from .jwt_keys import get_jwt_keys
+from .qr import QR_CODE_FORMATS, normalize_qr_format, render_qr
+from .rollups import record_events
+from .session_cache import get_active_session, invalidate_sessions
+from .signature_backends import SIGNATURE_FORMATS
 from .utils import (
-    generate_challenge_nonce,
+    build_auth_url,
+    generate_random_string,
     create_jwt_token,
     decode_jwt_token,
+    hash_session_token,
     verify_ecdsa_signature,
+    verify_ecdsa_signatures,
     validate_public_key_format,
     get_request_metadata,
     validate_device_id,
@@ -34,29 +47,36 @@ logger = logging.getLogger('authenticate')
 # CONFIGURATION
 # ============================================================================
 
-# This points QR codes to your React Frontend (loaded from settings via environment)
-FRONTEND_BASE_URL = settings.FRONTEND_BASE_URL
 CHALLENGE_EXPIRATION_MINUTES = settings.CHALLENGE_EXPIRATION_MINUTES
 ENROLLMENT_CHALLENGE_EXPIRATION_MINUTES = settings.ENROLLMENT_CHALLENGE_EXPIRATION_MINUTES
-QR_CODE_VERSION = settings.QR_CODE_VERSION
-QR_CODE_BOX_SIZE = settings.QR_CODE_BOX_SIZE
-QR_CODE_BORDER = settings.QR_CODE_BORDER
 
 
-def generate_qr_data_uri(payload):
-    qr = qrcode.QRCode(
-        version=QR_CODE_VERSION,
-        box_size=QR_CODE_BOX_SIZE,
-        border=QR_CODE_BORDER,
-    )
-    qr.add_data(payload)
-    qr.make(fit=True)
-
-    img = qr.make_image(fill_color="black", back_color="white")
-    buffer = io.BytesIO()
-    img.save(buffer, format='PNG')
-    img_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-    return f'data:image/png;base64,{img_base64}'
+def get_requested_qr_format(request):
+    """
+    Read the optional qr_format (or its short form qr) from the query string
+    or JSON body.
+    
+    Args:
+        request: Django HttpRequest object
+    
+    Returns:
+        str: One of QR_CODE_FORMATS, defaulting to QR_CODE_FORMAT
+    
+    Raises:
+        ValueError: If the requested format is not supported
+    """
+    qr_format = request.GET.get('qr_format') or request.GET.get('qr')
+    if qr_format is None and request.body:
+        try:
+            data = json.loads(request.body)
+            qr_format = data.get('qr_format') or data.get('qr')
+        except (ValueError, AttributeError):
+            qr_format = None
+    
+    try:
+        return normalize_qr_format(qr_format)
+    except ValueError:
+        raise ValueError(f"Unsupported qr_format; use one of {', '.join(QR_CODE_FORMATS)}")
 
 
 # ============================================================================
@@ -74,10 +94,14 @@ def enroll_device(request):
         device_id = data.get('device_id')
         public_key_pem = data.get('public_key')
         device_name = data.get('device_name', 'Unnamed Device')
+        signature_format = data.get('signature_format', '')
         
         if not device_id or not public_key_pem:
             return JsonResponse({'success': False, 'error': 'Missing required fields'}, status=400)
         
+        if signature_format and signature_format not in SIGNATURE_FORMATS:
+            return JsonResponse({'success': False, 'error': 'Unsupported signature format'}, status=400)
+        
         # Check if device already exists
         if TrustedDevice.objects.filter(device_id=device_id).exists():
             return JsonResponse({'success': False, 'error': 'Device already enrolled'}, status=400)
@@ -86,11 +110,12 @@ def enroll_device(request):
         device = TrustedDevice.objects.create(
             device_id=device_id,
             public_key=public_key_pem,
-            device_name=device_name
+            device_name=device_name,
+            signature_format=signature_format
         )
         
         metadata = get_request_metadata(request)
-        AuthenticationEvent.objects.create(
+        record_event(
             event_type='ENROLLMENT',
             device=device,
             success=True,
@@ -120,33 +145,50 @@ def request_login(request):
     Generate a new authentication challenge and QR code for login.
     """
     try:
-        # 1. Generate Challenge
-        challenge_data = generate_challenge_nonce()
-        challenge_id = challenge_data['challenge_id']
-        nonce = challenge_data['nonce']
-        
+        qr_format = get_requested_qr_format(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    try:
         metadata = get_request_metadata(request)
+        challenge_store = get_challenge_store()
         
-        AuthenticationChallenge.objects.create(
-            challenge_id=challenge_id,
-            nonce=nonce,
-            ip_address=metadata['ip_address'],
-            expires_at=timezone.now() + timedelta(minutes=CHALLENGE_EXPIRATION_MINUTES)
-        )
-        
-        # 2. Build URL pointing to FRONTEND (5173)
-        # This fixes the "Click to Simulate" link
-        auth_url = f"{FRONTEND_BASE_URL}/authenticate?challenge_id={challenge_id}&nonce={nonce}"
+        # 1. Take a pre-rendered challenge from the warm pool when enabled
+        challenge_pool = get_challenge_pool()
+        pooled = challenge_pool.pop(qr_format) if challenge_pool is not None else None
         
-        # 3. Generate QR code
-        qr_code_data_uri = generate_qr_data_uri(auth_url)
+        if pooled is not None:
+            # Persisting at handout makes the expiry count from now
+            challenge = challenge_store.create(
+                ip_address=metadata['ip_address'],
+                expiration_minutes=CHALLENGE_EXPIRATION_MINUTES,
+                challenge_data=pooled.challenge_data
+            )
+            auth_url = pooled.auth_url
+            if pooled.qr_format == qr_format:
+                qr_fields = pooled.qr_fields
+            else:
+                qr_fields = render_qr(auth_url, qr_format)
+        else:
+            # 2. Generate Challenge inline
+            challenge = challenge_store.create(
+                ip_address=metadata['ip_address'],
+                expiration_minutes=CHALLENGE_EXPIRATION_MINUTES
+            )
+            
+            # Build URL pointing to FRONTEND (5173)
+            # This fixes the "Click to Simulate" link
+            auth_url = build_auth_url(challenge.challenge_id, challenge.nonce)
+            
+            # 3. Generate QR code
+            qr_fields = render_qr(auth_url, qr_format)
         
         return JsonResponse({
             'success': True,
-            'challenge_id': challenge_id,
-            'nonce': nonce,          # Required for simulation
-            'qr_code': qr_code_data_uri,
-            'auth_url': auth_url
+            'challenge_id': challenge.challenge_id,
+            'nonce': challenge.nonce,          # Required for simulation
+            'auth_url': auth_url,
+            **qr_fields
         })
     
     except Exception as e:
@@ -164,28 +206,27 @@ def request_enrollment(request):
     """
     Generate a QR code for device enrollment.
     """
+    try:
+        qr_format = get_requested_qr_format(request)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
     try:
         # Create a dummy challenge to track the "session" state
-        challenge_data = generate_challenge_nonce()
-        challenge_id = challenge_data['challenge_id']
-        nonce = challenge_data['nonce']
-
-        AuthenticationChallenge.objects.create(
-            challenge_id=challenge_id,
-            nonce=nonce,
-            expires_at=timezone.now() + timedelta(minutes=ENROLLMENT_CHALLENGE_EXPIRATION_MINUTES)
+        challenge = get_challenge_store().create(
+            expiration_minutes=ENROLLMENT_CHALLENGE_EXPIRATION_MINUTES
         )
+        challenge_id = challenge.challenge_id
+        nonce = challenge.nonce
 
         # Build URL pointing to FRONTEND (5173) with action=enroll
-        auth_url = f"{FRONTEND_BASE_URL}/authenticate?action=enroll&challenge_id={challenge_id}&nonce={nonce}"
-        
-        qr_code_data_uri = generate_qr_data_uri(auth_url)
+        auth_url = build_auth_url(challenge_id, nonce, action='enroll')
         
         return JsonResponse({
             'success': True,
             'challenge_id': challenge_id,
-            'qr_code': qr_code_data_uri,
-            'enrollment_url': auth_url
+            'enrollment_url': auth_url,
+            **render_qr(auth_url, qr_format)
         })
     
     except Exception as e:
@@ -197,6 +238,122 @@ def request_enrollment(request):
 # SIGNATURE VERIFICATION (AUTHENTICATION)
 # ============================================================================
 
+def _replay_attack_fields(device, metadata):
+    """Build AuthenticationEvent fields for a replayed challenge submission"""
+    return {
+        'event_type': 'REPLAY_ATTACK',
+        'device': device,
+        'success': False,
+        'ip_address': metadata['ip_address'],
+        'user_agent': metadata['user_agent'],
+        'failure_reason': 'Challenge already used',
+        'attack_type': AuthenticationEvent.ATTACK_CLASSIFICATIONS['REPLAY_ATTACK'],
+    }
+
+
+def record_replay_attack(device, metadata):
+    """
+    Log a REPLAY_ATTACK event for a submission of an already consumed challenge.
+    
+    Args:
+        device (TrustedDevice): Submitting device, or None if unknown
+        metadata (dict): Request metadata from get_request_metadata
+    """
+    record_event(**_replay_attack_fields(device, metadata))
+    log_security_event('REPLAY_ATTACK', device.device_id if device else None, success=False,
+                       details=f"IP: {metadata['ip_address']}")
+
+
+def record_invalid_signature(device, metadata, error):
+    """
+    Count a failed verification against a device and log an INVALID_SIGNATURE event.
+    
+    Args:
+        device (TrustedDevice): Device whose signature was rejected
+        metadata (dict): Request metadata from get_request_metadata
+        error (str): Verification failure reason
+    """
+    device.increment_failed_attempts()
+    record_event(
+        event_type='INVALID_SIGNATURE',
+        device=device,
+        success=False,
+        ip_address=metadata['ip_address'],
+        user_agent=metadata['user_agent'],
+        failure_reason=error
+    )
+
+
+def complete_login(challenge_store, challenge_id, device, metadata):
+    """
+    Consume a verified challenge and open a session in one transaction.
+    
+    Args:
+        challenge_store: Store returned by get_challenge_store
+        challenge_id (str): Challenge that was signed
+        device (TrustedDevice): Device that signed it
+        metadata (dict): Request metadata from get_request_metadata
+    
+    Returns:
+        str: Session JWT, or None if the challenge was consumed concurrently
+    """
+    session_id = generate_random_string(32)
+    # One expiry for the session row and its token, so tokens re-issued to the PC match
+    expires_at = timezone.now() + timedelta(hours=settings.JWT_EXPIRATION_HOURS)
+    session_token = create_jwt_token(device.device_id, session_id, expires_at=expires_at)
+    
+    with consume_transaction(challenge_store) as consumed:
+        # Atomic compare-and-set consumption; only one of several
+        # concurrent submissions can win the challenge
+        if not challenge_store.consume(challenge_id, device):
+            return None
+        consumed.append(challenge_id)
+        
+        device.record_successful_login()
+        
+        UserSession.objects.create(
+            session_id=session_id,
+            token_digest=hash_session_token(session_token),
+            device=device,
+            expires_at=expires_at,
+            ip_address=metadata['ip_address'],
+            user_agent=metadata['user_agent']
+        )
+        
+        # Fire-and-forget when the audit writer is on; queued once the transaction commits
+        record_event(
+            event_type='LOGIN_SUCCESS',
+            device=device,
+            success=True,
+            ip_address=metadata['ip_address']
+        )
+        
+        # Wake the browser waiting on this challenge once the session is visible
+        transaction.on_commit(partial(get_challenge_notifier().notify, challenge_id))
+    
+    return session_token
+
+
+def login_success_response(session_token):
+    """Build the verify_signature success response carrying the session cookie"""
+    response = JsonResponse({
+        'success': True,
+        'message': 'Authentication successful',
+        'session_token': session_token
+    })
+
+    # CRITICAL: Set cookie path to '/' so Dashboard can see it
+    response.set_cookie(
+        'session_token', 
+        session_token, 
+        httponly=True,
+        samesite='None', 
+        secure=True, # Set True in production with HTTPS
+        path='/'      # This ensures cookie is visible on all pages
+    )
+    return response
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
 def verify_signature(request):
@@ -212,15 +369,19 @@ def verify_signature(request):
         metadata = get_request_metadata(request)
         
         # 1. Validate Challenge
-        try:
-            challenge = AuthenticationChallenge.objects.get(challenge_id=challenge_id)
-        except AuthenticationChallenge.DoesNotExist:
+        challenge_store = get_challenge_store()
+        challenge = challenge_store.get(challenge_id)
+        if challenge is None:
             return JsonResponse({'success': False, 'error': 'Invalid challenge ID'}, status=404)
         
         if challenge.is_used:
+            record_replay_attack(
+                TrustedDevice.objects.filter(device_id=device_id).first(),
+                metadata
+            )
             return JsonResponse({'success': False, 'error': 'Challenge already used'}, status=403)
             
-        if challenge.check_expired():
+        if challenge.is_expired():
             return JsonResponse({'success': False, 'error': 'Challenge expired'}, status=403)
         
         # 2. Validate Device
@@ -235,63 +396,264 @@ def verify_signature(request):
         is_valid, error = verify_ecdsa_signature(
             device.public_key,
             message,
-            signature_base64
+            signature_base64,
+            device_id=device.device_id,
+            signature_format=device.signature_format or None
         )
         
         if not is_valid:
-            device.increment_failed_attempts()
-            AuthenticationEvent.objects.create(
-                event_type='INVALID_SIGNATURE',
-                device=device,
-                success=False,
-                failure_reason=error
-            )
+            record_invalid_signature(device, metadata, error)
             return JsonResponse({'success': False, 'error': 'Invalid signature'}, status=403)
         
-        # 4. Success Logic
-        challenge.mark_as_used(device)
-        device.reset_failed_attempts()
-        device.update_last_used()
+        # 4. Success Logic - one transaction of targeted writes
+        session_token = complete_login(challenge_store, challenge_id, device, metadata)
         
-        # Create Session
-        from .utils import generate_random_string
-        session_id = generate_random_string(32)
-        session_token = create_jwt_token(device_id, session_id)
+        if session_token is None:
+            record_replay_attack(device, metadata)
+            return JsonResponse({'success': False, 'error': 'Challenge already used'}, status=403)
         
-        UserSession.objects.create(
-            session_id=session_id,
-            session_token=session_token,
-            device=device,
-            ip_address=metadata['ip_address'],
-            user_agent=metadata['user_agent']
-        )
+        return login_success_response(session_token)
+    
+    except Exception as e:
+        logger.error(f"Verification error: {str(e)}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+# ============================================================================
+# BATCH SIGNATURE VERIFICATION
+# ============================================================================
+
+def _batch_failure(index, challenge_id, error):
+    """Build the result entry for a batch item that failed verification"""
+    return {'index': index, 'challenge_id': challenge_id, 'success': False, 'error': error}
+
+
+def _apply_batch_device_outcomes(device_outcomes, now):
+    """
+    Write batch results to devices with targeted UPDATEs instead of saving the
+    rows read before verification, so concurrent flags and failed attempts are kept.
+    
+    Args:
+        device_outcomes (dict): Device pk -> {'succeeded': bool, 'failures': failures
+                                since the device's last success in the batch}
+        now (datetime): Verification time
+    
+    Returns:
+        int: Number of devices this batch flagged
+    """
+    # Group devices sharing an outcome so each group is one UPDATE
+    groups = {}
+    for pk, outcome in device_outcomes.items():
+        groups.setdefault((outcome['succeeded'], outcome['failures']), []).append(pk)
+    
+    for (succeeded, failures), pks in groups.items():
+        query = TrustedDevice.objects.filter(pk__in=pks)
+        if succeeded:
+            query.update(failed_attempts=failures, last_used_at=now)
+        else:
+            query.update(failed_attempts=F('failed_attempts') + failures)
+    
+    # Only ever set the flag; the rowcount is exactly the devices flagged here
+    failed_pks = [pk for pk, outcome in device_outcomes.items() if outcome['failures']]
+    if not failed_pks:
+        return 0
+    return TrustedDevice.objects.filter(
+        pk__in=failed_pks,
+        is_flagged=False,
+        failed_attempts__gte=settings.MAX_FAILED_ATTEMPTS
+    ).update(is_flagged=True)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def verify_signature_batch(request):
+    """
+    Verify many (challenge_id, device_id, signature) tuples in one request.
+    Challenges and devices are fetched in two bulk queries, signatures are
+    verified on a worker pool and all writes are committed in bulk.
+    
+    Request Body:
+        {
+            "items": [
+                {"challenge_id": "...", "device_id": "...", "signature": "..."}
+            ]
+        }
+    
+    Returns:
+        {
+            "success": true,
+            "results": [
+                {"index": 0, "challenge_id": "...", "success": true, "session_token": "..."},
+                {"index": 1, "challenge_id": "...", "success": false, "error": "Invalid signature"}
+            ]
+        }
+    """
+    try:
+        data = json.loads(request.body)
+        items = data.get('items')
         
-        AuthenticationEvent.objects.create(
-            event_type='LOGIN_SUCCESS',
-            device=device,
-            success=True,
-            ip_address=metadata['ip_address']
+        if not isinstance(items, list) or not items:
+            return JsonResponse({'success': False, 'error': 'items must be a non-empty list'}, status=400)
+        
+        if len(items) > settings.BATCH_VERIFY_MAX_ITEMS:
+            return JsonResponse({
+                'success': False,
+                'error': f'Too many items (maximum {settings.BATCH_VERIFY_MAX_ITEMS})'
+            }, status=400)
+        
+        metadata = get_request_metadata(request)
+        now = timezone.now()
+        expires_at = now + timedelta(hours=settings.JWT_EXPIRATION_HOURS)
+        results = [None] * len(items)
+        
+        # 1. Bulk fetch challenges and devices
+        challenge_ids = {item.get('challenge_id') for item in items if isinstance(item, dict)}
+        device_ids = {item.get('device_id') for item in items if isinstance(item, dict)}
+        challenge_store = get_challenge_store()
+        challenges = challenge_store.get_many(challenge_ids)
+        devices = TrustedDevice.objects.in_bulk(
+            [did for did in device_ids if did], field_name='device_id'
         )
         
-        response = JsonResponse({
+        # 2. Validate items and collect verification jobs
+        pending = []
+        new_events = []
+        seen_challenges = set()
+        for index, item in enumerate(items):
+            item = item if isinstance(item, dict) else {}
+            challenge_id = item.get('challenge_id')
+            device_id = item.get('device_id')
+            signature_base64 = item.get('signature')
+            
+            if not challenge_id or not device_id or not signature_base64:
+                results[index] = _batch_failure(index, challenge_id, 'Missing required fields')
+                continue
+            
+            challenge = challenges.get(challenge_id)
+            if challenge is None:
+                results[index] = _batch_failure(index, challenge_id, 'Invalid challenge ID')
+                continue
+            
+            if challenge.is_used or challenge_id in seen_challenges:
+                new_events.append(AuthenticationEvent(**_replay_attack_fields(devices.get(device_id), metadata)))
+                results[index] = _batch_failure(index, challenge_id, 'Challenge already used')
+                continue
+            
+            if challenge.is_expired(now):
+                results[index] = _batch_failure(index, challenge_id, 'Challenge expired')
+                continue
+            
+            device = devices.get(device_id)
+            if device is None:
+                results[index] = _batch_failure(index, challenge_id, 'Device not registered')
+                continue
+            
+            seen_challenges.add(challenge_id)
+            pending.append((index, challenge, device, {
+                'public_key_pem': device.public_key,
+                'message': challenge_id + challenge.nonce,
+                'signature_base64': signature_base64,
+                'device_id': device.device_id,
+                'signature_format': device.signature_format or None,
+            }))
+        
+        # 3. Verify signatures on the worker pool
+        outcomes = verify_ecdsa_signatures([job for _, _, _, job in pending])
+        
+        # 4. Commit challenge, device, session and event writes in bulk
+        # Per device: whether it logged in, and failures since its last success
+        device_outcomes = {}
+        new_sessions = []
+        
+        with consume_transaction(challenge_store) as released_on_error:
+            # Claim the verified challenges; ones consumed concurrently are skipped
+            consumed = challenge_store.consume_many({
+                challenge.challenge_id: device
+                for (_, challenge, device, _), (is_valid, _) in zip(pending, outcomes) if is_valid
+            })
+            released_on_error.extend(consumed)
+            
+            for (index, challenge, device, _), (is_valid, error) in zip(pending, outcomes):
+                if is_valid and challenge.challenge_id not in consumed:
+                    new_events.append(AuthenticationEvent(**_replay_attack_fields(device, metadata)))
+                    results[index] = _batch_failure(index, challenge.challenge_id, 'Challenge already used')
+                    continue
+                
+                outcome = device_outcomes.setdefault(device.pk, {'succeeded': False, 'failures': 0})
+                
+                if not is_valid:
+                    outcome['failures'] += 1
+                    new_events.append(AuthenticationEvent(
+                        event_type='INVALID_SIGNATURE',
+                        device=device,
+                        success=False,
+                        ip_address=metadata['ip_address'],
+                        user_agent=metadata['user_agent'],
+                        failure_reason=error
+                    ))
+                    results[index] = _batch_failure(index, challenge.challenge_id, 'Invalid signature')
+                    continue
+                
+                outcome['succeeded'] = True
+                outcome['failures'] = 0
+                
+                session_id = generate_random_string(32)
+                session_token = create_jwt_token(device.device_id, session_id, expires_at=expires_at)
+                new_sessions.append(UserSession(
+                    session_id=session_id,
+                    token_digest=hash_session_token(session_token),
+                    device=device,
+                    expires_at=expires_at,
+                    ip_address=metadata['ip_address'],
+                    user_agent=metadata['user_agent']
+                ))
+                new_events.append(AuthenticationEvent(
+                    event_type='LOGIN_SUCCESS',
+                    device=device,
+                    success=True,
+                    ip_address=metadata['ip_address'],
+                    user_agent=metadata['user_agent']
+                ))
+                results[index] = {
+                    'index': index,
+                    'challenge_id': challenge.challenge_id,
+                    'success': True,
+                    'session_token': session_token
+                }
+            
+            newly_flagged = _apply_batch_device_outcomes(device_outcomes, now)
+            if new_sessions:
+                UserSession.objects.bulk_create(new_sessions)
+            # Targeted updates and bulk_create skip save(), so the counters are adjusted here
+            adjust_counters(
+                devices_flagged=newly_flagged,
+                sessions_total=len(new_sessions),
+                sessions_active=len(new_sessions)
+            )
+            if new_events:
+                for event in new_events:
+                    event.classify_attack()
+                # bulk_create skips save(), so the rollups are updated here
+                AuthenticationEvent.objects.bulk_create(new_events)
+                record_events(new_events)
+            
+            # Wake the browsers waiting on the consumed challenges after commit
+            notifier = get_challenge_notifier()
+            for consumed_id in consumed:
+                transaction.on_commit(partial(notifier.notify, consumed_id))
+        
+        return JsonResponse({
             'success': True,
-            'message': 'Authentication successful',
-            'session_token': session_token
+            'results': results,
+            'verified_count': len(new_sessions),
+            'failed_count': len(items) - len(new_sessions)
         })
-
-        # CRITICAL: Set cookie path to '/' so Dashboard can see it
-        response.set_cookie(
-            'session_token', 
-            session_token, 
-            httponly=True,
-            samesite='None', 
-            secure=True, # Set True in production with HTTPS
-            path='/'      # This ensures cookie is visible on all pages
-        )
-        return response
+    
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
     
     except Exception as e:
-        logger.error(f"Verification error: {str(e)}")
+        logger.error(f"Batch verification error: {str(e)}")
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
@@ -299,6 +661,78 @@ def verify_signature(request):
 # CHALLENGE STATUS CHECK (POLLING)
 # ============================================================================
 
+def _challenge_status_data(challenge):
+    """Status fields reported for a challenge"""
+    return {
+        'is_used': challenge.is_used,
+        'is_expired': challenge.is_expired(),
+        'authenticated': bool(challenge.is_used and challenge.device_id)
+    }
+
+
+def _latest_device_session(device_id):
+    # We look for the most recent active session for this device
+    # (Created within the last few seconds by the phone)
+    return UserSession.objects.filter(
+        device_id=device_id, 
+        is_active=True
+    ).select_related('device').order_by('-created_at')
+
+
+def build_challenge_status_response(response_data, latest_session=None):
+    """
+    Build the status response, handing the phone's session cookie to the PC.
+    
+    Args:
+        response_data (dict): Fields from _challenge_status_data
+        latest_session (UserSession): Session opened by the phone, if authenticated
+    
+    Returns:
+        JsonResponse: Status response
+    """
+    response = JsonResponse(response_data)
+
+    if latest_session is not None:
+        # The raw token is not stored, so the PC gets its own token for the same session
+        session_token = create_jwt_token(
+            latest_session.device.device_id,
+            latest_session.session_id,
+            expires_at=latest_session.expires_at
+        )
+
+        # SET THE COOKIE ON THE PC
+        response.set_cookie(
+            'session_token',
+            session_token,
+            httponly=True,
+            samesite='Lax', # Must be None if Front/Back are on different domains
+            secure=True,   # Set True if using HTTPS (which you are now!)
+            path='/'
+        )
+    
+    return response
+
+
+def _challenge_status_response(challenge):
+    """
+    Build the status response for a challenge.
+    If verified, FIND the session and SET THE COOKIE for the PC.
+    """
+    response_data = _challenge_status_data(challenge)
+    latest_session = None
+    
+    # If the challenge was used successfully by the phone...
+    if response_data['authenticated']:
+        # --- CRITICAL FIX: Find the session and give it to the PC ---
+        latest_session = _latest_device_session(challenge.device_id).first()
+    
+    return build_challenge_status_response(response_data, latest_session)
+
+
+def _seconds_until_expiry(challenge):
+    return max((challenge.expires_at - timezone.now()).total_seconds(), 0)
+
+
 @require_http_methods(["GET"])
 def check_challenge_status(request):
     """
@@ -310,49 +744,91 @@ def check_challenge_status(request):
     if not challenge_id:
         return JsonResponse({'error': 'Missing challenge_id'}, status=400)
     
+    challenge = get_challenge_store().get(challenge_id)
+    if challenge is None:
+        return JsonResponse({'error': 'Challenge not found'}, status=404)
+    
+    return _challenge_status_response(challenge)
+
+
+@require_http_methods(["GET"])
+def wait_challenge_status(request):
+    """
+    Long-poll variant of check_challenge_status.
+    Holds the request until the challenge is consumed, expires, or the timeout
+    (query param, capped at CHALLENGE_LONG_POLL_TIMEOUT_SECONDS) elapses, then
+    answers exactly like check_challenge_status.
+    """
+    challenge_id = request.GET.get('challenge_id')
+    
+    if not challenge_id:
+        return JsonResponse({'error': 'Missing challenge_id'}, status=400)
+    
+    max_timeout = settings.CHALLENGE_LONG_POLL_TIMEOUT_SECONDS
     try:
-        challenge = AuthenticationChallenge.objects.get(challenge_id=challenge_id)
+        timeout = min(float(request.GET.get('timeout', max_timeout)), max_timeout)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid timeout'}, status=400)
+    
+    challenge_store = get_challenge_store()
+    
+    # Subscribe before reading so a completion in between is not missed
+    with get_challenge_notifier().subscribe(challenge_id) as subscription:
+        challenge = challenge_store.get(challenge_id)
+        if challenge is None:
+            return JsonResponse({'error': 'Challenge not found'}, status=404)
         
-        response_data = {
-            'is_used': challenge.is_used,
-            'is_expired': challenge.check_expired(),
-            'authenticated': False
-        }
+        if challenge.is_valid() and timeout > 0:
+            if subscription.wait(min(timeout, _seconds_until_expiry(challenge))):
+                challenge = challenge_store.get(challenge_id) or challenge
+    
+    return _challenge_status_response(challenge)
 
-        # If the challenge was used successfully by the phone...
-        if challenge.is_used and challenge.device:
-            response_data['authenticated'] = True
-            
-            # --- CRITICAL FIX: Find the session and give it to the PC ---
-            # We look for the most recent active session for this device
-            # (Created within the last few seconds by the phone)
-            try:
-                # Get the latest session for this device
-                latest_session = UserSession.objects.filter(
-                    device=challenge.device, 
-                    is_active=True
-                ).latest('created_at')
-
-                response = JsonResponse(response_data)
-
-                # SET THE COOKIE ON THE PC
-                response.set_cookie(
-                    'session_token',
-                    latest_session.session_token,
-                    httponly=True,
-                    samesite='Lax', # Must be None if Front/Back are on different domains
-                    secure=True,   # Set True if using HTTPS (which you are now!)
-                    path='/'
-                )
-                return response
-
-            except UserSession.DoesNotExist:
-                pass # Should not happen if verify_signature worked
-        
-        return JsonResponse(response_data)
-    
-    except AuthenticationChallenge.DoesNotExist:
+
+@require_http_methods(["GET"])
+def stream_challenge_status(request):
+    """
+    Server-Sent Events variant of check_challenge_status.
+    Emits a `status` event on connect and whenever the challenge changes, and
+    closes the stream once it is consumed or expired. Cookies cannot be set
+    mid-stream, so clients fetch /challenge/status once after `authenticated`.
+    """
+    challenge_id = request.GET.get('challenge_id')
+    
+    if not challenge_id:
+        return JsonResponse({'error': 'Missing challenge_id'}, status=400)
+    
+    challenge_store = get_challenge_store()
+    if challenge_store.get(challenge_id) is None:
         return JsonResponse({'error': 'Challenge not found'}, status=404)
+    
+    def event_stream():
+        heartbeat = settings.CHALLENGE_SSE_HEARTBEAT_SECONDS
+        last_data = None
+        
+        with get_challenge_notifier().subscribe(challenge_id) as subscription:
+            while True:
+                challenge = challenge_store.get(challenge_id)
+                if challenge is None:
+                    yield 'event: error\ndata: {"error": "Challenge not found"}\n\n'
+                    return
+                
+                data = _challenge_status_data(challenge)
+                if data != last_data:
+                    yield f'event: status\ndata: {json.dumps(data)}\n\n'
+                    last_data = data
+                
+                if not challenge.is_valid():
+                    return
+                
+                if not subscription.wait(min(heartbeat, _seconds_until_expiry(challenge))):
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n'
+    
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable nginx response buffering
+    return response
 
 # ============================================================================
 # SESSION VALIDATION (NAVBAR CHECK)
@@ -380,20 +856,33 @@ def validate_session(request):
     if error:
         return JsonResponse({'authenticated': False, 'error': error}, status=200)
 
-    # 3. Check DB
-    try:
-        session = UserSession.objects.get(
-            session_id=payload['session_id'],
-            is_active=True
-        )
-        return JsonResponse({
-            'authenticated': True,
-            'device_name': session.device.device_name,
-            'session_id': session.session_id
-        })
-    except UserSession.DoesNotExist:
+    # 3. Check session (cached for SESSION_CACHE_SECONDS)
+    session, error = get_active_session(payload['session_id'])
+    if error:
         return JsonResponse({'authenticated': False}, status=200)
 
+    return JsonResponse({
+        'authenticated': True,
+        'device_name': session['device']['device_name'],
+        'session_id': session['session_id']
+    })
+
+
+# ============================================================================
+# JWKS (OFFLINE TOKEN VALIDATION)
+# ============================================================================
+
+@require_http_methods(["GET"])
+def jwks(request):
+    """
+    Publish the public keys that sign session tokens (RFC 7517 JWK Set).
+    Services validate NullPass tokens offline by matching the token's kid.
+    Empty when JWT_ALGORITHM is HS256.
+    """
+    response = JsonResponse(get_jwt_keys().jwks)
+    response['Cache-Control'] = f'public, max-age={settings.JWT_JWKS_MAX_AGE_SECONDS}'
+    return response
+
 
 # ============================================================================
 # LOGOUT
@@ -404,11 +893,21 @@ def validate_session(request):
 def logout(request):
     token = request.COOKIES.get('session_token')
     if token:
-        try:
-            session = UserSession.objects.get(session_token=token, is_active=True)
+        # Expired tokens may still log out; undecodable ones fall back to the digest
+        payload, error = decode_jwt_token(token, verify_exp=False)
+        if error:
+            sessions = UserSession.objects.filter(token_digest=hash_session_token(token))
+        else:
+            sessions = UserSession.objects.filter(session_id=payload['session_id'])
+
+        session = sessions.filter(is_active=True).select_related('device').first()
+        if session is not None:
             session.terminate()
-        except UserSession.DoesNotExist:
-            pass
+
+        # terminate() already drops the cache entry; this also covers a session
+        # whose row is gone but whose entry has not expired yet
+        if not error:
+            invalidate_sessions([payload['session_id']])
 
     response = JsonResponse({'success': True})
     response.delete_cookie('session_token', path='/') # Clear cookie from root
@@ -0,0 +1,269 @@
+"""
+Audit event queries for the NullPass dashboard.
+Events are read newest first and paged by keyset on (timestamp, id): a cursor
+names the last event of a page and the next page starts strictly after it,
+so every page costs the same however deep the history is. Rows are loaded
+with their device in one join and only the columns the API returns.
+"""
+
+import base64
+import os
+from datetime import datetime
+from datetime import timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from authenticate.maintenance import period_label, read_archived_events
+from authenticate.models import AuthenticationEvent, EventArchivePartition, TrustedDevice
+
+EVENT_COLUMNS = (
+    'id', 'event_type', 'timestamp', 'success', 'ip_address', 'user_agent', 'failure_reason',
+    'attack_type', 'blockchain_hash', 'blockchain_tx_hash', 'device__device_id', 'device__device_name',
+)
+
+EVENT_TYPE_LABELS = dict(AuthenticationEvent.EVENT_TYPES)
+
+
+def _parse_timestamp(param, value):
+    try:
+        timestamp = parse_datetime(value)
+    except ValueError:
+        timestamp = None
+    if timestamp is None:
+        raise ValueError(f'{param} must be an ISO 8601 datetime')
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp, dt_timezone.utc)
+    return timestamp
+
+
+def event_filters(params):
+    """
+    Parse the request filters shared by the events API and exports.
+
+    Args:
+        params (QueryDict): device_id, event_type, success, since and until
+                            (ISO 8601, since inclusive, until exclusive) filters, all optional
+
+    Returns:
+        dict: since, until (aware datetimes), device_id, event_type and success (bool), None when absent
+
+    Raises:
+        ValueError: If since or until is not an ISO 8601 datetime
+    """
+    success_filter = params.get('success')
+    return {
+        'since': _parse_timestamp('since', params['since']) if params.get('since') else None,
+        'until': _parse_timestamp('until', params['until']) if params.get('until') else None,
+        'device_id': params.get('device_id') or None,
+        'event_type': params.get('event_type') or None,
+        'success': None if success_filter is None else success_filter.lower() == 'true',
+    }
+
+
+def filter_events(params):
+    """
+    Build the event queryset for request filters.
+
+    Args:
+        params (QueryDict): Filters as for event_filters
+
+    Returns:
+        QuerySet: Matching events with their device, newest first
+
+    Raises:
+        ValueError: If since or until is not an ISO 8601 datetime
+    """
+    filters = event_filters(params)
+    query = AuthenticationEvent.objects.select_related('device').only(*EVENT_COLUMNS)
+
+    if filters['since']:
+        query = query.filter(timestamp__gte=filters['since'])
+    if filters['until']:
+        query = query.filter(timestamp__lt=filters['until'])
+    if filters['device_id']:
+        query = query.filter(device__device_id=filters['device_id'])
+    if filters['event_type']:
+        query = query.filter(event_type=filters['event_type'])
+    if filters['success'] is not None:
+        query = query.filter(success=filters['success'])
+
+    return query.order_by('-timestamp', '-id')
+
+
+# ============================================================================
+# ARCHIVED PERIODS
+# ============================================================================
+
+def archived_partitions(params):
+    """
+    Archive files (from roll_event_partitions) overlapping the requested time range.
+
+    Args:
+        params (QueryDict): Filters as for event_filters
+
+    Returns:
+        list: EventArchivePartition rows, oldest first
+
+    Raises:
+        ValueError: If since or until is not an ISO 8601 datetime
+    """
+    filters = event_filters(params)
+    partitions = EventArchivePartition.objects.order_by('start', 'id')
+    if filters['since']:
+        partitions = partitions.filter(end__gt=filters['since'])
+    if filters['until']:
+        partitions = partitions.filter(start__lt=filters['until'])
+    return list(partitions)
+
+
+def archived_period_labels(partitions):
+    """e.g. ['2026-07', '2026-08'] for a list of partitions"""
+    return [period_label(partition.start, partition.period) for partition in partitions]
+
+
+def missing_archive_files(partitions):
+    """Partitions whose archive file is no longer on disk"""
+    return [partition for partition in partitions if not os.path.exists(partition.path)]
+
+
+def exclude_archived(query, partitions):
+    """
+    Leave out hot rows that are also in an archive file (a roll interrupted
+    before its deletes finished), so exports never repeat an event.
+    """
+    for partition in partitions:
+        query = query.exclude(
+            timestamp__gte=partition.start, timestamp__lt=partition.end, id__lte=partition.last_event_id
+        )
+    return query
+
+
+def _archived_row_matches(row, filters, device_pk):
+    timestamp = row['timestamp']
+    return (
+        (filters['since'] is None or timestamp >= filters['since'])
+        and (filters['until'] is None or timestamp < filters['until'])
+        and (filters['device_id'] is None or row['device_id'] == device_pk)
+        and (filters['event_type'] is None or row['event_type'] == filters['event_type'])
+        and (filters['success'] is None or row['success'] == filters['success'])
+    )
+
+
+def archived_events(params, partitions):
+    """
+    Stream matching events back out of archive files, oldest first.
+
+    Args:
+        params (QueryDict): Filters as for event_filters
+        partitions (list): Partitions from archived_partitions
+
+    Returns:
+        generator: Unsaved AuthenticationEvent objects with their device set,
+                   ready for serialize_event
+    """
+    filters = event_filters(params)
+    device_pk = None
+    if filters['device_id']:
+        device_pk = TrustedDevice.objects.filter(device_id=filters['device_id']).values_list('pk', flat=True).first()
+        if device_pk is None:
+            return
+
+    devices = {}
+    for partition in partitions:
+        for row in read_archived_events(partition):
+            row.pop('model', None)
+            row['timestamp'] = datetime.fromisoformat(row['timestamp'])
+            if not _archived_row_matches(row, filters, device_pk):
+                continue
+
+            pk = row.pop('device_id')
+            if pk is not None and pk not in devices:
+                devices[pk] = TrustedDevice.objects.filter(pk=pk).only('device_id', 'device_name').first()
+            event = AuthenticationEvent(**row)
+            # The device may have been deleted since the period was archived
+            event.device = devices.get(pk)
+            yield event
+
+
+def encode_cursor(event):
+    """Opaque cursor pointing just past an event"""
+    raw = f'{event.timestamp.isoformat()}|{event.id}'.encode('ascii')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor from encode_cursor.
+
+    Args:
+        cursor (str): Cursor from a previous page
+
+    Returns:
+        tuple: (timestamp, id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        timestamp, event_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(event_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def events_page(query, limit, cursor=None):
+    """
+    Read one page of events.
+
+    Args:
+        query (QuerySet): Events ordered by (-timestamp, -id), from filter_events
+        limit (int): Page size
+        cursor (str): Cursor of the previous page (optional)
+
+    Returns:
+        tuple: (list of events, next cursor or None on the last page)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    if cursor:
+        timestamp, event_id = decode_cursor(cursor)
+        query = query.filter(Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=event_id))
+
+    # One extra row tells whether another page exists
+    events = list(query[:limit + 1])
+    if len(events) <= limit:
+        return events, None
+    events = events[:limit]
+    return events, encode_cursor(events[-1])
+
+
+def serialize_event(event):
+    """
+    API representation of an event loaded by filter_events.
+
+    Args:
+        event (AuthenticationEvent): Event with its device selected
+
+    Returns:
+        dict: JSON-serializable event
+    """
+    device = event.device
+    return {
+        'event_id': event.id,
+        'event_type': event.event_type,
+        'event_type_display': EVENT_TYPE_LABELS.get(event.event_type, event.event_type),
+        'device_name': device.device_name if device else 'Unknown',
+        'device_id': device.device_id if device else None,
+        'timestamp': event.timestamp.isoformat(),
+        'success': event.success,
+        'ip_address': event.ip_address,
+        'user_agent': event.user_agent,
+        'failure_reason': event.failure_reason,
+        'attack_type': event.attack_type,
+        'blockchain_hash': event.blockchain_hash,
+        'blockchain_tx_hash': event.blockchain_tx_hash
+    }
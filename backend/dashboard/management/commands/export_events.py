@@ -0,0 +1,102 @@
+"""
+Stream authentication events, oldest first, to a file as NDJSON or CSV.
+Uses the same filters and streaming writer as /api/dashboard/events/export/,
+so memory stays flat however many rows are exported. Periods already rolled
+into archive files by roll_event_partitions are read back from those files;
+the command fails if one of them is missing.
+
+Usage:
+    python manage.py export_events --output events.ndjson
+    python manage.py export_events --format csv --gzip --output events.csv.gz
+    python manage.py export_events --since 2026-07-01T00:00:00Z --until 2026-10-01T00:00:00Z \
+        --event-type REPLAY_ATTACK --output replays.ndjson
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from dashboard.events import (
+    archived_events,
+    archived_partitions,
+    archived_period_labels,
+    exclude_archived,
+    filter_events,
+    missing_archive_files,
+)
+from dashboard.export import EXPORT_FORMATS, export_events
+
+
+class Command(BaseCommand):
+    help = 'Export AuthenticationEvent rows as streamed NDJSON or CSV, optionally gzipped'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format',
+            choices=list(EXPORT_FORMATS),
+            default='ndjson',
+            help='Output format (default: ndjson)'
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='gzip the output'
+        )
+        parser.add_argument(
+            '--output',
+            default='-',
+            help='File to write (default: stdout)'
+        )
+        parser.add_argument('--since', help='Only events at or after this ISO 8601 datetime')
+        parser.add_argument('--until', help='Only events before this ISO 8601 datetime')
+        parser.add_argument('--event-type', help='Only events of this type')
+        parser.add_argument('--device-id', help='Only events of this device')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Rows fetched per database round trip (default: DASHBOARD_EXPORT_CHUNK_SIZE)'
+        )
+
+    def handle(self, *args, **options):
+        params = QueryDict(mutable=True)
+        for name in ('since', 'until', 'event_type', 'device_id'):
+            if options[name]:
+                params[name] = options[name]
+
+        try:
+            query = filter_events(params)
+            partitions = archived_partitions(params)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        missing = missing_archive_files(partitions)
+        if missing:
+            raise CommandError(
+                f"Archive files missing for archived periods: {', '.join(archived_period_labels(missing))}"
+            )
+
+        pieces = export_events(
+            exclude_archived(query, partitions),
+            options['format'],
+            compress=options['gzip'],
+            chunk_size=options['chunk_size'],
+            archived=archived_events(params, partitions)
+        )
+
+        if options['output'] == '-':
+            output = getattr(self.stdout, 'buffer', None) or sys.stdout.buffer
+            for piece in pieces:
+                output.write(piece)
+            output.flush()
+            return
+
+        written = 0
+        with open(options['output'], 'wb') as output:
+            for piece in pieces:
+                output.write(piece)
+                written += len(piece)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
+        if partitions:
+            self.stdout.write(f"Included archived periods: {', '.join(archived_period_labels(partitions))}")
@@ -1,3 +1,254 @@
+"""
+Tests for the NullPass dashboard app.
+"""
+
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from authenticate.maintenance import roll_event_partitions
+from authenticate.models import (
+    AuthenticationEvent,
+    AuthenticationEventRollup,
+    EventArchivePartition,
+    TrustedDevice,
+    UserSession,
+)
+from authenticate.utils import create_jwt_token
+
+
+class DashboardAggregateTests(TestCase):
+    """
+    Summary endpoints read the hourly rollups and the materialized counters,
+    one query each.
+    """
+
+    def setUp(self):
+        cache.clear()
+        # Counter adjustments run once the writes commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.device = TrustedDevice.objects.create(
+                device_id='dashboard-device', public_key='-', device_name='Phone'
+            )
+            UserSession.objects.create(session_id='dashboard-session', device=self.device, ip_address='127.0.0.1')
+            for event_type, success, attack_type in (
+                ('LOGIN_SUCCESS', True, ''),
+                ('LOGIN_SUCCESS', True, ''),
+                ('REPLAY_ATTACK', False, 'Replay Attack'),
+                ('INVALID_SIGNATURE', False, ''),
+            ):
+                AuthenticationEvent.objects.create(
+                    event_type=event_type, device=self.device, success=success,
+                    attack_type=attack_type, ip_address='127.0.0.1'
+                )
+        self.client.cookies['session_token'] = create_jwt_token(self.device.device_id, 'dashboard-session')
+
+        # An old event only counts once the rollups are rebuilt from raw events
+        old = AuthenticationEvent.objects.create(event_type='LOGIN_FAILED', success=False, ip_address='127.0.0.1')
+        AuthenticationEvent.objects.filter(pk=old.pk).update(timestamp=timezone.now() - timedelta(days=3))
+        call_command('rebuild_event_rollups', stdout=io.StringIO())
+
+        # Warm the session cache so only the summary queries are counted
+        self.client.get('/api/dashboard/statistics/')
+
+    def test_threat_summary(self):
+        # Rollups for whole hours, raw events for the partial first hours, counters
+        with self.assertNumQueries(3):
+            data = self.client.get('/api/dashboard/threat-summary/').json()
+
+        self.assertEqual(data['failed_attempts_24h'], 2)
+        self.assertEqual(data['failed_attempts_7d'], 3)
+        self.assertEqual(data['successful_attempts_7d'], 2)
+        self.assertEqual(data['recent_threats'], 2)
+        self.assertEqual(data['attack_summary'], {'Replay Attack': 1})
+        self.assertEqual((data['total_devices'], data['active_sessions']), (1, 1))
+
+    def test_statistics(self):
+        with self.assertNumQueries(2):
+            data = self.client.get('/api/dashboard/statistics/').json()
+
+        self.assertEqual((data['total_events'], data['successful_events'], data['failed_events']), (5, 2, 3))
+        self.assertEqual((data['total_devices'], data['active_devices'], data['total_sessions']), (1, 1, 1))
+
+    def test_rollups_match_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            AuthenticationEvent.objects.create(event_type='ENROLLMENT', success=True, ip_address='127.0.0.1')
+        incremental = sorted(AuthenticationEventRollup.objects.values_list('hour', 'event_type', 'success', 'attack_type', 'count'))
+
+        call_command('rebuild_event_rollups', stdout=io.StringIO())
+        rebuilt = sorted(AuthenticationEventRollup.objects.values_list('hour', 'event_type', 'success', 'attack_type', 'count'))
+        self.assertEqual(incremental, rebuilt)
+
+
+class EventPaginationTests(TestCase):
+    """
+    The events API pages by (timestamp, id) keyset with one query per page.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.device = TrustedDevice.objects.create(device_id='events-device', public_key='-', device_name='Phone')
+        UserSession.objects.create(session_id='events-session', device=self.device, ip_address='127.0.0.1')
+        self.client.cookies['session_token'] = create_jwt_token(self.device.device_id, 'events-session')
+
+        self.events = [
+            AuthenticationEvent.objects.create(
+                event_type='LOGIN_SUCCESS', device=self.device if i % 2 else None,
+                success=True, ip_address='127.0.0.1'
+            )
+            for i in range(5)
+        ]
+        # Identical timestamps are ordered by id
+        AuthenticationEvent.objects.filter(pk__in=[e.pk for e in self.events[1:4]]).update(timestamp=timezone.now())
+        self.client.get('/api/dashboard/statistics/')
+
+    def test_pages_cover_every_event_once(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 2, **({'cursor': cursor} if cursor else {})}
+            with self.assertNumQueries(1):
+                data = self.client.get('/api/dashboard/events/', params).json()
+            seen += [event['event_id'] for event in data['events']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                break
+
+        expected = list(AuthenticationEvent.objects.order_by('-timestamp', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(seen), 5)
+
+    def test_limit_is_capped_and_cursor_validated(self):
+        with self.settings(DASHBOARD_EVENTS_MAX_LIMIT=3):
+            data = self.client.get('/api/dashboard/events/', {'limit': 1000}).json()
+        self.assertEqual(len(data['events']), 3)
+        self.assertIsNotNone(data['next_cursor'])
+
+        response = self.client.get('/api/dashboard/events/', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Invalid cursor')
+
+
+class EventExportTests(TestCase):
+    """
+    Event exports stream NDJSON or CSV, optionally gzipped, with time-range filters.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.device = TrustedDevice.objects.create(device_id='export-device', public_key='-', device_name='Phone')
+        UserSession.objects.create(session_id='export-session', device=self.device, ip_address='127.0.0.1')
+        self.client.cookies['session_token'] = create_jwt_token(self.device.device_id, 'export-session')
+
+        for event_type in ('LOGIN_SUCCESS', 'REPLAY_ATTACK', 'LOGIN_SUCCESS'):
+            AuthenticationEvent.objects.create(
+                event_type=event_type, device=self.device, success=event_type == 'LOGIN_SUCCESS',
+                ip_address='127.0.0.1'
+            )
+        old = AuthenticationEvent.objects.create(event_type='LOGIN_FAILED', success=False, ip_address='127.0.0.1')
+        AuthenticationEvent.objects.filter(pk=old.pk).update(timestamp=timezone.now() - timedelta(days=30))
+
+    def export(self, **params):
+        response = self.client.get('/api/dashboard/events/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_ndjson_oldest_first(self):
+        response, body = self.export()
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([row['event_type'] for row in rows],
+                         ['LOGIN_FAILED', 'LOGIN_SUCCESS', 'REPLAY_ATTACK', 'LOGIN_SUCCESS'])
+        self.assertEqual(rows[1]['device_id'], 'export-device')
+
+    def test_gzipped_csv_with_filters(self):
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        response, body = self.export(format='csv', gzip='true', since=since, event_type='LOGIN_SUCCESS')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('.csv.gz', response['Content-Disposition'])
+
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(body).decode())))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual({row['event_type'] for row in rows}, {'LOGIN_SUCCESS'})
+
+    def test_invalid_filters_rejected(self):
+        self.assertEqual(self.client.get('/api/dashboard/events/export/', {'format': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/dashboard/events/export/', {'since': 'yesterday'}).status_code, 400)
+
+    def test_command_writes_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'events.ndjson.gz')
+            call_command('export_events', '--gzip', '--chunk-size', '2', '--output', path, stdout=io.StringIO())
+            with gzip.open(path, 'rt') as f:
+                self.assertEqual(len(f.readlines()), 4)
+
+    def archive_old_events(self, directory):
+        old = AuthenticationEvent.objects.create(
+            event_type='LOGIN_SUCCESS', device=self.device, success=True, ip_address='127.0.0.1'
+        )
+        AuthenticationEvent.objects.filter(pk=old.pk).update(timestamp=timezone.now() - timedelta(days=90))
+        roll_event_partitions(hot_days=30, period='month', archive_dir=directory)
+        self.assertFalse(AuthenticationEvent.objects.filter(pk=old.pk).exists())
+        return old
+
+    def test_archived_periods_are_exported(self):
+        with tempfile.TemporaryDirectory() as directory:
+            old = self.archive_old_events(directory)
+            response, body = self.export()
+            rows = [json.loads(line) for line in body.decode().splitlines()]
+            self.assertEqual(len(rows), 5)
+            self.assertEqual(rows[0]['event_id'], old.pk)
+            self.assertEqual(rows[0]['device_id'], 'export-device')
+            self.assertTrue(response['X-Archived-Periods'])
+
+            since = (timezone.now() - timedelta(days=100)).isoformat()
+            until = (timezone.now() - timedelta(days=60)).isoformat()
+            response, body = self.export(since=since, until=until, device_id='export-device')
+            self.assertEqual([json.loads(line)['event_id'] for line in body.decode().splitlines()], [old.pk])
+
+            response, body = self.export(since=timezone.now().isoformat())
+            self.assertEqual(response['X-Archived-Periods'], '')
+
+            path = os.path.join(directory, 'events.ndjson')
+            call_command('export_events', '--output', path, stdout=io.StringIO())
+            with open(path) as f:
+                self.assertEqual(len(f.readlines()), 5)
+
+    def test_interrupted_roll_exports_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            old = self.archive_old_events(directory)
+            # The archive was written but the hot rows were never deleted
+            AuthenticationEvent.objects.create(
+                id=old.pk, event_type='LOGIN_SUCCESS', device=self.device, success=True,
+                ip_address='127.0.0.1'
+            )
+            AuthenticationEvent.objects.filter(pk=old.pk).update(timestamp=timezone.now() - timedelta(days=90))
+
+            response, body = self.export()
+            ids = [json.loads(line)['event_id'] for line in body.decode().splitlines()]
+            self.assertEqual(ids.count(old.pk), 1)
+
+    def test_missing_archive_file_refuses_export(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.archive_old_events(directory)
+            for partition in EventArchivePartition.objects.all():
+                os.remove(partition.path)
+
+            response = self.client.get('/api/dashboard/events/export/')
+            self.assertEqual(response.status_code, 409)
+            self.assertIn('Archive files missing', response.json()['error'])
+            with self.assertRaises(CommandError):
+                call_command('export_events', '--output', os.path.join(directory, 'out.ndjson'), stdout=io.StringIO())
 
-# Create your tests here.
+            recent = self.client.get('/api/dashboard/events/export/', {'since': timezone.now().isoformat()})
+            self.assertEqual(recent.status_code, 200)
@@ -14,6 +14,7 @@ urlpatterns = [
     
     # Authentication events (audit log)
     path('events/', views.get_authentication_events, name='get_events'),
+    path('events/export/', views.export_authentication_events, name='export_events'),
     
     # Security stats
     path('threat-summary/', views.get_threat_summary, name='threat_summary'),
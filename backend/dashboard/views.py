@@ -7,18 +7,35 @@ Dashboard API Views for NullPass.
 Provides endpoints for viewing sessions, devices, authentication events, and threat summary.
 """
 
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
-from django.db.models import Count, Q
+from django.db.models import Q, Sum
 from django.utils import timezone
 from datetime import timedelta
 import json
 import logging
 
-from authenticate.models import TrustedDevice, AuthenticationEvent, UserSession, AuthenticationChallenge
+from authenticate.models import TrustedDevice, AuthenticationEventRollup, UserSession, AuthenticationChallenge
+from authenticate.audit_writer import record_event
+from authenticate.counters import get_counters
+from authenticate.rollups import window_counts
+from authenticate.session_cache import entry_device, get_active_session
 from authenticate.utils import decode_jwt_token, get_client_ip, get_user_agent, calculate_trust_level
 
+from .events import (
+    archived_events,
+    archived_partitions,
+    archived_period_labels,
+    events_page,
+    exclude_archived,
+    filter_events,
+    missing_archive_files,
+    serialize_event,
+)
+from .export import EXPORT_FORMATS, export_events, export_filename
+
 logger = logging.getLogger('dashboard')
 
 
@@ -53,30 +70,20 @@ def require_auth(view_func):
                 'error': f'Unauthorized - {error}'
             }, status=401)
         
-        # Verify session exists and is active
-        try:
-            session = UserSession.objects.get(
-                session_token=token,
-                is_active=True
-            )
-            
-            if session.is_expired():
-                session.terminate()
-                return JsonResponse({
-                    'error': 'Session expired'
-                }, status=401)
-            
-            # Attach authentication info to request
-            request.auth_device_id = payload['device_id']
-            request.auth_session_id = payload['session_id']
-            request.auth_device = session.device
-            
-            return view_func(request, *args, **kwargs)
+        # Verify session exists and is active (cached for SESSION_CACHE_SECONDS)
+        session, error = get_active_session(payload['session_id'])
         
-        except UserSession.DoesNotExist:
+        if error:
             return JsonResponse({
-                'error': 'Session not found'
+                'error': error
             }, status=401)
+        
+        # Attach authentication info to request
+        request.auth_device_id = payload['device_id']
+        request.auth_session_id = payload['session_id']
+        request.auth_device = entry_device(session)
+        
+        return view_func(request, *args, **kwargs)
     
     return wrapper
 
@@ -113,7 +120,7 @@ def get_active_sessions(request):
         sessions = UserSession.objects.filter(
             device=device,
             is_active=True
-        ).order_by('-created_at')
+        ).select_related('device').order_by('-created_at')
         
         sessions_data = []
         for session in sessions:
@@ -212,67 +219,53 @@ def get_registered_devices(request):
 @require_http_methods(["GET"])
 def get_authentication_events(request):
     """
-    Get authentication events (audit log).
+    Get authentication events (audit log), newest first, one page at a time.
     
     Query Parameters:
-        limit: Maximum number of events to return (default: 50)
+        limit: Page size (default: DASHBOARD_EVENTS_DEFAULT_LIMIT, capped at DASHBOARD_EVENTS_MAX_LIMIT)
+        cursor: next_cursor from the previous page (optional)
         device_id: Filter by specific device (optional)
         event_type: Filter by event type (optional)
         success: Filter by success status (optional)
+        since, until: ISO 8601 time range, until exclusive (optional)
     
     Returns:
         {
             "success": true,
-            "events": [...]
+            "events": [...],
+            "total_count": 50,
+            "next_cursor": "MjAyNi0xMC0xN1Qx..." or null on the last page
         }
     """
     try:
-        # Get query parameters
-        limit = int(request.GET.get('limit', 50))
-        device_id = request.GET.get('device_id')
-        event_type = request.GET.get('event_type')
-        success_filter = request.GET.get('success')
-        
-        # Build query
-        query = AuthenticationEvent.objects.all()
-        
-        if device_id:
-            query = query.filter(device__device_id=device_id)
-        
-        if event_type:
-            query = query.filter(event_type=event_type)
-        
-        if success_filter is not None:
-            success_bool = success_filter.lower() == 'true'
-            query = query.filter(success=success_bool)
-        
-        # Get events
-        events = query.order_by('-timestamp')[:limit]
-        
-        events_data = []
-        for event in events:
-            events_data.append({
-                'event_id': event.id,
-                'event_type': event.event_type,
-                'event_type_display': event.get_event_type_display(),
-                'device_name': event.device.device_name if event.device else 'Unknown',
-                'device_id': event.device.device_id if event.device else None,
-                'timestamp': event.timestamp.isoformat(),
-                'success': event.success,
-                'ip_address': event.ip_address,
-                'user_agent': event.user_agent,
-                'failure_reason': event.failure_reason,
-                'attack_type': event.attack_type,
-                'blockchain_hash': event.blockchain_hash,
-                'blockchain_tx_hash': event.blockchain_tx_hash
-            })
+        try:
+            limit = int(request.GET.get('limit', settings.DASHBOARD_EVENTS_DEFAULT_LIMIT))
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'error': 'limit must be an integer'
+            }, status=400)
+        limit = max(1, min(limit, settings.DASHBOARD_EVENTS_MAX_LIMIT))
+        
+        try:
+            events, next_cursor = events_page(
+                filter_events(request.GET), limit, cursor=request.GET.get('cursor')
+            )
+        except ValueError as e:
+            return JsonResponse({
+                'success': False,
+                'error': str(e)
+            }, status=400)
+        
+        events_data = [serialize_event(event) for event in events]
         
         logger.info(f"Retrieved {len(events_data)} authentication events")
         
         return JsonResponse({
             'success': True,
             'events': events_data,
-            'total_count': len(events_data)
+            'total_count': len(events_data),
+            'next_cursor': next_cursor
         })
     
     except Exception as e:
@@ -283,6 +276,64 @@ def get_authentication_events(request):
         }, status=500)
 
 
+@require_auth
+@require_http_methods(["GET"])
+def export_authentication_events(request):
+    """
+    Stream authentication events, oldest first, as a file download.
+    
+    Periods already rolled into archive files are read back from those files,
+    and listed in the X-Archived-Periods header. If an archive file in the
+    range is gone, the export is refused rather than silently short.
+    
+    Query Parameters:
+        format: 'ndjson' (default) or 'csv'
+        gzip: 'true' to gzip the download
+        since, until: ISO 8601 time range, until exclusive (optional)
+        device_id, event_type, success: Same filters as the events API (optional)
+    
+    Returns:
+        Streamed NDJSON or CSV (application/gzip when gzipped)
+    """
+    export_format = request.GET.get('format', 'ndjson')
+    compress = request.GET.get('gzip', '').lower() == 'true'
+    
+    try:
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(EXPORT_FORMATS)}")
+        query = filter_events(request.GET)
+        partitions = archived_partitions(request.GET)
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)
+    
+    missing = missing_archive_files(partitions)
+    if missing:
+        periods = ', '.join(archived_period_labels(missing))
+        logger.error(f"Event export refused, archive files missing for: {periods}")
+        return JsonResponse({
+            'success': False,
+            'error': f'Archive files missing for archived periods: {periods}'
+        }, status=409)
+    
+    response = StreamingHttpResponse(
+        export_events(
+            exclude_archived(query, partitions),
+            export_format,
+            compress=compress,
+            archived=archived_events(request.GET, partitions)
+        ),
+        content_type='application/gzip' if compress else EXPORT_FORMATS[export_format]
+    )
+    filename = export_filename(export_format, compress, timezone.now())
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response['X-Archived-Periods'] = ','.join(archived_period_labels(partitions))
+    logger.info(f"Streaming {export_format} event export for device: {request.auth_device.device_id}")
+    return response
+
+
 # ============================================================================
 # THREAT SUMMARY API
 # ============================================================================
@@ -305,56 +356,33 @@ def get_threat_summary(request):
         }
     """
     try:
-        now = timezone.now()
-        last_24h = now - timedelta(hours=24)
-        last_7d = now - timedelta(days=7)
-        
-        # Count failed attempts in last 24 hours
-        failed_24h = AuthenticationEvent.objects.filter(
-            timestamp__gte=last_24h,
-            success=False
-        ).count()
-        
-        # Count failed attempts in last 7 days
-        failed_7d = AuthenticationEvent.objects.filter(
-            timestamp__gte=last_7d,
-            success=False
-        ).count()
-        
-        # Count successful attempts in last 7 days
-        success_7d = AuthenticationEvent.objects.filter(
-            timestamp__gte=last_7d,
-            success=True
-        ).count()
-        
-        # Get attack types breakdown
-        attacks_7d = AuthenticationEvent.objects.filter(
-            timestamp__gte=last_7d,
-            success=False,
-            attack_type__isnull=False
-        ).exclude(attack_type='').values('attack_type').annotate(count=Count('id'))
-        
-        attack_summary = {item['attack_type']: item['count'] for item in attacks_7d}
+        # Exact 24h and 7d windows: whole hours from the hourly rollups, the partial first hour from raw events
+        buckets = window_counts({'count_24h': 24, 'count_7d': 24 * 7})
+        threat_types = ['REPLAY_ATTACK', 'INVALID_SIGNATURE', 'UNREGISTERED_DEVICE']
+        
+        failed_24h = failed_7d = success_7d = recent_threats = 0
+        attack_summary = {}
+        for (event_type, success, attack_type), bucket in buckets.items():
+            if success:
+                success_7d += bucket['count_7d']
+                continue
+            
+            failed_24h += bucket['count_24h']
+            failed_7d += bucket['count_7d']
+            if event_type in threat_types:
+                recent_threats += bucket['count_24h']
+            if attack_type:
+                attack_summary[attack_type] = attack_summary.get(attack_type, 0) + bucket['count_7d']
         
         # Calculate trust level
         total_attempts_7d = failed_7d + success_7d
         trust_level = calculate_trust_level(failed_7d, total_attempts_7d)
         
-        # Get flagged devices count
-        flagged_devices = TrustedDevice.objects.filter(is_flagged=True).count()
-        
-        # Get total devices
-        total_devices = TrustedDevice.objects.count()
-        
-        # Get active sessions count
-        active_sessions = UserSession.objects.filter(is_active=True).count()
-        
-        # Get recent high-risk events
-        recent_threats = AuthenticationEvent.objects.filter(
-            timestamp__gte=last_24h,
-            success=False,
-            event_type__in=['REPLAY_ATTACK', 'INVALID_SIGNATURE', 'UNREGISTERED_DEVICE']
-        ).count()
+        # Device and session totals from the materialized counters
+        counters = get_counters()
+        flagged_devices = counters['devices_flagged']
+        total_devices = counters['devices_total']
+        active_sessions = counters['sessions_active']
         
         logger.info(f"Generated threat summary - Trust Level: {trust_level}")
         
@@ -495,7 +523,7 @@ def deactivate_device(request):
                 session.terminate()
             
             # Log the deactivation event
-            AuthenticationEvent.objects.create(
+            record_event(
                 event_type='DEVICE_DEACTIVATED',
                 device=device,
                 success=True,
@@ -552,15 +580,22 @@ def get_statistics(request):
         }
     """
     try:
-        total_devices = TrustedDevice.objects.count()
-        active_devices = TrustedDevice.objects.filter(is_active=True).count()
-        flagged_devices = TrustedDevice.objects.filter(is_flagged=True).count()
-        
-        total_sessions = UserSession.objects.count()
-        active_sessions = UserSession.objects.filter(is_active=True).count()
-        
-        total_events = AuthenticationEvent.objects.count()
-        successful_events = AuthenticationEvent.objects.filter(success=True).count()
+        # Device and session totals come from the materialized counters, events from the hourly rollups
+        counters = get_counters()
+        event_counts = AuthenticationEventRollup.objects.aggregate(
+            total_events=Sum('count', default=0),
+            successful_events=Sum('count', filter=Q(success=True), default=0)
+        )
+        
+        total_devices = counters['devices_total']
+        active_devices = counters['devices_active']
+        flagged_devices = counters['devices_flagged']
+        
+        total_sessions = counters['sessions_total']
+        active_sessions = counters['sessions_active']
+        
+        total_events = event_counts['total_events']
+        successful_events = event_counts['successful_events']
         
         success_rate = (successful_events / total_events * 100) if total_events > 0 else 0
         
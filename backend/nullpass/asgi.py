@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nullpass.settings')
 
 application = get_asgi_application()
+
+# Background threads belong to serving processes only, not to management commands
+from authenticate.apps import start_background_workers  # noqa: E402
+
+start_background_workers()
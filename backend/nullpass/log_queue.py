@@ -0,0 +1,113 @@
+"""
+Non-blocking logging for NullPass.
+configure_logging (LOGGING_CONFIG) applies settings.LOGGING and then, when
+LOG_QUEUE_ENABLED is on, swaps the handlers of every logger named there for a
+QueueHandler. A QueueListener thread per handler set does the file and console
+writes, so request threads only enqueue. HotPathFilter samples and
+rate-limits high-frequency success records (the authenticate.hotpath logger).
+"""
+
+import atexit
+import logging
+import logging.config
+import queue
+import threading
+import time
+from collections import defaultdict
+from logging.handlers import QueueHandler, QueueListener
+
+_listeners = []
+
+
+class HotPathFilter(logging.Filter):
+    """
+    Keep one in sample_every INFO-and-below records per message template and
+    at most max_per_second of them. Warnings and errors always pass. The next
+    record let through reports how many similar ones were dropped.
+    """
+
+    def __init__(self, sample_every=1, max_per_second=0):
+        super().__init__()
+        self.sample_every = max(int(sample_every), 1)
+        self.max_per_second = int(max_per_second)
+        self._seen = defaultdict(int)
+        self._suppressed = defaultdict(int)
+        self._window = defaultdict(lambda: [0, 0])  # template -> [second, records let through]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.INFO:
+            return True
+
+        key = (record.name, record.msg)
+        with self._lock:
+            self._seen[key] += 1
+            keep = self._seen[key] % self.sample_every == 1 % self.sample_every
+
+            if keep and self.max_per_second > 0:
+                second = int(time.monotonic())
+                window = self._window[key]
+                if window[0] != second:
+                    window[0], window[1] = second, 0
+                keep = window[1] < self.max_per_second
+                if keep:
+                    window[1] += 1
+
+            if not keep:
+                self._suppressed[key] += 1
+                return False
+            suppressed = self._suppressed.pop(key, 0)
+
+        if suppressed:
+            record.msg = f'{record.msg} (%d similar suppressed)'
+            record.args = (record.args or ()) + (suppressed,)
+        return True
+
+
+def _queue_loggers(logger_names):
+    """Route the named loggers through one queue and listener per handler set"""
+    queue_handlers = {}
+
+    for name in logger_names:
+        logger = logging.getLogger(name or None)
+        handlers = tuple(logger.handlers)
+        if not handlers:
+            continue
+
+        queue_handler = queue_handlers.get(handlers)
+        if queue_handler is None:
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+            listener.start()
+            _listeners.append(listener)
+            queue_handler = queue_handlers[handlers] = QueueHandler(log_queue)
+
+        logger.handlers = [queue_handler]
+
+
+def stop_queue_listeners():
+    """Flush queued records and stop the listener threads"""
+    while _listeners:
+        _listeners.pop().stop()
+
+
+def configure_logging(logging_settings):
+    """
+    LOGGING_CONFIG callable: apply LOGGING, then move handler I/O off the calling thread.
+
+    Args:
+        logging_settings (dict): settings.LOGGING
+    """
+    from django.conf import settings
+
+    stop_queue_listeners()
+    logging.config.dictConfig(logging_settings)
+
+    if settings.LOG_QUEUE_ENABLED:
+        logger_names = list(logging_settings.get('loggers', {}))
+        if 'root' in logging_settings:
+            logger_names.append('')
+        _queue_loggers(logger_names)
+
+
+atexit.register(stop_queue_listeners)
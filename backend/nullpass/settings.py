@@ -138,6 +138,8 @@ DB_PORT = env('DB_PORT', default='5432')
 DATABASE_URL = env('DATABASE_URL', default='').strip()
 DB_CONN_MAX_AGE = env('DB_CONN_MAX_AGE', default=60, cast=int)
 DB_ATOMIC_REQUESTS = env('DB_ATOMIC_REQUESTS', default=False, cast=bool)
+# SQLite test database file; a file (not :memory:) lets threaded tests share it
+DB_TEST_NAME = env('DB_TEST_NAME', default='test_db.sqlite3')
 
 
 def resolve_db_name(db_name):
@@ -227,9 +229,13 @@ else:
             'NAME': DB_NAME,
             'CONN_MAX_AGE': DB_CONN_MAX_AGE,
             'ATOMIC_REQUESTS': DB_ATOMIC_REQUESTS,
+            'TEST': {
+                'NAME': resolve_db_name(DB_TEST_NAME),
+            },
         }
     }
 
+
 # Example .env settings:
 # DB_ENGINE=sqlite3
 # DB_NAME=/path/to/db.sqlite3
@@ -242,6 +248,19 @@ else:
 # DB_PORT=5432
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Use django.core.cache.backends.redis.RedisCache with CACHE_LOCATION=redis://host:6379/0
+# to share cached state (e.g. CHALLENGE_STORE=cache) between processes.
+
+CACHES = {
+    'default': {
+        'BACKEND': env('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': env('CACHE_LOCATION', default='nullpass'),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -344,28 +363,113 @@ FRONTEND_BASE_URL = env('FRONTEND_BASE_URL', default='http://localhost:5173')
 
 # JWT Configuration
 JWT_SECRET_KEY = env('JWT_SECRET_KEY', default='nullpass-jwt-secret-key-change-this-in-production')
+# 'HS256' (shared JWT_SECRET_KEY), or 'ES256' / 'EdDSA' signed with JWT_PRIVATE_KEY_FILE and
+# published at /api/auth/.well-known/jwks.json so other services can verify tokens offline
 JWT_ALGORITHM = env('JWT_ALGORITHM', default='HS256')
+JWT_PRIVATE_KEY_FILE = str(env_path('JWT_PRIVATE_KEY_FILE', default='')) if env('JWT_PRIVATE_KEY_FILE') else ''
+# Public keys of retired signing keys, still accepted and published until their tokens expire
+JWT_PREVIOUS_PUBLIC_KEY_FILES = env_path_list('JWT_PREVIOUS_PUBLIC_KEY_FILES', default='')
+JWT_JWKS_MAX_AGE_SECONDS = env('JWT_JWKS_MAX_AGE_SECONDS', default=3600, cast=int)
 JWT_EXPIRATION_HOURS = env('JWT_EXPIRATION_HOURS', default=24, cast=int)
+# Seconds an active session is cached for require_auth/validate_session (0 disables);
+# terminate, deactivate and logout invalidate immediately. Use a shared cache across processes.
+SESSION_CACHE_SECONDS = env('SESSION_CACHE_SECONDS', default=30, cast=int)
+SESSION_CACHE_ALIAS = env('SESSION_CACHE_ALIAS', default='default')
 
 # Challenge Configuration
 CHALLENGE_EXPIRATION_MINUTES = env('CHALLENGE_EXPIRATION_MINUTES', default=5, cast=int)
 ENROLLMENT_CHALLENGE_EXPIRATION_MINUTES = env('ENROLLMENT_CHALLENGE_EXPIRATION_MINUTES', default=10, cast=int)
+# 'orm' (AuthenticationChallenge rows), 'cache' (Django cache with TTL), 'signed' (stateless
+# HMAC-signed challenge IDs; only a used-marker is cached on verification), or a dotted class path
+CHALLENGE_STORE = env('CHALLENGE_STORE', default='orm')
+# 'signed' relies on this cache alone for replay protection, so it must be shared by every
+# process (Redis/Memcached); a per-process locmem cache is refused unless
+# CHALLENGE_STORE_SINGLE_PROCESS says one process serves all requests (runserver, tests)
+CHALLENGE_STORE_CACHE_ALIAS = env('CHALLENGE_STORE_CACHE_ALIAS', default='default')
+CHALLENGE_STORE_SINGLE_PROCESS = env('CHALLENGE_STORE_SINGLE_PROCESS', default=False, cast=bool)
+# Seconds a cached challenge (or used-marker) outlives its expiry so status polls can report it
+CHALLENGE_STORE_GRACE_SECONDS = env('CHALLENGE_STORE_GRACE_SECONDS', default=300, cast=int)
+# Wakes long-poll/SSE status waiters: 'local' (single process), 'cache' (shared cache marker),
+# 'postgres' (LISTEN/NOTIFY), or a dotted class path
+CHALLENGE_NOTIFIER = env('CHALLENGE_NOTIFIER', default='local')
+CHALLENGE_LONG_POLL_TIMEOUT_SECONDS = env('CHALLENGE_LONG_POLL_TIMEOUT_SECONDS', default=25, cast=int)
+CHALLENGE_SSE_HEARTBEAT_SECONDS = env('CHALLENGE_SSE_HEARTBEAT_SECONDS', default=15, cast=int)
+# How often 'cache' notifier waiters check for completions published by other processes
+CHALLENGE_NOTIFY_POLL_INTERVAL = env('CHALLENGE_NOTIFY_POLL_INTERVAL', default=0.5, cast=float)
+
+# Warm pool of pre-generated login challenges with pre-rendered QR codes (per process)
+CHALLENGE_POOL_ENABLED = env('CHALLENGE_POOL_ENABLED', default=False, cast=bool)
+CHALLENGE_POOL_SIZE = env('CHALLENGE_POOL_SIZE', default=200, cast=int)
+# Depth at which the background filler tops the pool back up (defaults to half the size)
+CHALLENGE_POOL_REFILL_AT = env('CHALLENGE_POOL_REFILL_AT', default=None, cast=int)
+# QR format pre-rendered into pooled entries; match what clients request ('matrix' is the
+# frontend's). Requests for another format still use pooled challenges but render inline
+CHALLENGE_POOL_QR_FORMAT = env('CHALLENGE_POOL_QR_FORMAT', default='matrix')
+
+# Serve login, verify, status and session validation with async views (use under ASGI)
+AUTH_ASYNC_VIEWS = env('AUTH_ASYNC_VIEWS', default=False, cast=bool)
+
+# Purge Configuration (expired challenges and dead sessions)
+PURGE_RETENTION_HOURS = env('PURGE_RETENTION_HOURS', default=24, cast=int)
+PURGE_BATCH_SIZE = env('PURGE_BATCH_SIZE', default=1000, cast=int)
+PURGE_SWEEPER_ENABLED = env('PURGE_SWEEPER_ENABLED', default=False, cast=bool)
+PURGE_INTERVAL_SECONDS = env('PURGE_INTERVAL_SECONDS', default=3600, cast=int)
+
+# Event partitions: roll_event_partitions moves weeks or months of AuthenticationEvent
+# older than EVENT_HOT_DAYS (keep at least the dashboard's 7-day window) into
+# gzip NDJSON files in EVENT_ARCHIVE_DIR
+EVENT_PARTITION_PERIOD = env('EVENT_PARTITION_PERIOD', default='month')
+EVENT_HOT_DAYS = env('EVENT_HOT_DAYS', default=35, cast=int)
+EVENT_ARCHIVE_DIR = env_path('EVENT_ARCHIVE_DIR', default='archive/events')
+
+# Audit event writer: event types listed here are queued and written in batches
+# by a background thread (fire-and-forget); all others are written before the response
+AUDIT_WRITER_ENABLED = env('AUDIT_WRITER_ENABLED', default=False, cast=bool)
+AUDIT_WRITER_BATCH_SIZE = env('AUDIT_WRITER_BATCH_SIZE', default=500, cast=int)
+AUDIT_WRITER_FLUSH_SECONDS = env('AUDIT_WRITER_FLUSH_SECONDS', default=1.0, cast=float)
+AUDIT_ASYNC_EVENT_TYPES = env_list('AUDIT_ASYNC_EVENT_TYPES', default='LOGIN_SUCCESS,SESSION_TERMINATED')
+
+# Dashboard audit event API (keyset-paginated; larger limits are capped)
+DASHBOARD_EVENTS_DEFAULT_LIMIT = env('DASHBOARD_EVENTS_DEFAULT_LIMIT', default=50, cast=int)
+DASHBOARD_EVENTS_MAX_LIMIT = env('DASHBOARD_EVENTS_MAX_LIMIT', default=500, cast=int)
+# Rows fetched per database round trip by the streaming event export
+DASHBOARD_EXPORT_CHUNK_SIZE = env('DASHBOARD_EXPORT_CHUNK_SIZE', default=2000, cast=int)
 
 # Security Configuration
 MAX_FAILED_ATTEMPTS = env('MAX_FAILED_ATTEMPTS', default=5, cast=int)
 DEVICE_FLAG_THRESHOLD = env('DEVICE_FLAG_THRESHOLD', default=5, cast=int)
 
+# Signature Verification Configuration
+# 'cryptography' (OpenSSL, falls back to 'ecdsa' if not installed), 'ecdsa', or a dotted class path
+SIGNATURE_BACKEND = env('SIGNATURE_BACKEND', default='cryptography')
+PUBLIC_KEY_CACHE_SIZE = env('PUBLIC_KEY_CACHE_SIZE', default=1024, cast=int)
+SIGNATURE_VERIFY_WORKERS = env('SIGNATURE_VERIFY_WORKERS', default=4, cast=int)
+BATCH_VERIFY_MAX_ITEMS = env('BATCH_VERIFY_MAX_ITEMS', default=100, cast=int)
+
 # Blockchain Configuration (Optional)
 BLOCKCHAIN_ENABLED = env('BLOCKCHAIN_ENABLED', default=False, cast=bool)
 BLOCKCHAIN_NETWORK = env('BLOCKCHAIN_NETWORK', default='sepolia')
 BLOCKCHAIN_RPC_URL = env('BLOCKCHAIN_RPC_URL', default='https://sepolia.infura.io/v3/YOUR_INFURA_KEY')
 BLOCKCHAIN_CONTRACT_ADDRESS = env('BLOCKCHAIN_CONTRACT_ADDRESS', default='')
 BLOCKCHAIN_PRIVATE_KEY = env('BLOCKCHAIN_PRIVATE_KEY', default='')
+# Events are anchored in batches: a Merkle tree over up to BLOCKCHAIN_ANCHOR_BATCH_SIZE
+# pending events per root, one ledger transaction per root. With BLOCKCHAIN_ENABLED an
+# in-process worker anchors every BLOCKCHAIN_ANCHOR_INTERVAL_SECONDS (or cron anchor_events).
+# 'service' (blockchain_audit.BlockchainService), 'memory' (tests/dev), or a dotted class path
+BLOCKCHAIN_LEDGER = env('BLOCKCHAIN_LEDGER', default='service')
+BLOCKCHAIN_ANCHOR_BATCH_SIZE = env('BLOCKCHAIN_ANCHOR_BATCH_SIZE', default=4096, cast=int)
+BLOCKCHAIN_ANCHOR_INTERVAL_SECONDS = env('BLOCKCHAIN_ANCHOR_INTERVAL_SECONDS', default=60, cast=int)
 
 # QR Code Configuration
 QR_CODE_VERSION = env('QR_CODE_VERSION', default=1, cast=int)
 QR_CODE_BOX_SIZE = env('QR_CODE_BOX_SIZE', default=10, cast=int)
 QR_CODE_BORDER = env('QR_CODE_BORDER', default=4, cast=int)
+# Default QR output for clients that do not send qr_format: 'none' (client renders auth_url),
+# 'png' (legacy), 'compact-png' (1-bit, 1px per module), 'svg', or 'matrix' (raw modules)
+QR_CODE_FORMAT = env('QR_CODE_FORMAT', default='none')
+# Fixed mask pattern 0-7 skips scoring all eight masks (about 4x faster encoding);
+# unset picks the best mask as the QR spec recommends
+QR_CODE_MASK_PATTERN = env('QR_CODE_MASK_PATTERN', default=None, cast=int)
 
 
 # ============================================================================
@@ -388,6 +492,13 @@ SECURE_HSTS_PRELOAD = env('SECURE_HSTS_PRELOAD', default=False, cast=bool)
 
 LOG_LEVEL = env('LOG_LEVEL', default='INFO').upper()
 SECURITY_LOG_LEVEL = env('SECURITY_LOG_LEVEL', default='WARNING').upper()
+# Handlers write from a QueueListener thread instead of the logging thread (nullpass/log_queue.py)
+LOG_QUEUE_ENABLED = env('LOG_QUEUE_ENABLED', default=True, cast=bool)
+# Per-call success messages (token issue/decode, signature checks): keep 1 in N, at most M per second
+LOG_HOT_PATH_SAMPLE_EVERY = env('LOG_HOT_PATH_SAMPLE_EVERY', default=100, cast=int)
+LOG_HOT_PATH_MAX_PER_SECOND = env('LOG_HOT_PATH_MAX_PER_SECOND', default=10, cast=int)
+
+LOGGING_CONFIG = 'nullpass.log_queue.configure_logging'
 
 LOGGING = {
     'version': 1,
@@ -402,6 +513,13 @@ LOGGING = {
             'style': '{',
         },
     },
+    'filters': {
+        'hot_path': {
+            '()': 'nullpass.log_queue.HotPathFilter',
+            'sample_every': LOG_HOT_PATH_SAMPLE_EVERY,
+            'max_per_second': LOG_HOT_PATH_MAX_PER_SECOND,
+        },
+    },
     'handlers': {
         'file': {
             'level': LOG_LEVEL,
@@ -432,6 +550,11 @@ LOGGING = {
             'level': LOG_LEVEL,
             'propagate': False,
         },
+        'authenticate.hotpath': {
+            'filters': ['hot_path'],
+            'level': LOG_LEVEL,
+            'propagate': True,
+        },
         'dashboard': {
             'handlers': ['console', 'file'],
             'level': LOG_LEVEL,
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'nullpass.settings')
 
 application = get_wsgi_application()
+
+# Background threads belong to serving processes only, not to management commands
+from authenticate.apps import start_background_workers  # noqa: E402
+
+start_background_workers()
@@ -3,6 +3,7 @@ import { useNavigate, Link } from 'react-router-dom';
 import { motion } from 'framer-motion';
 import { ArrowRight, LockKeyhole, ShieldCheck, Loader2 } from 'lucide-react';
 import api from '../services/api';
+import QRMatrix from './QRMatrix';
 
 const Corner = ({ position }) => (
   <div className={`absolute w-4 h-4 border-onyx ${position}`}></div>
@@ -18,7 +19,7 @@ const StepItem = ({ status, text, active }) => (
 );
 
 export default function HeroSection() {
-  const [qrImage, setQrImage] = useState(null);
+  const [qrMatrix, setQrMatrix] = useState(null);
   const [challengeId, setChallengeId] = useState(null);
   const [status, setStatus] = useState('INIT'); 
   const navigate = useNavigate();
@@ -27,9 +28,9 @@ export default function HeroSection() {
   useEffect(() => {
     const startLogin = async () => {
       try {
-        const res = await api.initiateLogin();
+        const res = await api.initiateLogin('matrix');
         if (res.data.success) {
-          setQrImage(res.data.qr_code);
+          setQrMatrix(res.data.qr_matrix);
           setChallengeId(res.data.challenge_id);
           setStatus('READY');
         }
@@ -110,9 +111,9 @@ export default function HeroSection() {
                   <motion.div initial={{ scale: 0 }} animate={{ scale: 1 }} className="w-full h-full flex items-center justify-center bg-green-50 rounded-lg">
                     <ShieldCheck className="w-24 h-24 text-green-600 drop-shadow-md" />
                   </motion.div>
-                ) : qrImage ? (
+                ) : qrMatrix ? (
                   <>
-                    <img src={qrImage} alt="Login QR" className="w-full h-full opacity-90 mix-blend-multiply" />
+                    <QRMatrix matrix={qrMatrix} className="w-full h-full opacity-90 mix-blend-multiply" />
                     <div className="absolute top-0 left-0 w-full h-1 bg-steel-azure shadow-[0_0_25px_#0050A6] animate-scan z-10"></div>
                   </>
                 ) : (
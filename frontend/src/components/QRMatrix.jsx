@@ -0,0 +1,30 @@
+import React, { useMemo } from 'react';
+
+// Draws a QR code from the backend's `qr_matrix` (qr_format=matrix).
+// Each row is a hex string; its last `size` bits are the modules, 1 = dark.
+export default function QRMatrix({ matrix, className }) {
+  const { size, border, rows } = matrix;
+  const total = size + 2 * border;
+
+  const path = useMemo(() => {
+    let d = '';
+    rows.forEach((hex, y) => {
+      const bits = hex
+        .split('')
+        .map((c) => parseInt(c, 16).toString(2).padStart(4, '0'))
+        .join('')
+        .slice(-size);
+      for (let x = 0; x < size; x++) {
+        if (bits[x] === '1') d += `M${x + border} ${y + border}h1v1h-1z`;
+      }
+    });
+    return d;
+  }, [size, border, rows]);
+
+  return (
+    <svg viewBox={`0 0 ${total} ${total}`} shapeRendering="crispEdges" className={className}>
+      <rect width={total} height={total} fill="white" />
+      <path d={path} fill="black" />
+    </svg>
+  );
+}
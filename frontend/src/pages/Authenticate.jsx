@@ -70,7 +70,8 @@ export default function Authenticate() {
       const enrollRes = await api.finalizeEnrollment({
         device_id: deviceId,
         public_key: pubPem,
-        device_name: deviceName // Use user input
+        device_name: deviceName, // Use user input
+        signature_format: 'der' // signData() converts WebCrypto output to DER
       });
 
       if (enrollRes.data.success) {
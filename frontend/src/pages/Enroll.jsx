@@ -2,9 +2,10 @@ import React, { useState, useEffect } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { KeyRound, ArrowLeft, Loader2, AlertCircle, ScanLine } from 'lucide-react';
 import api from '../services/api';
+import QRMatrix from '../components/QRMatrix';
 
 export default function Enroll() {
-  const [qrImage, setQrImage] = useState(null);
+  const [qrMatrix, setQrMatrix] = useState(null);
   const [scanUrl, setScanUrl] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
@@ -13,9 +14,9 @@ export default function Enroll() {
   useEffect(() => {
     const fetchQR = async () => {
       try {
-        const res = await api.getEnrollmentQR();
+        const res = await api.getEnrollmentQR('matrix');
         if (res.data.success) {
-          setQrImage(res.data.qr_code);
+          setQrMatrix(res.data.qr_matrix);
           // Simulation Link
           setScanUrl(`${window.location.origin}/authenticate?action=enroll`);
         } else {
@@ -62,7 +63,7 @@ export default function Enroll() {
                           className="relative w-full h-full block cursor-pointer group/qr"
                           title="Click to simulate scanning"
                         >
-                            <img src={qrImage} alt="Enroll QR" className="w-full h-full opacity-90 mix-blend-multiply" />
+                            <QRMatrix matrix={qrMatrix} className="w-full h-full opacity-90 mix-blend-multiply" />
                             <div className="absolute top-0 left-0 w-full h-1 bg-toffee-brown shadow-[0_0_25px_#955E42] animate-scan z-10"></div>
                             
                             <div className="absolute inset-0 bg-black/50 flex items-center justify-center opacity-0 group-hover/qr:opacity-100 transition-opacity">
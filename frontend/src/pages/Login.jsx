@@ -1,27 +1,28 @@
-import React, { useState, useEffect, useRef } from 'react';
+import React, { useState, useEffect } from 'react';
 import { useNavigate, Link } from 'react-router-dom';
 import { motion } from 'framer-motion';
 import { ShieldCheck, ArrowLeft, Loader2, RefreshCw, AlertCircle, ScanLine } from 'lucide-react';
 import api from '../services/api';
+import QRMatrix from '../components/QRMatrix';
 
 export default function Login() {
-  const [qrImage, setQrImage] = useState(null);
+  const [qrMatrix, setQrMatrix] = useState(null);
   const [challengeId, setChallengeId] = useState(null);
   const [scanUrl, setScanUrl] = useState(null);
   const [status, setStatus] = useState('LOADING'); // LOADING, READY, SUCCESS, EXPIRED, ERROR
   const [errorMsg, setErrorMsg] = useState('');
   
   const navigate = useNavigate();
-  const pollInterval = useRef(null);
 
   // 1. Initialize Login Session
   const startLogin = async () => {
     setStatus('LOADING');
     setErrorMsg('');
     try {
-      const res = await api.initiateLogin();
+      // Ask for the raw module matrix and draw it here; no server-side image rendering
+      const res = await api.initiateLogin('matrix');
       if (res.data.success) {
-        setQrImage(res.data.qr_code);
+        setQrMatrix(res.data.qr_matrix);
         setChallengeId(res.data.challenge_id);
         
         // Construct the URL that the "Phone" would open for simulation
@@ -44,37 +45,44 @@ export default function Login() {
 
   useEffect(() => {
     startLogin();
-    return () => clearInterval(pollInterval.current);
   }, []);
 
-  // 2. Poll for Authentication Status
+  // 2. Long-poll for Authentication Status
+  // The server holds each request until the phone verifies or the challenge expires
   useEffect(() => {
-    if (!challengeId || status === 'SUCCESS' || status === 'ERROR') return;
+    if (!challengeId || status !== 'READY') return;
+    let cancelled = false;
 
-    pollInterval.current = setInterval(async () => {
-      try {
-        const res = await api.checkChallengeStatus(challengeId);
-        
-        if (res.data.authenticated === true) {
-          setStatus('SUCCESS');
-          clearInterval(pollInterval.current);
-          
-          // --- NOTIFY NAVBAR IMMEDIATELY ---
-          window.dispatchEvent(new Event('auth-change'));
-          // ---------------------------------
-          
-          setTimeout(() => navigate('/dashboard'), 1500);
-        } 
-        else if (res.data.is_expired === true) {
-          setStatus('EXPIRED');
-          clearInterval(pollInterval.current);
+    const waitForAuth = async () => {
+      while (!cancelled) {
+        try {
+          const res = await api.waitChallengeStatus(challengeId);
+          if (cancelled) return;
+
+          if (res.data.authenticated === true) {
+            setStatus('SUCCESS');
+
+            // --- NOTIFY NAVBAR IMMEDIATELY ---
+            window.dispatchEvent(new Event('auth-change'));
+            // ---------------------------------
+
+            setTimeout(() => navigate('/dashboard'), 1500);
+            return;
+          }
+          else if (res.data.is_expired === true) {
+            setStatus('EXPIRED');
+            return;
+          }
+        } catch (err) {
+          console.error("Polling error:", err);
+          // Back off before retrying so a failing server is not hammered
+          await new Promise((resolve) => setTimeout(resolve, 2000));
         }
-      } catch (err) {
-        console.error("Polling error:", err);
       }
-    }, 2000);
+    };
 
-    return () => clearInterval(pollInterval.current);
+    waitForAuth();
+    return () => { cancelled = true; };
   }, [challengeId, status, navigate]);
 
   return (
@@ -123,7 +131,7 @@ export default function Login() {
                           className="relative w-full h-full block cursor-pointer group/qr"
                           title="Click to simulate scanning on this device"
                         >
-                           <img src={qrImage} alt="Login QR" className="w-full h-full opacity-90 mix-blend-multiply" />
+                           <QRMatrix matrix={qrMatrix} className="w-full h-full opacity-90 mix-blend-multiply" />
                            <div className="absolute top-0 left-0 w-full h-1 bg-steel-azure shadow-[0_0_25px_#0050A6] animate-scan z-10"></div>
                            
                            {/* Hover Hint */}
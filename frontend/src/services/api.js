@@ -8,11 +8,13 @@ const apiClient = axios.create({
 
 export default {
   // --- AUTH ---
-  initiateLogin: () => apiClient.post('/auth/login/request'),
+  // qrFormat: 'png' | 'compact-png' | 'svg' | 'matrix' | 'none' (server QR_CODE_FORMAT when omitted)
+  initiateLogin: (qrFormat) => apiClient.post('/auth/login/request', qrFormat ? { qr_format: qrFormat } : undefined),
   checkChallengeStatus: (id) => apiClient.get(`/auth/challenge/status?challenge_id=${id}`),
+  waitChallengeStatus: (id) => apiClient.get(`/auth/challenge/status/wait?challenge_id=${id}`),
   finalizeEnrollment: (data) => apiClient.post('/auth/enroll', data), 
   verifySignature: (data) => apiClient.post('/auth/verify', data),     
-  getEnrollmentQR: () => apiClient.post('/auth/enroll/qr'),
+  getEnrollmentQR: (qrFormat) => apiClient.post('/auth/enroll/qr', qrFormat ? { qr_format: qrFormat } : undefined),
   validateSession: () => apiClient.post('/auth/session/validate'), 
   
   logout: () => apiClient.post('/auth/logout'),
@@ -21,5 +23,6 @@ export default {
   // We now fetch data from 3 separate endpoints to build the full dashboard
   getStatistics: () => apiClient.get('/dashboard/statistics/'),
   getThreatSummary: () => apiClient.get('/dashboard/threat-summary/'),
-  getEvents: () => apiClient.get('/dashboard/events/?limit=10'),
+  // cursor: next_cursor from the previous page, for older events
+  getEvents: (cursor) => apiClient.get('/dashboard/events/', { params: { limit: 10, cursor } }),
 };
\ No newline at end of file